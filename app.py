@@ -1,11 +1,17 @@
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Query, Form, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse, Response, FileResponse
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # orjson là tùy chọn; dùng json chuẩn nếu chưa cài
+    orjson = None
+    FastJSONResponse = JSONResponse
 from fastapi.staticfiles import StaticFiles
 import base64
-from sqlalchemy import desc, or_, and_, text
+from sqlalchemy import desc, or_, and_, text, func
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 import os
@@ -13,13 +19,14 @@ import uuid
 import logging
 import uvicorn
 import asyncio
+import anyio
 import shutil
 import time
 import requests
 from pathlib import Path
 import tempfile
 import json
-from faster_whisper import WhisperModel
+import threading
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.lsa import LsaSummarizer
@@ -30,8 +37,29 @@ import nltk
 from sqlalchemy.orm import Session, joinedload
 
 # Database imports
-from database import get_db, engine, Base, SessionLocal
-from models import Meeting, Transcription, Participant
+from database import get_db, engine, Base, SessionLocal, upgrade_schema
+from models import Meeting, Transcription, Participant, Person
+from whisper_backends import load_whisper_model, batched_pipeline, get_backend_name, probe_duration, load_audio, SAMPLE_RATE
+from job_queue import IDLE_PRIORITIES, JobQueue, Job, AdmissionError, JobCancelled
+from model_routing import AUTO_MODEL, DEFAULT_BEAM_SIZE, ModelRouter, ModelTier, RouteDecision, parse_tiers
+from db_queue import DatabaseJobQueue
+from checkpoints import JobCheckpoint, CheckpointState, list_checkpoints
+from compression import CompressionMiddleware
+from storage import StorageManager, StorageQuotaExceeded, shard_dir, MEETING_AUDIO, TRANSCRIPTION, WAVEFORM
+from audio_archive import AudioArchiver
+from language_id import LanguageGuess, LanguageIdentifier, meeting_contexts
+from speech_map import MEETING_VAD, SpeechMap, SpeechMapStore, SpeechTimeline
+from transcript_versions import (
+    VERSION_CANCELLED, VERSION_COMPLETED, VERSION_FAILED, VERSION_PROCESSING,
+    add_version, diff_transcripts, list_versions, version_dict
+)
+from hw_tuning import detect_hardware, load_profile
+from profiling import GROUP_BY, MODES, MemoryTracer, ProfiledRoute, Profiler, ProfilingMiddleware, TOKEN_HEADER, stage
+from waveform import ensure_waveform
+from people import link_participants, person_meeting_ids, search_people, sync_participants
+from bulk_import import BulkMeetingWriter, BulkError, OPERATIONS as BULK_OPERATIONS, DEFAULT_CHUNK_SIZE as BULK_CHUNK_SIZE, detect_format
+from static_assets import DIST_DIR, PrecompressedStaticFiles, TemplateCache, ensure_assets
+from transcript_store import CompactTranscript, find_transcript, read_transcript, write_transcript, EXTENSION as TRANSCRIPT_EXTENSION
 
 # Configure logging
 logging.basicConfig(
@@ -49,18 +77,50 @@ except:
 # ==================== CẤU HÌNH HẰNG SỐ ====================
 MAX_AUDIO_SIZE = 50 * 1024 * 1024  # 50MB
 
+# Ngân sách CPU (core/quota cgroup) và cách chia cho các job (hw_tuning.py)
+HARDWARE = detect_hardware()
+TUNING_PROFILE = load_profile(HARDWARE)
+
+# Hàng đợi phiên âm: số job chờ tối đa, số worker và số job đồng thời mỗi client
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 32))
+# 0 = theo profile phần cứng
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", 0)) or TUNING_PROFILE.concurrency
+MAX_JOBS_PER_CLIENT = int(os.environ.get("MAX_JOBS_PER_CLIENT", 4))
+INITIAL_RTF = float(os.environ.get("INITIAL_RTF", 0.5))  # Ước lượng ban đầu trước khi đo được
+# Model phiên âm audio cuộc họp: "auto" = chọn theo SLA và tải hàng đợi (model_routing.py)
+MEETING_MODEL = os.environ.get("MEETING_MODEL", AUTO_MODEL)
+# Hai lượt cho audio cuộc họp: bản nháp bằng model nhỏ có ngay, rồi tinh chỉnh bằng tier lớn nhất
+# trong công suất thừa (lớp ưu tiên "refinement"); MEETING_MODEL chỉ dùng khi tắt
+MEETING_TWO_PASS = os.environ.get("MEETING_TWO_PASS", "1").lower() not in ("0", "false", "no")
+DRAFT_TIER = parse_tiers(os.environ.get("DRAFT_MODEL", "base:int8:1"))[0]  # model:compute_type:beam_size
+REFINE_WINDOW_SECONDS = float(os.environ.get("REFINE_WINDOW_SECONDS", 30))  # Mỗi lần ghi lại bản phiên âm
+MAX_RESUME_ATTEMPTS = int(os.environ.get("MAX_RESUME_ATTEMPTS", 3))  # Số lần chạy tối đa của job bị gián đoạn
+# "local": worker chạy trong process API; "database": job nằm trong DB, chạy bằng `python -m whisper_worker`
+JOB_QUEUE_BACKEND = os.environ.get("JOB_QUEUE_BACKEND", "local").lower()
+# Endpoint truy cập DB là hàm đồng bộ, chạy trong threadpool thay vì chặn event loop
+API_THREADPOOL_SIZE = int(os.environ.get("API_THREADPOOL_SIZE", 40))
+# Body của request nhập hàng loạt lớn hơn ngưỡng này được ghi ra file tạm thay vì giữ trong RAM
+BULK_SPOOL_SIZE = 8 * 1024 * 1024
+
 # ==================== THƯ MỤC LƯU TRỮ ====================
 # Create necessary directories
 os.makedirs("static", exist_ok=True)
 os.makedirs("static/js", exist_ok=True)
 os.makedirs("static/css", exist_ok=True)
 os.makedirs("static/logo", exist_ok=True)
+os.makedirs(DIST_DIR, exist_ok=True)
 os.makedirs("data", exist_ok=True)
 os.makedirs("data/transcriptions", exist_ok=True)
 os.makedirs("data/meeting_audio", exist_ok=True)
 os.makedirs("templates", exist_ok=True)
 
 MEETING_AUDIO_DIR = Path("data/meeting_audio")
+TRANSCRIPTIONS_DIR = Path("data/transcriptions")
+
+def transcription_file_path(transcription_id: str) -> Optional[Path]:
+    """File của transcription (.wtc hoặc JSON cũ), None nếu không có"""
+    return (find_transcript(shard_dir(TRANSCRIPTIONS_DIR, transcription_id), transcription_id)
+            or find_transcript(TRANSCRIPTIONS_DIR, f"transcription_{transcription_id}"))
 
 # ==================== APP INITIALIZATION ====================
 app = FastAPI(
@@ -68,26 +128,30 @@ app = FastAPI(
     description="High-performance speech-to-text API with integrated meeting management",
     version="2.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=FastJSONResponse
 )
 
+# Profile theo yêu cầu (profiling.py): route class và middleware chỉ được thay/gắn khi bật PROFILING,
+# nên khi tắt request không tốn thêm gì
+profiler = Profiler()
+if profiler.enabled:
+    app.router.route_class = ProfiledRoute
+
 @app.on_event("startup")
 async def preload_default_model():
     """Preload the default model on startup"""
     try:
         model_size = os.environ.get("PRELOAD_MODEL", "large-v3")
-        logger.info(f"🎯 Scheduling background preload for model: {model_size}")
+        logger.info(f"🎯 Scheduling background preload for model: {model_size} ({get_backend_name()} backend)")
 
         async def _bg_load():
             try:
                 logger.info("🔄 Background model preload started...")
-                # Load model in background thread
+                # Load model in background thread and keep it in model_cache
                 await asyncio.to_thread(
-                    WhisperModel,
-                    model_size,
-                    device="cpu",
-                    compute_type="int8",
-                    download_root=os.environ.get("MODEL_DIR", None)
+                    get_or_load_model,
+                    TranscriptionOptions(model_size=model_size, device="cpu", compute_type=TUNING_PROFILE.compute_type)
                 )
                 logger.info("✅ Background model preload complete.")
             except Exception as e:
@@ -97,6 +161,85 @@ async def preload_default_model():
     except Exception as e:
         logger.error(f"❌ Model preload scheduling failed: {e}")
 
+@app.on_event("startup")
+async def configure_threadpool():
+    """Size the threadpool that runs sync (database) endpoints"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
+@app.on_event("startup")
+def build_static_assets():
+    """Hash + precompress static assets if they changed since the last build"""
+    try:
+        ensure_assets()
+    except Exception as e:
+        # Trang vẫn chạy với URL /static gốc
+        logger.error(f"❌ Static asset build failed: {e}")
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Start transcription queue workers and resume interrupted jobs"""
+    await job_queue.start()
+    if JOB_QUEUE_BACKEND == "local":
+        # With the database queue, workers own checkpoints and expired leases
+        recover_interrupted_jobs()
+
+@app.on_event("startup")
+async def start_storage_gc():
+    """Move legacy flat files into shards, then collect garbage periodically"""
+    global storage_gc_task
+    
+    async def gc_loop():
+        if await anyio.to_thread.run_sync(storage.has_legacy_files):
+            await anyio.to_thread.run_sync(storage.migrate_legacy)
+        interval = storage.settings["gc_interval"]
+        while interval > 0:
+            try:
+                await anyio.to_thread.run_sync(storage.collect_garbage)
+            except Exception as e:
+                logger.error(f"❌ Storage GC failed: {e}")
+            await asyncio.sleep(interval)
+    
+    storage_gc_task = asyncio.create_task(gc_loop())
+
+@app.on_event("startup")
+async def start_audio_archiver():
+    """Transcode transcribed meeting audio to Opus while the transcription queue is idle"""
+    global audio_archive_task
+    
+    async def archive_loop():
+        interval = audio_archiver.settings["interval"]
+        while interval > 0:
+            await asyncio.sleep(interval)
+            queue = await anyio.to_thread.run_sync(job_queue.stats)
+            if queue["queued"] or queue["running"]:
+                continue
+            try:
+                await anyio.to_thread.run_sync(audio_archiver.run_once)
+            except Exception as e:
+                logger.error(f"❌ Audio archiving failed: {e}")
+    
+    audio_archive_task = asyncio.create_task(archive_loop())
+
+@app.on_event("startup")
+async def start_people_link():
+    """Link participants created before the people directory existed"""
+    global people_link_task
+    
+    async def link():
+        try:
+            await anyio.to_thread.run_sync(link_participants, SessionLocal)
+        except Exception as e:
+            logger.error(f"❌ Linking participants to people failed: {e}")
+    
+    people_link_task = asyncio.create_task(link())
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    for task in (storage_gc_task, audio_archive_task, people_link_task):
+        if task is not None:
+            task.cancel()
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -106,19 +249,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Static files
+# Nén response JSON/HTML lớn (br/gzip) cho client ở đường truyền chậm
+app.add_middleware(CompressionMiddleware)
+
+# Request có header X-Profile được profile (ngoài cùng: gồm cả thời gian nén)
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Static files: /static/dist chứa bản có hash trong tên (cache vĩnh viễn), phải mount trước /static
+app.mount("/static/dist", PrecompressedStaticFiles(directory=DIST_DIR, immutable=True), name="static-dist")
 app.mount("/static", StaticFiles(directory="static"), name="static")
+template_cache = TemplateCache()
 
 # ==================== DATABASE INITIALIZATION ====================
 Base.metadata.create_all(bind=engine)
+# create_all không thêm cột/index mới vào bảng đã có
+upgrade_schema(engine, Base.metadata)
 
 # ==================== DATA STORES & CACHE ====================
-UPLOAD_DIR = Path(tempfile.gettempdir()) / "whisper_uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Phải là thư mục dùng chung với worker khi JOB_QUEUE_BACKEND=database
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", Path(tempfile.gettempdir()) / "whisper_uploads"))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 transcription_tasks = {}
 model_cache = {}
+model_cache_lock = threading.Lock()  # Queue workers may load models concurrently
 executor = ThreadPoolExecutor(max_workers=4)
+if JOB_QUEUE_BACKEND == "database":
+    job_queue = DatabaseJobQueue(
+        SessionLocal,
+        max_attempts=MAX_RESUME_ATTEMPTS,
+        max_depth=MAX_QUEUED_JOBS,
+        workers=TRANSCRIPTION_WORKERS,
+        per_client_limit=MAX_JOBS_PER_CLIENT,
+        initial_rtf=INITIAL_RTF
+    )
+else:
+    job_queue = JobQueue(
+        max_depth=MAX_QUEUED_JOBS,
+        workers=TRANSCRIPTION_WORKERS,
+        per_client_limit=MAX_JOBS_PER_CLIENT,
+        initial_rtf=INITIAL_RTF
+    )
+model_router = ModelRouter(initial_rtf=INITIAL_RTF)
+language_identifier = LanguageIdentifier(SessionLocal)
+speech_maps = SpeechMapStore(SessionLocal)
+
+def task_registry_size() -> dict:
+    by_status = {}
+    for task in list(transcription_tasks.values()):
+        by_status[task.get("status")] = by_status.get(task.get("status"), 0) + 1
+    return {"count": len(transcription_tasks), "by_status": by_status}
+
+def model_cache_size() -> dict:
+    with model_cache_lock:
+        return {"count": len(model_cache), "keys": sorted(model_cache)}
+
+# Registry sống suốt process, được ghi kèm mỗi snapshot tracemalloc
+memory_tracer = MemoryTracer({
+    "transcription_tasks": task_registry_size,
+    "model_cache": model_cache_size,
+    "threads": lambda: {"count": threading.active_count()},
+})
+
+def active_audio_paths() -> set:
+    """Audio của job đang chờ/chạy hoặc đang chờ tiếp tục từ checkpoint"""
+    paths = set(job_queue.active_audio_paths())
+    if JOB_QUEUE_BACKEND == "local":
+        for checkpoint in list_checkpoints():
+            header = checkpoint.header()
+            if header and header.get("audio_path"):
+                paths.add(header["audio_path"])
+    return paths
+
+storage = StorageManager(SessionLocal, MEETING_AUDIO_DIR, TRANSCRIPTIONS_DIR, UPLOAD_DIR, active_paths=active_audio_paths)
+storage_gc_task: Optional[asyncio.Task] = None
+audio_archiver = AudioArchiver(storage)
+audio_archive_task: Optional[asyncio.Task] = None
+people_link_task: Optional[asyncio.Task] = None
 
 # ==================== PYDANTIC MODELS ====================
 
@@ -129,12 +337,24 @@ class MeetingStatus(str, Enum):
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     CANCELLED = "cancelled"
+    FAILED = "failed"
+
+class JobPriority(str, Enum):
+    URGENT = "urgent"
+    MEETING = "meeting"
+    ADHOC = "adhoc"
+    BACKGROUND = "background"
+
+# Lớp idle nội bộ: chỉ chạy khi không còn job nào khác chờ và không tính vào
+# max_depth/giới hạn mỗi client, nên không nằm trong JobPriority mà client chọn được
+REFINEMENT_PRIORITY = IDLE_PRIORITIES[0]
 
 class TranscriptionStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 # Participant Model
 class ParticipantCreate(BaseModel):
@@ -146,6 +366,7 @@ class ParticipantCreate(BaseModel):
 
 class ParticipantResponse(ParticipantCreate):
     id: str
+    person_id: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -216,12 +437,12 @@ class MeetingResponse(MeetingBase):
 
 # Transcription Models
 class TranscriptionOptions(BaseModel):
-    model_size: str = Field("large-v3", description="Model size to use for transcription")
+    model_size: str = Field(AUTO_MODEL, description="Model size to use for transcription ('auto' = routed by SLA and queue load)")
     device: str = Field("cpu", description="Device to use for computation (cuda, cpu)")
-    compute_type: str = Field("int8", description="Compute type for model (float16, int8_float16, int8)")
+    compute_type: Optional[str] = Field(None, description="Compute type for model (float16, int8_float16, int8); chosen by routing if omitted")
     language: Optional[str] = Field(None, description="Language code for transcription (e.g., 'en', 'fr')")
     batch_size: Optional[int] = Field(16, description="Batch size for transcription when using batched mode")
-    beam_size: int = Field(5, description="Beam size for transcription")
+    beam_size: Optional[int] = Field(None, description="Beam size for transcription; chosen by routing if omitted")
     word_timestamps: bool = Field(False, description="Whether to include timestamps for each word")
     vad_filter: bool = Field(True, description="Whether to apply voice activity detection")
     vad_parameters: Optional[Dict[str, Any]] = Field(None, description="Parameters for VAD filtering")
@@ -235,6 +456,11 @@ class TranscriptionTask(BaseModel):
     file_name: str
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    audio_duration: Optional[float] = None
+    priority: Optional[str] = None
+    meeting_id: Optional[str] = None
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[float] = None
 
 class TranscriptionSegment(BaseModel):
     id: int
@@ -264,10 +490,95 @@ class SummaryRequest(BaseModel):
 class SummaryResponse(BaseModel):
     summary: str = Field(..., description="Generated summary")
 
+# ==================== PROJECTIONS ====================
+# Các endpoint đọc nhiều trả dict dựng từ truy vấn theo cột thay vì
+# ORM object -> Pydantic; `?fields=a,b` chỉ lấy các trường được yêu cầu.
+MEETING_FIELDS = tuple(MeetingResponse.model_fields)
+PARTICIPANT_FIELDS = tuple(ParticipantResponse.model_fields)
+TASK_FIELDS = tuple(TranscriptionTask.model_fields)
+
+def projected(model) -> dict:
+    """Tham số route cho endpoint có `?fields=`: response là dict một phần trả thẳng
+    qua FastJSONResponse, nên không khai báo response_model dạng đầy đủ; OpenAPI
+    vẫn tham chiếu `model` và ghi chú rằng mọi trường trừ `id` có thể vắng mặt"""
+    return {
+        "response_model": None,
+        "responses": {200: {
+            "model": model,
+            "description": "Dạng đầy đủ khi không có `?fields=`; có `?fields=` thì chỉ gồm "
+                           "các trường được yêu cầu (luôn có `id`)",
+        }},
+    }
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> tuple:
+    """Parse `?fields=` (comma separated); `id` is always included"""
+    if not fields:
+        return allowed
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(f for f in allowed if f == "id" or f in requested)
+
+def _parse_tags(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return []
+    return value
+
+def meeting_columns(fields: tuple) -> list:
+    return [getattr(Meeting, f) for f in fields if f != "participants"]
+
+def project_meetings(db: Session, rows, fields: tuple) -> List[dict]:
+    """Build MeetingResponse-shaped dicts from rows of meeting_columns(fields)"""
+    columns = [f for f in fields if f != "participants"]
+    meetings = []
+    for row in rows:
+        meeting = dict(zip(columns, row))
+        if "tags" in meeting:
+            meeting["tags"] = _parse_tags(meeting["tags"])
+        meetings.append(meeting)
+    
+    if "participants" in fields:
+        # One query for all participants instead of one lazy load per meeting
+        by_meeting = {}
+        for meeting in meetings:
+            meeting["participants"] = by_meeting.setdefault(meeting["id"], [])
+        if by_meeting:
+            participants = db.query(
+                Participant.meeting_id, *[getattr(Participant, f) for f in PARTICIPANT_FIELDS]
+            ).filter(Participant.meeting_id.in_(list(by_meeting))).all()
+            for row in participants:
+                by_meeting[row[0]].append(dict(zip(PARTICIPANT_FIELDS, row[1:])))
+    return meetings
+
+def project_task(task: dict, fields: tuple = TASK_FIELDS, segment_fields: Optional[tuple] = None) -> dict:
+    """TranscriptionTask-shaped dict; `segment_fields` trims each result segment (e.g. drop tokens)"""
+    projected = {f: task.get(f) for f in fields}
+    result = projected.get("result")
+    if isinstance(result, CompactTranscript):
+        # Chỉ giải nén các cột được yêu cầu
+        projected["result"] = result.to_dict(segment_fields)
+    elif segment_fields and result and "segments" in result:
+        projected["result"] = {
+            **result,
+            "segments": [{k: seg[k] for k in segment_fields if k in seg} for seg in result["segments"]]
+        }
+    return projected
+
+def parse_segment_fields(segment_fields: Optional[str]) -> Optional[tuple]:
+    if not segment_fields:
+        return None
+    return tuple(f.strip() for f in segment_fields.split(",") if f.strip())
+
 # ==================== MEETING MANAGEMENT ENDPOINTS ====================
 
 @app.post("/api/meetings", response_model=MeetingResponse)
-async def create_meeting(meeting: MeetingCreate, db: Session = Depends(get_db)):
+def create_meeting(meeting: MeetingCreate, db: Session = Depends(get_db)):
     """Tạo cuộc họp mới"""
     meeting_id = str(uuid.uuid4())
     now = datetime.now()
@@ -291,19 +602,10 @@ async def create_meeting(meeting: MeetingCreate, db: Session = Depends(get_db)):
         db_meeting.set_tags_list(meeting.tags)
     
     db.add(db_meeting)
+    db.flush()
     
-    # Add participants
-    for participant in meeting.participants:
-        db_participant = Participant(
-            id=str(uuid.uuid4()),
-            meeting_id=meeting_id,
-            name=participant.name,
-            email=participant.email,
-            role=participant.role,
-            department=participant.department,
-            is_required=participant.is_required
-        )
-        db.add(db_participant)
+    # Add participants (linked to the people directory)
+    sync_participants(db, {meeting_id: meeting.participants}, now, existing=False)
     
     db.commit()
     db.refresh(db_meeting)
@@ -312,28 +614,149 @@ async def create_meeting(meeting: MeetingCreate, db: Session = Depends(get_db)):
     
     return MeetingResponse.from_orm(db_meeting)
 
-@app.get("/api/meetings/{meeting_id}", response_model=MeetingResponse)
-async def get_meeting(meeting_id: str, db: Session = Depends(get_db)):
+def bulk_writer(chunk_size: int = BULK_CHUNK_SIZE) -> BulkMeetingWriter:
+    """Writer shared by the bulk endpoint and `python -m bulk_import`"""
+    def cancel_jobs(meeting_ids):
+        for meeting_id in meeting_ids:
+            cancel_meeting_jobs(meeting_id)
+    return BulkMeetingWriter(SessionLocal, MeetingCreate, MeetingUpdate, chunk_size, before_delete=cancel_jobs)
+
+@app.post("/api/meetings/bulk/{operation}")
+async def bulk_meetings(
+    operation: str,
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", description="ndjson hoặc csv (mặc định theo Content-Type)"),
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000, description="Số dòng mỗi transaction"),
+    results: str = Query("all", pattern="^(all|errors|none)$", description="Dòng nào có trong kết quả")
+):
+    """Tạo/cập nhật/xóa nhiều cuộc họp từ body NDJSON hoặc CSV, kết quả theo từng dòng"""
+    if operation not in BULK_OPERATIONS:
+        raise HTTPException(status_code=404, detail=f"Thao tác không hợp lệ, chọn một trong: {', '.join(BULK_OPERATIONS)}")
+    
+    body = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_SIZE)
+    try:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        # Parsing, validation and chunked inserts are blocking: run them in the threadpool
+        outcome = await anyio.to_thread.run_sync(
+            bulk_writer(chunk_size).run, operation, body, fmt or detect_format(request.headers.get("content-type")), results
+        )
+    except BulkError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    finally:
+        body.close()
+    
+    return FastJSONResponse(outcome)
+
+CALENDAR_COLUMNS = (
+    Meeting.id, Meeting.title, Meeting.start_time, Meeting.end_time, Meeting.location,
+    Meeting.organizer, Meeting.status, Meeting.description, Meeting.location_type,
+    Meeting.audio_file_path, Meeting.transcription_id
+)
+
+# Status colors
+STATUS_COLORS = {
+    "draft": "#6B7280",
+    "scheduled": "#3B82F6",
+    "in_progress": "#F59E0B",
+    "completed": "#10B981",
+    "cancelled": "#EF4444",
+    "failed": "#EF4444",
+}
+
+def calendar_events(meetings) -> List[dict]:
+    """Calendar events from rows of CALENDAR_COLUMNS"""
+    return [{
+        "id": meeting.id,
+        "title": meeting.title,
+        "start": meeting.start_time.isoformat(),
+        "end": meeting.end_time.isoformat(),
+        "location": meeting.location or "",
+        "organizer": meeting.organizer,
+        "status": meeting.status,
+        "color": STATUS_COLORS.get(meeting.status, "#3B82F6"),
+        "extendedProps": {
+            "description": meeting.description or "",
+            "location_type": meeting.location_type or "physical",
+            "has_audio": bool(meeting.audio_file_path),
+            "has_transcription": bool(meeting.transcription_id)
+        }
+    } for meeting in meetings]
+
+# Static sub-paths must be registered before /api/meetings/{meeting_id}
+@app.get("/api/meetings/calendar")
+def get_calendar_events(
+    start: datetime = Query(..., description="Ngày bắt đầu (ISO format)"),
+    end: datetime = Query(..., description="Ngày kết thúc (ISO format)"),
+    db: Session = Depends(get_db)
+):
+    """Lấy sự kiện cho calendar"""
+    meetings = db.query(*CALENDAR_COLUMNS).filter(
+        Meeting.start_time >= start,
+        Meeting.end_time <= end
+    ).all()
+    
+    return FastJSONResponse(calendar_events(meetings))
+
+@app.get("/api/meetings/with-audio")
+def list_meetings_with_audio(
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Danh sách cuộc họp có audio"""
+    meetings = db.query(Meeting).filter(
+        Meeting.audio_file_path.isnot(None)
+    ).order_by(desc(Meeting.updated_at)).limit(limit).all()
+    
+    result = []
+    for meeting in meetings:
+        result.append({
+            "id": meeting.id,
+            "title": meeting.title,
+            "organizer": meeting.organizer,
+            "start_time": meeting.start_time.isoformat() if meeting.start_time else None,
+            "audio_file_name": meeting.audio_file_name,
+            "audio_file_size": meeting.audio_file_size,
+            "has_transcription": bool(meeting.transcription_id),
+            "has_summary": bool(meeting.summary),
+            "status": meeting.status,
+            "location": meeting.location,
+            "location_type": meeting.location_type,
+            "transcription_id": meeting.transcription_id
+        })
+    
+    return result
+
+@app.get("/api/meetings/{meeting_id}", **projected(MeetingResponse))
+def get_meeting(
+    meeting_id: str,
+    fields: Optional[str] = Query(None, description="Chỉ trả về các trường này (phân tách bằng dấu phẩy)"),
+    db: Session = Depends(get_db)
+):
     """Lấy thông tin chi tiết cuộc họp"""
-    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    selected = parse_fields(fields, MEETING_FIELDS)
+    row = db.query(*meeting_columns(selected)).filter(Meeting.id == meeting_id).first()
     
-    if not meeting:
+    if not row:
         raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
     
-    return MeetingResponse.from_orm(meeting)
+    return FastJSONResponse(project_meetings(db, [row], selected)[0])
 
-@app.get("/api/meetings", response_model=List[MeetingResponse])
-async def list_meetings(
+@app.get("/api/meetings", **projected(List[MeetingResponse]))
+def list_meetings(
     status: Optional[MeetingStatus] = None,
     organizer: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     limit: int = 50,
     offset: int = 0,
+    fields: Optional[str] = Query(None, description="Chỉ trả về các trường này, vd: id,title,start_time,status"),
     db: Session = Depends(get_db)
 ):
     """Danh sách cuộc họp với các bộ lọc"""
-    query = db.query(Meeting)
+    selected = parse_fields(fields, MEETING_FIELDS)
+    query = db.query(*meeting_columns(selected))
     
     # Apply filters
     if status:
@@ -346,12 +769,12 @@ async def list_meetings(
         query = query.filter(Meeting.end_time <= end_date)
     
     # Get meetings
-    meetings = query.order_by(Meeting.start_time.desc()).offset(offset).limit(limit).all()
+    rows = query.order_by(Meeting.start_time.desc()).offset(offset).limit(limit).all()
     
-    return [MeetingResponse.from_orm(meeting) for meeting in meetings]
+    return FastJSONResponse(project_meetings(db, rows, selected))
 
 @app.put("/api/meetings/{meeting_id}", response_model=MeetingResponse)
-async def update_meeting(
+def update_meeting(
     meeting_id: str,
     meeting_update: MeetingUpdate,
     db: Session = Depends(get_db)
@@ -370,20 +793,8 @@ async def update_meeting(
         elif field == "tags" and value:
             meeting.set_tags_list(value)
         elif field == "participants" and value:
-            # Delete existing participants
-            db.query(Participant).filter(Participant.meeting_id == meeting_id).delete()
-            # Add new participants
-            for participant in value:
-                db_participant = Participant(
-                    id=str(uuid.uuid4()),
-                    meeting_id=meeting_id,
-                    name=participant.name,
-                    email=participant.email,
-                    role=participant.role,
-                    department=participant.department,
-                    is_required=participant.is_required
-                )
-                db.add(db_participant)
+            # Only insert/update/delete the participants that changed (model_dump turned them into dicts)
+            sync_participants(db, {meeting_id: meeting_update.participants})
         elif value is not None:
             setattr(meeting, field, value)
     
@@ -396,84 +807,49 @@ async def update_meeting(
     return MeetingResponse.from_orm(meeting)
 
 @app.delete("/api/meetings/{meeting_id}")
-async def delete_meeting(meeting_id: str, db: Session = Depends(get_db)):
+def delete_meeting(meeting_id: str, db: Session = Depends(get_db)):
     """Xóa cuộc họp"""
     meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
     
     if not meeting:
         raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
     
+    # Stop any processing that would write into the deleted meeting
+    cancel_meeting_jobs(meeting_id)
+    
     # Delete associated files
-    if meeting.audio_file_path and os.path.exists(meeting.audio_file_path):
+    if meeting.audio_file_path:
         try:
-            os.remove(meeting.audio_file_path)
+            storage.delete(meeting.audio_file_path)
         except Exception as e:
             logger.error(f"Error deleting audio file: {e}")
     
-    # Delete transcription file if exists
-    if meeting.transcription_id:
-        transcription_file = Path("data/transcriptions") / f"transcription_{meeting.transcription_id}.json"
-        if transcription_file.exists():
+    # Delete the transcript files of every version
+    versions = [v for (v,) in db.query(Transcription.id).filter(Transcription.meeting_id == meeting_id)]
+    for transcription_id in {meeting.transcription_id, *versions} - {None}:
+        transcription_file = transcription_file_path(transcription_id)
+        if transcription_file:
             try:
-                os.remove(transcription_file)
+                storage.delete(transcription_file)
             except Exception as e:
                 logger.error(f"Error deleting transcription file: {e}")
     
-    # Delete from database
+    # Delete from database (meetings and transcriptions reference each other: unlink first)
+    meeting.transcription_id = None
+    db.flush()
+    db.query(Transcription).filter(Transcription.meeting_id == meeting_id).delete(synchronize_session=False)
     db.delete(meeting)
     db.commit()
     
     logger.info(f"✅ Deleted meeting: {meeting_id}")
     return {"message": "Đã xóa cuộc họp thành công", "meeting_id": meeting_id}
 
-@app.get("/api/meetings/calendar")
-async def get_calendar_events(
-    start: datetime = Query(..., description="Ngày bắt đầu (ISO format)"),
-    end: datetime = Query(..., description="Ngày kết thúc (ISO format)"),
-    db: Session = Depends(get_db)
-):
-    """Lấy sự kiện cho calendar"""
-    events = []
-    
-    meetings = db.query(Meeting).filter(
-        Meeting.start_time >= start,
-        Meeting.end_time <= end
-    ).all()
-    
-    # Status colors
-    status_colors = {
-        "draft": "#6B7280",
-        "scheduled": "#3B82F6",
-        "in_progress": "#F59E0B",
-        "completed": "#10B981",
-        "cancelled": "#EF4444",
-    }
-    
-    for meeting in meetings:
-        events.append({
-            "id": meeting.id,
-            "title": meeting.title,
-            "start": meeting.start_time.isoformat(),
-            "end": meeting.end_time.isoformat(),
-            "location": meeting.location or "",
-            "organizer": meeting.organizer,
-            "status": meeting.status,
-            "color": status_colors.get(meeting.status, "#3B82F6"),
-            "extendedProps": {
-                "description": meeting.description or "",
-                "location_type": meeting.location_type or "physical",
-                "has_audio": bool(meeting.audio_file_path),
-                "has_transcription": bool(meeting.transcription_id)
-            }
-        })
-    
-    return events
-
 @app.post("/api/meetings/{meeting_id}/record-audio")
-async def record_meeting_audio(
+def record_meeting_audio(
     meeting_id: str,
+    request: Request,
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
+    priority: JobPriority = Form(JobPriority.MEETING),
     db: Session = Depends(get_db)
 ):
     """Upload và lưu file ghi âm cho cuộc họp"""
@@ -482,6 +858,12 @@ async def record_meeting_audio(
     if not meeting:
         raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
     
+    client_id = get_client_id(request)
+    try:
+        job_queue.check_admission(client_id)
+    except AdmissionError as e:
+        raise _admission_rejected(e)
+    
     try:
         # Validate file size
         file_size = 0
@@ -489,13 +871,13 @@ async def record_meeting_audio(
         
         # Read file in chunks to get size
         while True:
-            chunk = await file.read(chunk_size)
+            chunk = file.file.read(chunk_size)
             if not chunk:
                 break
             file_size += len(chunk)
         
         # Reset file pointer
-        await file.seek(0)
+        file.file.seek(0)
         
         if file_size > MAX_AUDIO_SIZE:
             raise HTTPException(
@@ -503,15 +885,15 @@ async def record_meeting_audio(
                 detail=f"File quá lớn. Kích thước tối đa: {MAX_AUDIO_SIZE // (1024*1024)}MB"
             )
         
-        # Create unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_filename = file.filename.replace(" ", "_").replace("/", "_")
-        file_name = f"meeting_{meeting_id}_{timestamp}_{safe_filename}"
-        file_path = MEETING_AUDIO_DIR / file_name
+        try:
+            storage.check_quota(MEETING_AUDIO, file_size)
+        except StorageQuotaExceeded as e:
+            raise HTTPException(status_code=507, detail=e.message)
         
-        # Save file
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        # Save file (sharded by meeting id; the original name is kept in audio_file_name)
+        file_path = storage.save(
+            MEETING_AUDIO, meeting_id, storage.audio_path(meeting_id, Path(file.filename or "").suffix), file.file
+        )
         
         # Update meeting info
         meeting.status = "in_progress"
@@ -523,12 +905,26 @@ async def record_meeting_audio(
         
         logger.info(f"✅ Saved audio for meeting {meeting_id}: {file_path} ({meeting.audio_file_size:.2f} MB)")
         
-        # Process audio in background
-        background_tasks.add_task(
-            process_meeting_audio_background,
-            meeting_id=meeting_id,
-            audio_path=str(file_path)
-        )
+        # Peaks for the player are ready before the transcription finishes
+        executor.submit(build_waveform, meeting_id, str(file_path))
+        
+        # Queue audio processing (shares the transcription queue and tasks API)
+        task_id = str(uuid.uuid4())
+        audio_duration = probe_duration(str(file_path))
+        task = {
+            "id": task_id,
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "file_name": file.filename,
+            "audio_duration": round(audio_duration, 2),
+            "priority": priority.value,
+            "meeting_id": meeting_id,
+        }
+        try:
+            estimate = enqueue_transcription_job(task, str(file_path), client_id, meeting_id=meeting_id)
+        except AdmissionError as e:
+            # The audio is kept with the meeting; the client may retry processing later
+            raise _admission_rejected(e)
         
         return {
             "message": "File ghi âm đã được lưu thành công và đang xử lý",
@@ -536,7 +932,10 @@ async def record_meeting_audio(
             "file_name": file.filename,
             "file_size_mb": f"{meeting.audio_file_size:.2f}",
             "file_path": str(file_path),
-            "status": "in_progress"
+            "status": "in_progress",
+            "task_id": task_id,
+            "priority": priority.value,
+            **estimate
         }
         
     except HTTPException:
@@ -545,94 +944,515 @@ async def record_meeting_audio(
         logger.error(f"❌ Error saving audio for meeting {meeting_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lỗi khi lưu file ghi âm: {str(e)}")
 
-async def process_meeting_audio_background(meeting_id: str, audio_path: str):
-    """Xử lý audio cuộc họp trong background: phiên âm và tóm tắt"""
+@app.post("/api/meetings/{meeting_id}/retranscribe")
+def retranscribe_meeting_audio(
+    meeting_id: str,
+    request: Request,
+    options: Optional[TranscriptionOptions] = None,
+    priority: JobPriority = Query(JobPriority.BACKGROUND),
+    db: Session = Depends(get_db)
+):
+    """Phiên âm lại audio đã lưu của cuộc họp với `options`, thành một phiên bản transcript mới.
+    
+    Bản hiện tại vẫn đọc được cho tới khi bản mới xong; các phiên bản: /transcriptions.
+    """
+    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    if not meeting.audio_file_path or not os.path.exists(meeting.audio_file_path):
+        raise HTTPException(status_code=404, detail="Cuộc họp không có file ghi âm")
+    
+    client_id = get_client_id(request)
+    try:
+        job_queue.check_admission(client_id)
+    except AdmissionError as e:
+        raise _admission_rejected(e)
+    
+    options = options or TranscriptionOptions()
+    task_id = str(uuid.uuid4())
+    # The version is registered up front so it is listed (queued) while the current one stays in place
+    version = add_version(db, task_id, meeting, options=options.model_dump())
+    task = {
+        "id": task_id,
+        "status": "queued",
+        "created_at": datetime.now().isoformat(),
+        "file_name": meeting.audio_file_name,
+        "audio_duration": round(probe_duration(meeting.audio_file_path), 2),
+        "priority": priority.value,
+        "meeting_id": meeting_id,
+    }
+    try:
+        estimate = enqueue_transcription_job(
+            task, meeting.audio_file_path, client_id, options=options, meeting_id=meeting_id, kind="retranscribe"
+        )
+    except AdmissionError as e:
+        db.delete(version)
+        db.commit()
+        raise _admission_rejected(e)
+    
+    logger.info(f"🔁 Queued re-transcription of meeting {meeting_id} as version {version.version}")
+    return {
+        "message": "Đã đưa cuộc họp vào hàng đợi phiên âm lại",
+        "meeting_id": meeting_id,
+        "transcription_id": task_id,
+        "version": version.version,
+        "current_transcription_id": meeting.transcription_id,
+        "status": "queued",
+        "task_id": task_id,
+        "priority": priority.value,
+        **estimate
+    }
+
+def _set_task_status(task_id: Optional[str], status: str, **fields):
+    # The task entry may have been deleted while the job was running
+    if task_id and task_id in transcription_tasks:
+        if transcription_tasks[task_id]["status"] == "cancelled":
+            return
+        transcription_tasks[task_id]["status"] = status
+        transcription_tasks[task_id].update(fields)
+        if status != "queued":
+            transcription_tasks[task_id].pop("queue_position", None)
+            transcription_tasks[task_id].pop("estimated_wait_seconds", None)
+
+def collect_segments(segments, cancel_event: Optional[threading.Event] = None, on_segment=None) -> list:
+    """Drain the lazy segment generator, stopping between segments once cancelled"""
+    collected = []
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+    for segment in segments:
+        collected.append(segment)
+        if on_segment is not None:
+            on_segment(segment)
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled()
+    return collected
+
+def segment_to_dict(segment, index: int, offset: float = 0.0, word_timestamps: bool = False,
+                    timeline: Optional[SpeechTimeline] = None) -> dict:
+    """Serialize a Whisper segment; `offset` shifts timestamps of a resumed run back to the full audio,
+    `timeline` maps timestamps of speech-only audio back to it"""
+    def original(t: float, end: bool = False) -> float:
+        return timeline.original(t, end) if timeline is not None else t + offset
+    
+    segment_data = {
+        "id": index,
+        "seek": segment.seek,
+        "start": original(segment.start),
+        "end": original(segment.end, end=True),
+        "text": segment.text,
+        "tokens": segment.tokens,
+        "temperature": segment.temperature,
+        "avg_logprob": segment.avg_logprob,
+        "compression_ratio": segment.compression_ratio,
+        "no_speech_prob": segment.no_speech_prob,
+    }
+    
+    if word_timestamps and getattr(segment, 'words', None):
+        segment_data["words"] = [
+            {"word": word.word, "start": original(word.start), "end": original(word.end, end=True),
+             "probability": word.probability}
+            for word in segment.words
+        ]
+    
+    return segment_data
+
+def identify_language(model, audio_path: str, state: Optional[CheckpointState],
+                      contexts: Optional[List[str]] = None) -> Optional[LanguageGuess]:
+    """Language to decode with, from a cached hint or a short speech sample (None: Whisper detects it)"""
+    if state and state.language:
+        # A resumed run keeps the language of its first attempt
+        return None
+    try:
+        guess = language_identifier.identify(model, audio_path, contexts)
+    except Exception as e:
+        logger.warning(f"⚠️ Language identification failed for {audio_path}: {e}")
+        return None
+    if guess is not None:
+        logger.info(f"🌐 Language of {Path(audio_path).name}: {guess.language} "
+                    f"({guess.source}, p={guess.probability:.2f})")
+    return guess
+
+def speech_map_for(audio_path: str, kwargs: dict) -> Optional[SpeechMap]:
+    """Cached speech map to decode `audio_path` with instead of running VAD again (None: Whisper runs VAD)"""
+    if not (speech_maps.enabled and kwargs.get("vad_filter")):
+        return None
+    try:
+        speech = speech_maps.get(audio_path, kwargs.get("vad_parameters"), batched="batch_size" in kwargs)
+    except Exception as e:
+        logger.warning(f"⚠️ Speech map failed for {audio_path}, falling back to Whisper VAD: {e}")
+        return None
+    # No speech at all: let Whisper decide what to do with the file, as before
+    return speech if speech.spans else None
+
+def open_checkpoint(task_id: Optional[str]):
+    """Load the checkpoint of a queued job and record a new attempt (None if the job has none)"""
+    if not task_id:
+        return None, None
+    checkpoint = JobCheckpoint(task_id)
+    state = checkpoint.load()
+    if state is None:
+        return None, None
+    checkpoint.start_attempt()
+    return checkpoint, state
+
+def run_checkpointed_transcription(
+    model,
+    audio_path: str,
+    kwargs: dict,
+    checkpoint: Optional[JobCheckpoint] = None,
+    state: Optional[CheckpointState] = None,
+    cancel_event: Optional[threading.Event] = None,
+    word_timestamps: bool = False,
+    speech: Optional[SpeechMap] = None
+):
+    """Transcribe audio, checkpointing every segment as it is decoded.
+    
+    If the checkpoint already holds segments (the job was interrupted), only
+    the audio after the last one is decoded, with the detected language and
+    the last segment texts as prompt so the transcript continues seamlessly.
+    
+    With a `speech` map VAD is not run again: batched inference decodes its
+    planned clips (clip_timestamps), sequential decoding gets the speech
+    joined together like vad_filter does and timestamps are mapped back.
+    
+    Returns (segments_data, language, language_probability).
+    """
+    segments_data = list(state.segments) if state else []
+    offset = state.resume_from if state else 0.0
+    audio = audio_path
+    if offset > 0:
+        logger.info(f"⏩ Resuming task {checkpoint.job_id} from {offset:.1f}s ({len(segments_data)} segments checkpointed)")
+        audio = load_audio(audio_path, offset)
+        kwargs = dict(kwargs)
+        if state.language:
+            kwargs["language"] = state.language
+        kwargs["initial_prompt"] = " ".join(s["text"].strip() for s in segments_data[-3:])
+        if len(audio) < SAMPLE_RATE // 10:
+            # Crashed after the last segment was written
+            return segments_data, state.language, state.language_probability
+    
+    timeline = None
+    if speech is not None:
+        if offset > 0 and not speech.clips(offset=offset):
+            # No speech left after the resume point
+            return segments_data, state.language, state.language_probability
+        kwargs = {k: v for k, v in kwargs.items() if k != "vad_parameters"}
+        kwargs["vad_filter"] = False
+        if "batch_size" in kwargs:
+            kwargs["clip_timestamps"] = speech.clip_timestamps(offset)
+        else:
+            audio, timeline = speech.speech_audio(audio if offset > 0 else load_audio(audio_path), offset)
+    
+    segments, info = model.transcribe(audio, **kwargs)
+    
+    if checkpoint is not None and not (state and state.language):
+        checkpoint.record_info(info.language, info.language_probability)
+    language = state.language if state and state.language else info.language
+    language_probability = state.language_probability if state and state.language else info.language_probability
+    
+    def on_segment(segment):
+        segment_data = segment_to_dict(segment, len(segments_data), offset, word_timestamps, timeline)
+        segments_data.append(segment_data)
+        if checkpoint is not None:
+            checkpoint.append_segment(segment_data)
+    
+    collect_segments(segments, cancel_event, on_segment)
+    return segments_data, language, language_probability
+
+def enqueue_transcription_job(
+    task: dict,
+    audio_path: str,
+    client_id: str,
+    options: Optional[TranscriptionOptions] = None,
+    meeting_id: Optional[str] = None,
+    temp_file: bool = False,
+    force: bool = False,
+    kind: Optional[str] = None
+) -> dict:
+    """Register a task, write its checkpoint header and submit it to the job queue.
+    
+    With the database queue the job row is the durable record and a
+    whisper_worker runs it; the task is not kept in this process.
+    
+    Raises AdmissionError after rolling back the task and checkpoint.
+    """
+    task_id = task["id"]
+    payload = {
+        "kind": kind or ("meeting" if meeting_id else "transcription"),
+        "audio_path": audio_path,
+        "file_name": task.get("file_name"),
+        "options": options.model_dump() if options else None,
+        "meeting_id": meeting_id,
+        "temp_file": temp_file,
+    }
+    if JOB_QUEUE_BACKEND == "database":
+        estimate = job_queue.submit(Job(
+            id=task_id,
+            client_id=client_id,
+            func=None,
+            audio_duration=task.get("audio_duration") or 0.0,
+            priority=task.get("priority", JobPriority.ADHOC.value),
+            payload=payload
+        ), force=force)
+        task.update(estimate)
+        return estimate
+    
+    checkpoint = JobCheckpoint(task_id)
+    if not checkpoint.exists():
+        JobCheckpoint.create(
+            task_id,
+            payload["kind"],
+            task=dict(task),
+            audio_path=audio_path,
+            client_id=client_id,
+            options=payload["options"],
+            meeting_id=meeting_id,
+            temp_file=temp_file
+        )
+    
+    def on_cancel():
+        checkpoint.discard()
+        if temp_file:
+            storage.delete(audio_path)
+        if payload["kind"] == "retranscribe":
+            set_version_status(task_id, VERSION_CANCELLED)
+        elif payload["kind"] == "meeting":
+            _reset_cancelled_meeting(meeting_id)
+    
+    cancel_event = threading.Event()
+    if payload["kind"] == "refine":
+        func = lambda: refine_meeting_transcript(meeting_id, audio_path, task_id, cancel_event)
+    elif payload["kind"] == "retranscribe":
+        func = lambda: retranscribe_meeting(meeting_id, audio_path, options or TranscriptionOptions(), task_id, cancel_event)
+    elif meeting_id:
+        func = lambda: process_meeting_audio_background(meeting_id, audio_path, task_id, cancel_event)
+    else:
+        func = lambda: process_transcription(task_id, audio_path, options, cancel_event)
+    
+    func = profiler.wrap_job(func, task_id, payload["kind"], profiler.job_mode())
+    
+    transcription_tasks[task_id] = task
+    try:
+        estimate = job_queue.submit(Job(
+            id=task_id,
+            client_id=client_id,
+            func=func,
+            audio_duration=task.get("audio_duration") or 0.0,
+            priority=task.get("priority", JobPriority.ADHOC.value),
+            cancel_event=cancel_event,
+            on_cancel=on_cancel,
+            payload=payload
+        ), force=force)
+    except AdmissionError:
+        del transcription_tasks[task_id]
+        checkpoint.discard()
+        raise
+    task.update(estimate)
+    return estimate
+
+def _mark_meeting_failed(meeting_id: str):
     db = SessionLocal()
+    try:
+        meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+        if meeting:
+            meeting.status = MeetingStatus.FAILED.value
+            meeting.updated_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+
+def _reset_cancelled_meeting(meeting_id: str):
+    """Đưa cuộc họp đang xử lý về scheduled khi job bị hủy (như delete_meeting_audio)"""
+    db = SessionLocal()
+    try:
+        meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+        if meeting and meeting.status == MeetingStatus.IN_PROGRESS.value:
+            meeting.status = MeetingStatus.SCHEDULED.value
+            meeting.updated_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+
+def recover_interrupted_jobs() -> int:
+    """Re-queue jobs whose checkpoint survived a crash or restart (called on startup)"""
+    recovered = 0
+    for checkpoint in list_checkpoints():
+        state = checkpoint.load()
+        if state is None:
+            checkpoint.discard()
+            continue
+        
+        header = state.header
+        task = dict(header["task"])
+        audio_path = header["audio_path"]
+        meeting_id = header.get("meeting_id")
+        
+        reason = None
+        if state.attempts >= MAX_RESUME_ATTEMPTS:
+            reason = f"Job interrupted {state.attempts} times, giving up"
+        elif not os.path.exists(audio_path):
+            reason = "Audio file not found"
+        
+        if reason:
+            logger.error(f"❌ Cannot resume task {checkpoint.job_id}: {reason}")
+            task.update(status="failed", error=reason)
+            transcription_tasks[checkpoint.job_id] = task
+            if header.get("kind") == "retranscribe":
+                set_version_status(checkpoint.job_id, VERSION_FAILED, error=reason)
+            elif meeting_id and header.get("kind") != "refine":
+                # A failed refinement leaves the draft transcript in place
+                _mark_meeting_failed(meeting_id)
+            checkpoint.discard()
+            if header.get("temp_file"):
+                storage.delete(audio_path)
+            continue
+        
+        task["status"] = "queued"
+        options = TranscriptionOptions(**header["options"]) if header.get("options") else None
+        enqueue_transcription_job(
+            task,
+            audio_path,
+            header.get("client_id", "recovered"),
+            options=options,
+            meeting_id=meeting_id,
+            temp_file=header.get("temp_file", False),
+            force=True,
+            kind=header.get("kind")
+        )
+        recovered += 1
+        logger.info(f"♻️ Re-queued interrupted task {checkpoint.job_id} "
+                    f"(attempt {state.attempts + 1}, {len(state.segments)} segments checkpointed)")
+    return recovered
+
+def cancel_meeting_jobs(meeting_id: str) -> int:
+    """Cancel queued/running processing jobs of a meeting"""
+    cancelled = 0
+    if JOB_QUEUE_BACKEND == "database":
+        cancelled = sum(1 for task_id in job_queue.active_task_ids(meeting_id) if job_queue.cancel(task_id))
+    for task_id, task in list(transcription_tasks.items()):
+        if task.get("meeting_id") == meeting_id and task["status"] in ("queued", "processing"):
+            if job_queue.cancel(task_id):
+                task["status"] = "cancelled"
+                cancelled += 1
+    if cancelled:
+        logger.info(f"🛑 Cancelled {cancelled} processing job(s) for meeting {meeting_id}")
+    return cancelled
+
+def process_meeting_audio_background(
+    meeting_id: str,
+    audio_path: str,
+    task_id: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Xử lý audio cuộc họp trong background: phiên âm và tóm tắt (chạy trong worker thread)"""
+    db = SessionLocal()
+    _set_task_status(task_id, "processing")
+    checkpoint, state = open_checkpoint(task_id)
+    keep_checkpoint = False
     try:
         logger.info(f"🔄 Processing audio in background for meeting {meeting_id}: {audio_path}")
         
         # Check if file exists
         if not os.path.exists(audio_path):
             logger.error(f"❌ Audio file not found: {audio_path}")
+            _set_task_status(task_id, "failed", error="Audio file not found")
+            _mark_meeting_failed(meeting_id)
             return
         
-        # 1. Transcribe using Whisper
+        # 1. Transcribe using Whisper (a fast draft when two-pass is on, refined later)
         try:
-            options = TranscriptionOptions(
-                model_size="base",
+            options, decision = route_options(TranscriptionOptions(
+                model_size=DRAFT_TIER.model_size if MEETING_TWO_PASS else MEETING_MODEL,
+                compute_type=DRAFT_TIER.compute_type if MEETING_TWO_PASS else None,
+                beam_size=DRAFT_TIER.beam_size if MEETING_TWO_PASS else None,
                 device="cpu",
-                compute_type="int8",
-                language="vi",
                 word_timestamps=False,
                 vad_filter=True,
                 use_batched_mode=False
-            )
-            
-            key = f"{options.model_size}_{options.device}_{options.compute_type}"
-            if key not in model_cache:
-                logger.info(f"📥 Loading model for meeting transcription: {options.model_size}")
-                model = WhisperModel(
-                    options.model_size,
-                    device=options.device,
-                    compute_type=options.compute_type,
-                    download_root=os.environ.get("MODEL_DIR", None)
-                )
-                model_cache[key] = model
+            ), task_id)
             
-            model = model_cache[key]
+            model = get_or_load_model(options)
+            meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+            contexts = meeting_contexts(meeting) if meeting else []
+            guess = identify_language(model, audio_path, state, contexts)
             
             # Run transcription
             logger.info(f"🎤 Starting transcription for meeting {meeting_id}")
-            segments, info = model.transcribe(
+            started = time.perf_counter()
+            kwargs = {
+                "beam_size": options.beam_size,
+                "language": guess.language if guess else None,
+                "vad_filter": True,
+                "vad_parameters": MEETING_VAD
+            }
+            speech = speech_map_for(audio_path, kwargs)
+            segments_data, language, language_probability = run_checkpointed_transcription(
+                model,
                 audio_path,
-                beam_size=5,
-                language="vi",
-                vad_filter=True,
-                vad_parameters={
-                    "threshold": 0.5,
-                    "min_speech_duration_ms": 250,
-                    "min_silence_duration_ms": 2000
-                }
+                kwargs,
+                checkpoint,
+                state,
+                cancel_event,
+                speech=speech
             )
+            if segments_data and not (state and state.segments):
+                model_router.observe(options_tier(options), segments_data[-1]["end"], time.perf_counter() - started)
+            if not (state and state.language):
+                if guess is not None:
+                    language_probability = guess.probability
+                language_identifier.settle(contexts, guess, language, language_probability, segments_data)
+            escalated = escalate_low_confidence(
+                segments_data, audio_path, decision, options, language, time.perf_counter() - started, cancel_event
+            )
+            transcript_text = " ".join([segment["text"] for segment in segments_data])
             
-            segments_list = list(segments)
-            transcript_text = " ".join([segment.text for segment in segments_list])
-            
-            logger.info(f"✅ Transcription completed for meeting {meeting_id}, {len(segments_list)} segments")
+            logger.info(f"✅ Transcription completed for meeting {meeting_id}, {len(segments_data)} segments")
             
             # 2. Create summary from transcript
-            summary = await summarize_text_async(transcript_text, "vi")
+            summary = summarize_text(transcript_text, language or "vi")
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled()
             
             # 3. Update meeting info in database
             meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
             
+            refine_task_id = None
             if meeting:
                 transcription_id = str(uuid.uuid4())
                 transcription_result = {
                     "segments": [
                         {
-                            "id": i,
-                            "start": seg.start,
-                            "end": seg.end,
-                            "text": seg.text
+                            "id": seg["id"],
+                            "start": seg["start"],
+                            "end": seg["end"],
+                            "text": seg["text"]
                         }
-                        for i, seg in enumerate(segments_list)
+                        for seg in segments_data
                     ],
-                    "language": info.language,
-                    "language_probability": info.language_probability,
+                    "language": language,
+                    "language_probability": language_probability,
+                    "language_source": guess.source if guess else "whisper",
+                    "speech": speech.summary() if speech else None,
                     "full_text": transcript_text,
+                    "model": model_info(options, decision, escalated),
                     "meeting_id": meeting_id,
                     "audio_path": audio_path,
                     "created_at": datetime.now().isoformat()
                 }
+                if MEETING_TWO_PASS and segments_data:
+                    refine_task_id = str(uuid.uuid4())
+                    mark_draft(transcription_result, refine_task_id)
                 
                 # Save transcription to file
-                data_dir = Path("data") / "transcriptions"
-                data_dir.mkdir(exist_ok=True)
-                
-                transcription_file = data_dir / f"transcription_{transcription_id}.json"
-                with open(transcription_file, 'w', encoding='utf-8') as f:
-                    json.dump(transcription_result, f, ensure_ascii=False, indent=2)
+                transcription_file = write_transcript(
+                    storage.transcription_path(transcription_id, TRANSCRIPT_EXTENSION), transcription_result
+                )
+                storage.register(TRANSCRIPTION, transcription_id, transcription_file)
+                add_version(db, transcription_id, meeting, VERSION_COMPLETED, file_path=str(transcription_file),
+                            language=language, duration=segments_data[-1]["end"] if segments_data else 0.0,
+                            model=options_tier(options).key)
                 
                 # Update meeting
                 meeting.transcription_id = transcription_id
@@ -642,21 +1462,367 @@ async def process_meeting_audio_background(meeting_id: str, audio_path: str):
                 db.commit()
                 
                 logger.info(f"✅ Finished processing audio for meeting {meeting_id}")
+                if refine_task_id:
+                    enqueue_refinement(refine_task_id, meeting, audio_path, segments_data[-1]["end"])
+            _set_task_status(task_id, "completed", result={
+                "transcription_id": meeting.transcription_id if meeting else None,
+                "refine_task_id": refine_task_id
+            })
             
+        except JobCancelled:
+            if job_queue.shutting_down and checkpoint is not None:
+                # Server is stopping: keep the checkpoint so the job resumes on next start
+                logger.info(f"💾 Processing for meeting {meeting_id} interrupted, will resume from checkpoint")
+                keep_checkpoint = True
+            else:
+                logger.info(f"🛑 Processing cancelled for meeting {meeting_id}")
+                _set_task_status(task_id, "cancelled")
+                _reset_cancelled_meeting(meeting_id)
         except Exception as e:
             logger.error(f"❌ Transcription error for meeting {meeting_id}: {str(e)}")
+            _set_task_status(task_id, "failed", error=str(e))
             meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
             if meeting:
+                meeting.status = MeetingStatus.FAILED.value
                 meeting.updated_at = datetime.now()
                 db.commit()
         
     except Exception as e:
         logger.error(f"❌ Error processing meeting audio for {meeting_id}: {str(e)}")
+        _set_task_status(task_id, "failed", error=str(e))
     finally:
+        if checkpoint is not None:
+            if keep_checkpoint:
+                checkpoint.close()
+            else:
+                checkpoint.discard()
         db.close()
 
+# ==================== TWO-PASS REFINEMENT ====================
+
+def mark_draft(transcript: dict, refine_task_id: str):
+    """Tag a fresh draft transcript: version 1, every segment pending refinement"""
+    transcript["version"] = 1
+    for segment in transcript["segments"]:
+        segment["version"] = 1
+        segment["pass"] = "draft"
+    transcript["refinement"] = {
+        "status": "queued",
+        "model": model_router.best.key,
+        "refined_until": 0.0,
+        "task_id": refine_task_id,
+    }
+
+def enqueue_refinement(task_id: str, meeting: Meeting, audio_path: str, audio_duration: float):
+    """Queue the refinement pass of a meeting transcript in the idle priority class"""
+    task = {
+        "id": task_id,
+        "status": "queued",
+        "created_at": datetime.now().isoformat(),
+        "file_name": meeting.audio_file_name,
+        "audio_duration": round(audio_duration, 2),
+        "priority": REFINEMENT_PRIORITY,
+        "meeting_id": meeting.id,
+    }
+    try:
+        enqueue_transcription_job(task, audio_path, "refinement", meeting_id=meeting.id, force=True, kind="refine")
+    except Exception as e:
+        # The draft stays; the meeting can still be re-processed later
+        logger.error(f"❌ Could not queue refinement for meeting {meeting.id}: {e}")
+
+def refinement_window(segments: list, first: int, window_seconds: float) -> dict:
+    """Draft segments from `first` spanning about `window_seconds`, as a span like ModelRouter.escalation_spans"""
+    last = first
+    while last + 1 < len(segments) and segments[last + 1]["end"] - segments[first]["start"] <= window_seconds:
+        last += 1
+    # Extend towards the neighbouring segments (Whisper segment boundaries are not exact)
+    start = max(segments[first - 1]["end"] if first > 0 else 0.0, segments[first]["start"] - 0.5)
+    end = segments[last]["end"] + 0.5
+    if last + 1 < len(segments):
+        end = min(end, segments[last + 1]["start"])
+    return {"first": first, "last": last, "start": start, "end": end}
+
+def store_refined_transcript(meeting_id: str, transcription_id: str, path: Path, data: dict,
+                             summary: Optional[str] = None) -> bool:
+    """Rewrite the transcript if it still belongs to the meeting (False once replaced or deleted)"""
+    with SessionLocal() as db:
+        meeting = db.query(Meeting).filter(
+            Meeting.id == meeting_id, Meeting.transcription_id == transcription_id
+        ).first()
+        if meeting is None:
+            return False
+        write_transcript(path, data)
+        storage.register(TRANSCRIPTION, transcription_id, path)
+        if summary is not None:
+            meeting.summary = summary
+            meeting.updated_at = datetime.now()
+            version = db.get(Transcription, transcription_id)
+            if version is not None:
+                version.model = data["refinement"]["model"]
+            db.commit()
+    return True
+
+def refine_meeting_transcript(
+    meeting_id: str,
+    audio_path: str,
+    task_id: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Second pass of a two-pass meeting transcription (runs in a worker thread, idle priority class).
+    
+    The draft is re-transcribed with the best tier one window at a time. Each window
+    replaces its draft segments in place under a new transcript version, so clients
+    polling with ?since_version= only fetch what changed. Progress lives in the
+    transcript itself: when regular jobs are waiting the pass stops after the
+    current window and queues the rest as a new refinement job.
+    """
+    _set_task_status(task_id, "processing")
+    checkpoint, _ = open_checkpoint(task_id)
+    keep_checkpoint = False
+    transcription_id, path, data = None, None, None
+    try:
+        with SessionLocal() as db:
+            meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+            if meeting is not None and meeting.audio_file_path == audio_path:
+                transcription_id = meeting.transcription_id
+        path = transcription_file_path(transcription_id) if transcription_id else None
+        if path is None or path.suffix != TRANSCRIPT_EXTENSION:
+            logger.info(f"⏭️ Skipping refinement for meeting {meeting_id}: the draft was replaced or deleted")
+            _set_task_status(task_id, "cancelled")
+            return
+        
+        data = read_transcript(path)
+        segments = data["segments"]
+        version = data.get("version", 1)
+        first = next((i for i, s in enumerate(segments) if s.get("pass") == "draft"), len(segments))
+        
+        tier = model_router.best
+        model = get_or_load_model(TranscriptionOptions(
+            model_size=tier.model_size, compute_type=tier.compute_type, device="cpu"
+        ))
+        audio = load_audio(audio_path)
+        language = data.get("language")
+        started = time.perf_counter()
+        refined_seconds = 0.0
+        data["refinement"].update(status="running", model=tier.key, task_id=task_id)
+        logger.info(f"✨ Refining meeting {meeting_id} with {tier.key} from segment {first}/{len(segments)}")
+        
+        while first < len(segments):
+            window = refinement_window(segments, first, REFINE_WINDOW_SECONDS)
+            clip = audio[int(window["start"] * SAMPLE_RATE):int(window["end"] * SAMPLE_RATE)]
+            prompt = " ".join(s["text"].strip() for s in segments[max(first - 3, 0):first]) or None
+            decoded, _ = model.transcribe(
+                clip,
+                language=language,
+                beam_size=tier.beam_size,
+                vad_filter=False,
+                condition_on_previous_text=False,
+                initial_prompt=prompt
+            )
+            version += 1
+            refined = [
+                {"id": 0, "start": seg.start + window["start"], "end": seg.end + window["start"],
+                 "text": seg.text, "version": version, "pass": "refined"}
+                for seg in collect_segments(decoded, cancel_event)
+            ]
+            segments[window["first"]:window["last"] + 1] = refined
+            first = window["first"] + len(refined)
+            for index, segment in enumerate(segments):
+                segment["id"] = index
+            refined_seconds += window["end"] - window["start"]
+            
+            data["version"] = version
+            data["full_text"] = " ".join(s["text"] for s in segments)
+            data["refinement"]["refined_until"] = round(min(window["end"], len(audio) / SAMPLE_RATE), 3)
+            
+            if first < len(segments) and job_queue.regular_waiting():
+                # Hand the worker back to regular jobs; the rest is queued behind them
+                next_task_id = str(uuid.uuid4())
+                data["refinement"].update(status="queued", task_id=next_task_id)
+                if not store_refined_transcript(meeting_id, transcription_id, path, data):
+                    raise JobCancelled()
+                with SessionLocal() as db:
+                    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+                    enqueue_refinement(next_task_id, meeting, audio_path, segments[-1]["end"] - window["end"])
+                logger.info(f"⏸️ Refinement of meeting {meeting_id} yielded at {window['end']:.1f}s, "
+                            f"continues as task {next_task_id}")
+                _set_task_status(task_id, "completed", result={
+                    "transcription_id": transcription_id, "version": version, "continued_by": next_task_id
+                })
+                return
+            if not store_refined_transcript(meeting_id, transcription_id, path, data):
+                raise JobCancelled()
+        
+        if refined_seconds > 0:
+            model_router.observe(tier, refined_seconds, time.perf_counter() - started)
+        data["refinement"].update(status="completed", task_id=task_id, completed_at=datetime.now().isoformat())
+        summary = summarize_text(data["full_text"], language or "vi")
+        if not store_refined_transcript(meeting_id, transcription_id, path, data, summary):
+            raise JobCancelled()
+        logger.info(f"✅ Refined transcript of meeting {meeting_id} (version {version}, {refined_seconds:.1f}s of audio)")
+        _set_task_status(task_id, "completed", result={"transcription_id": transcription_id, "version": version})
+    
+    except JobCancelled:
+        if job_queue.shutting_down and checkpoint is not None:
+            # Refined windows are already in the transcript; the job resumes after them on next start
+            logger.info(f"💾 Refinement of meeting {meeting_id} interrupted, will resume")
+            keep_checkpoint = True
+        else:
+            logger.info(f"🛑 Refinement cancelled for meeting {meeting_id}")
+            _set_task_status(task_id, "cancelled")
+    except Exception as e:
+        logger.error(f"❌ Refinement error for meeting {meeting_id}: {str(e)}")
+        _set_task_status(task_id, "failed", error=str(e))
+        if data is not None and data.get("refinement"):
+            # Keep the draft (and the windows refined so far) readable
+            data["refinement"].update(status="failed", error=str(e))
+            try:
+                store_refined_transcript(meeting_id, transcription_id, path, data)
+            except Exception:
+                pass
+    finally:
+        if checkpoint is not None:
+            if keep_checkpoint:
+                checkpoint.close()
+            else:
+                checkpoint.discard()
+
+# ==================== RE-TRANSCRIPTION ====================
+
+def set_version_status(transcription_id: str, status: str, **fields):
+    """Update the status row of a transcript version (no-op once the version is gone)"""
+    with SessionLocal() as db:
+        version = db.get(Transcription, transcription_id)
+        if version is None:
+            return
+        version.status = status
+        for name, value in fields.items():
+            setattr(version, name, value)
+        version.updated_at = datetime.now()
+        db.commit()
+
+def retranscribe_meeting(
+    meeting_id: str,
+    audio_path: str,
+    options: TranscriptionOptions,
+    task_id: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Transcribe the stored audio of a meeting again with `options` as a new transcript version
+    (runs in a worker thread; the version id is the task id).
+    
+    Cached artifacts are reused: the speech map of the audio, the language hint of
+    the meeting and loaded models. The current version stays the meeting's transcript,
+    readable, until this one completes; a failure leaves it untouched.
+    """
+    transcription_id = task_id
+    _set_task_status(task_id, "processing")
+    checkpoint, state = open_checkpoint(task_id)
+    keep_checkpoint = False
+    try:
+        with SessionLocal() as db:
+            meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+            contexts = meeting_contexts(meeting) if meeting else []
+            current_audio = meeting.audio_file_path if meeting else None
+        if current_audio != audio_path or not os.path.exists(audio_path):
+            logger.info(f"⏭️ Skipping re-transcription of meeting {meeting_id}: the audio was replaced or deleted")
+            set_version_status(transcription_id, VERSION_CANCELLED, error="Audio replaced or deleted")
+            _set_task_status(task_id, "cancelled")
+            return
+        set_version_status(transcription_id, VERSION_PROCESSING)
+        
+        options, decision = route_options(options, task_id)
+        if options.vad_parameters is None and not options.use_batched_mode:
+            # Same VAD as the first transcription, so its speech map is reused
+            options = options.model_copy(update={"vad_parameters": MEETING_VAD})
+        model = get_or_load_model(options)
+        guess = None if options.language else identify_language(model, audio_path, state, contexts)
+        model, kwargs = decode_kwargs(model, options, guess)
+        
+        logger.info(f"🔁 Re-transcribing meeting {meeting_id} with {options_tier(options).key} as {transcription_id}")
+        started = time.perf_counter()
+        speech = speech_map_for(audio_path, kwargs)
+        segments_data, language, language_probability = run_checkpointed_transcription(
+            model, audio_path, kwargs, checkpoint, state, cancel_event, options.word_timestamps, speech
+        )
+        if segments_data and not (state and state.segments):
+            model_router.observe(options_tier(options), segments_data[-1]["end"], time.perf_counter() - started)
+        if guess is not None:
+            language_probability = guess.probability
+        escalated = escalate_low_confidence(
+            segments_data, audio_path, decision, options, language, time.perf_counter() - started, cancel_event
+        )
+        transcript_text = " ".join(segment["text"] for segment in segments_data)
+        summary = summarize_text(transcript_text, language or "vi")
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled()
+        
+        result = {
+            "segments": [
+                {key: seg[key] for key in ("id", "start", "end", "text", "words") if key in seg}
+                for seg in segments_data
+            ],
+            "language": language,
+            "language_probability": language_probability,
+            "language_source": "requested" if options.language else guess.source if guess else "whisper",
+            "speech": speech.summary() if speech else None,
+            "full_text": transcript_text,
+            "summary": summary,
+            "model": model_info(options, decision, escalated),
+            "meeting_id": meeting_id,
+            "audio_path": audio_path,
+            "created_at": datetime.now().isoformat()
+        }
+        transcription_file = write_transcript(
+            storage.transcription_path(transcription_id, TRANSCRIPT_EXTENSION), result
+        )
+        storage.register(TRANSCRIPTION, transcription_id, transcription_file)
+        
+        with SessionLocal() as db:
+            version = db.get(Transcription, transcription_id)
+            meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+            if version is None or meeting is None:
+                # Meeting or version deleted while running
+                storage.delete(transcription_file)
+                raise JobCancelled()
+            version.status = VERSION_COMPLETED
+            version.file_path = str(transcription_file)
+            version.language = language
+            version.duration = segments_data[-1]["end"] if segments_data else 0.0
+            version.model = options_tier(options).key
+            version.updated_at = datetime.now()
+            if meeting.audio_file_path == audio_path:
+                meeting.transcription_id = transcription_id
+                meeting.summary = summary
+                meeting.status = "completed"
+                meeting.updated_at = datetime.now()
+            db.commit()
+            number = version.version
+        
+        logger.info(f"✅ Re-transcribed meeting {meeting_id}: version {number}, {len(segments_data)} segments")
+        _set_task_status(task_id, "completed", result={"transcription_id": transcription_id, "version": number})
+    
+    except JobCancelled:
+        if job_queue.shutting_down and checkpoint is not None:
+            logger.info(f"💾 Re-transcription of meeting {meeting_id} interrupted, will resume from checkpoint")
+            keep_checkpoint = True
+        else:
+            logger.info(f"🛑 Re-transcription cancelled for meeting {meeting_id}")
+            set_version_status(transcription_id, VERSION_CANCELLED)
+            _set_task_status(task_id, "cancelled")
+    except Exception as e:
+        logger.error(f"❌ Re-transcription error for meeting {meeting_id}: {str(e)}")
+        set_version_status(transcription_id, VERSION_FAILED, error=str(e))
+        _set_task_status(task_id, "failed", error=str(e))
+    finally:
+        if checkpoint is not None:
+            if keep_checkpoint:
+                checkpoint.close()
+            else:
+                checkpoint.discard()
+
 @app.get("/api/meetings/{meeting_id}/audio")
-async def get_meeting_audio(
+def get_meeting_audio(
     meeting_id: str,
     db: Session = Depends(get_db)
 ):
@@ -689,8 +1855,69 @@ async def get_meeting_audio(
         filename=meeting.audio_file_name or f"recording_{meeting_id}.webm"
     )
 
+def build_waveform(meeting_id: str, audio_path: str):
+    """Precompute waveform peaks and speech spans for an uploaded recording (runs in the executor)"""
+    try:
+        ensure_waveform(audio_path, on_created=lambda path: storage.register(WAVEFORM, meeting_id, path))
+    except Exception as e:
+        logger.error(f"❌ Waveform computation failed for meeting {meeting_id}: {e}")
+
+@app.get("/api/meetings/{meeting_id}/waveform")
+def get_meeting_waveform(
+    meeting_id: str,
+    start: float = Query(0.0, ge=0, description="Giây bắt đầu"),
+    end: Optional[float] = Query(None, gt=0, description="Giây kết thúc (mặc định: hết audio)"),
+    max_points: int = Query(2000, ge=10, le=20000, description="Số peak tối đa; chọn mức zoom phù hợp"),
+    level: Optional[int] = Query(None, ge=0, description="Mức zoom cố định (0 = chi tiết nhất)"),
+    db: Session = Depends(get_db)
+):
+    """Peak min/max (int8) của audio cuộc họp và các đoạn có tiếng nói"""
+    meeting = db.query(Meeting.audio_file_path).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    if not meeting.audio_file_path or not os.path.exists(meeting.audio_file_path):
+        raise HTTPException(status_code=404, detail="Cuộc họp không có file ghi âm")
+    
+    try:
+        # Audio from before peaks existed is processed on first request
+        waveform = ensure_waveform(
+            meeting.audio_file_path, on_created=lambda path: storage.register(WAVEFORM, meeting_id, path)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error loading waveform for meeting {meeting_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Lỗi khi tạo dạng sóng: {str(e)}")
+    
+    return waveform.window(start, end, max_points, level)
+
+@app.get("/api/meetings/{meeting_id}/speech")
+def get_meeting_speech(
+    meeting_id: str,
+    start: float = Query(0.0, ge=0, description="Giây bắt đầu"),
+    end: Optional[float] = Query(None, gt=0, description="Giây kết thúc (mặc định: hết audio)"),
+    db: Session = Depends(get_db)
+):
+    """Các đoạn có tiếng nói của audio cuộc họp (cùng tham số VAD với pipeline) và tỉ lệ tiếng nói"""
+    meeting = db.query(Meeting.audio_file_path).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    if not meeting.audio_file_path or not os.path.exists(meeting.audio_file_path):
+        raise HTTPException(status_code=404, detail="Cuộc họp không có file ghi âm")
+    
+    try:
+        # Computed once per audio content; the transcription of the meeting reuses it
+        speech = speech_maps.get(meeting.audio_file_path, MEETING_VAD)
+    except Exception as e:
+        logger.error(f"❌ Error computing speech map for meeting {meeting_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xác định đoạn tiếng nói: {str(e)}")
+    
+    return speech.to_dict(start, end)
+
 @app.delete("/api/meetings/{meeting_id}/audio")
-async def delete_meeting_audio(
+def delete_meeting_audio(
     meeting_id: str,
     db: Session = Depends(get_db)
 ):
@@ -701,9 +1928,12 @@ async def delete_meeting_audio(
         raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
     
     try:
+        # Stop processing of the audio being deleted
+        if cancel_meeting_jobs(meeting_id) and meeting.status == "in_progress":
+            meeting.status = "scheduled"
+        
         # Delete file from disk
-        if meeting.audio_file_path and os.path.exists(meeting.audio_file_path):
-            os.remove(meeting.audio_file_path)
+        if storage.delete(meeting.audio_file_path):
             logger.info(f"🗑️ Deleted audio file: {meeting.audio_file_path}")
         
         # Update database
@@ -720,41 +1950,14 @@ async def delete_meeting_audio(
         logger.error(f"❌ Error deleting audio for meeting {meeting_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lỗi khi xóa file ghi âm: {str(e)}")
 
-@app.get("/api/meetings/with-audio")
-async def list_meetings_with_audio(
-    limit: int = 10,
-    db: Session = Depends(get_db)
-):
-    """Danh sách cuộc họp có audio"""
-    meetings = db.query(Meeting).filter(
-        Meeting.audio_file_path.isnot(None)
-    ).order_by(desc(Meeting.updated_at)).limit(limit).all()
-    
-    result = []
-    for meeting in meetings:
-        result.append({
-            "id": meeting.id,
-            "title": meeting.title,
-            "organizer": meeting.organizer,
-            "start_time": meeting.start_time.isoformat() if meeting.start_time else None,
-            "audio_file_name": meeting.audio_file_name,
-            "audio_file_size": meeting.audio_file_size,
-            "has_transcription": bool(meeting.transcription_id),
-            "has_summary": bool(meeting.summary),
-            "status": meeting.status,
-            "location": meeting.location,
-            "location_type": meeting.location_type,
-            "transcription_id": meeting.transcription_id
-        })
-    
-    return result
-
 @app.get("/api/meetings/{meeting_id}/transcription")
-async def get_meeting_transcription(
+def get_meeting_transcription(
     meeting_id: str,
+    segment_fields: Optional[str] = Query(None, description="Trường của mỗi segment, vd: start,end,text"),
+    since_version: Optional[int] = Query(None, ge=0, description="Chỉ trả về segment được tinh chỉnh sau version này"),
     db: Session = Depends(get_db)
 ):
-    """Lấy bản phiên âm của cuộc họp"""
+    """Lấy bản phiên âm của cuộc họp (bản nháp được thay dần bằng bản tinh chỉnh, xem `version`)"""
     meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
     
     if not meeting:
@@ -763,15 +1966,22 @@ async def get_meeting_transcription(
     if not meeting.transcription_id:
         raise HTTPException(status_code=404, detail="Cuộc họp chưa có transcription")
     
+    transcription_file = transcription_file_path(meeting.transcription_id)
+    if not transcription_file:
+        raise HTTPException(status_code=404, detail="Không tìm thấy file transcription")
+    
     try:
-        data_dir = Path("data") / "transcriptions"
-        transcription_file = data_dir / f"transcription_{meeting.transcription_id}.json"
-        
-        if not transcription_file.exists():
-            raise HTTPException(status_code=404, detail="Không tìm thấy file transcription")
-        
-        with open(transcription_file, 'r', encoding='utf-8') as f:
-            transcription_data = json.load(f)
+        fields = parse_segment_fields(segment_fields)
+        if since_version is None:
+            transcription_data = read_transcript(transcription_file, fields)
+        else:
+            transcription_data = read_transcript(transcription_file, fields and fields + ("version",))
+            transcription_data["segments"] = [
+                seg for seg in transcription_data["segments"] if seg.get("version", 1) > since_version
+            ]
+            if fields and "version" not in fields:
+                for seg in transcription_data["segments"]:
+                    seg.pop("version", None)
         
         # Add meeting info
         transcription_data["meeting_info"] = {
@@ -788,7 +1998,7 @@ async def get_meeting_transcription(
         raise HTTPException(status_code=500, detail=f"Lỗi khi đọc transcription: {str(e)}")
 
 @app.delete("/api/meetings/{meeting_id}/transcription")
-async def delete_meeting_transcription(
+def delete_meeting_transcription(
     meeting_id: str,
     db: Session = Depends(get_db)
 ):
@@ -802,13 +2012,16 @@ async def delete_meeting_transcription(
         raise HTTPException(status_code=404, detail="Cuộc họp không có transcription")
     
     try:
-        data_dir = Path("data") / "transcriptions"
-        transcription_file = data_dir / f"transcription_{meeting.transcription_id}.json"
+        transcription_file = transcription_file_path(meeting.transcription_id)
         
-        if transcription_file.exists():
-            os.remove(transcription_file)
+        if transcription_file:
+            storage.delete(transcription_file)
         
+        # Other versions stay listed under /transcriptions
+        transcription_id = meeting.transcription_id
         meeting.transcription_id = None
+        db.flush()
+        db.query(Transcription).filter(Transcription.id == transcription_id).delete(synchronize_session=False)
         meeting.summary = None
         meeting.updated_at = datetime.now()
         db.commit()
@@ -820,26 +2033,311 @@ async def delete_meeting_transcription(
         logger.error(f"❌ Error deleting transcription for meeting {meeting_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Lỗi khi xóa transcription: {str(e)}")
 
+# ==================== TRANSCRIPT VERSIONS ====================
+
+def get_version_or_404(db: Session, meeting: Meeting, ref: str, completed: bool = True) -> Transcription:
+    """Version of `meeting` by transcription id or version number"""
+    query = db.query(Transcription).filter(Transcription.meeting_id == meeting.id)
+    version = query.filter(Transcription.version == int(ref)).first() if ref.isdigit() else \
+        query.filter(Transcription.id == ref).first()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy phiên bản transcription")
+    if completed and (version.status or VERSION_COMPLETED) != VERSION_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Phiên bản {version.version} chưa hoàn thành ({version.status})")
+    return version
+
+def read_version(version: Transcription, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    transcription_file = transcription_file_path(version.id)
+    if not transcription_file:
+        raise HTTPException(status_code=404, detail="Không tìm thấy file transcription")
+    return read_transcript(transcription_file, fields)
+
+@app.get("/api/meetings/{meeting_id}/transcriptions")
+def list_meeting_transcriptions(meeting_id: str, db: Session = Depends(get_db)):
+    """Các phiên bản transcript của cuộc họp (cũ -> mới), kể cả bản đang phiên âm lại"""
+    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    return {
+        "meeting_id": meeting_id,
+        "current_transcription_id": meeting.transcription_id,
+        "versions": [version_dict(v, meeting.transcription_id) for v in list_versions(db, meeting)],
+    }
+
+@app.get("/api/meetings/{meeting_id}/transcriptions/diff")
+def diff_meeting_transcriptions(
+    meeting_id: str,
+    base: Optional[str] = Query(None, description="Id hoặc số phiên bản làm bản tham chiếu (mặc định: bản hoàn thành trước `other`)"),
+    other: Optional[str] = Query(None, description="Id hoặc số phiên bản so sánh (mặc định: bản hiện tại)"),
+    limit: int = Query(200, ge=1, le=5000, description="Số chỗ khác nhau tối đa trả về"),
+    db: Session = Depends(get_db)
+):
+    """So sánh hai phiên bản transcript theo từ: tỉ lệ lỗi từ (gần đúng) và các chỗ khác nhau kèm mốc thời gian"""
+    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    list_versions(db, meeting)
+    if other is None and not meeting.transcription_id:
+        raise HTTPException(status_code=404, detail="Cuộc họp chưa có transcription")
+    other_version = get_version_or_404(db, meeting, other or meeting.transcription_id)
+    if base is None:
+        base_version = db.query(Transcription).filter(
+            Transcription.meeting_id == meeting_id,
+            Transcription.version < other_version.version,
+            or_(Transcription.status == VERSION_COMPLETED, Transcription.status.is_(None))
+        ).order_by(desc(Transcription.version)).first()
+        if base_version is None:
+            raise HTTPException(status_code=404, detail="Không có phiên bản cũ hơn để so sánh")
+    else:
+        base_version = get_version_or_404(db, meeting, base)
+    
+    fields = ("start", "text")
+    diff = diff_transcripts(read_version(base_version, fields), read_version(other_version, fields), limit)
+    return {
+        "meeting_id": meeting_id,
+        "base": version_dict(base_version, meeting.transcription_id),
+        "other": version_dict(other_version, meeting.transcription_id),
+        **diff
+    }
+
+@app.get("/api/meetings/{meeting_id}/transcriptions/{transcription_id}")
+def get_meeting_transcription_version(
+    meeting_id: str,
+    transcription_id: str,
+    segment_fields: Optional[str] = Query(None, description="Trường của mỗi segment, vd: start,end,text"),
+    db: Session = Depends(get_db)
+):
+    """Một phiên bản transcript của cuộc họp (theo id hoặc số phiên bản)"""
+    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    list_versions(db, meeting)
+    version = get_version_or_404(db, meeting, transcription_id)
+    data = read_version(version, parse_segment_fields(segment_fields))
+    data["transcription"] = version_dict(version, meeting.transcription_id)
+    return data
+
+@app.post("/api/meetings/{meeting_id}/transcriptions/{transcription_id}/activate")
+def activate_meeting_transcription(meeting_id: str, transcription_id: str, db: Session = Depends(get_db)):
+    """Đặt một phiên bản đã hoàn thành làm transcript hiện tại của cuộc họp (vd: quay lại bản cũ)"""
+    meeting = db.query(Meeting).filter(Meeting.id == meeting_id).first()
+    
+    if not meeting:
+        raise HTTPException(status_code=404, detail="Không tìm thấy cuộc họp")
+    
+    list_versions(db, meeting)
+    version = get_version_or_404(db, meeting, transcription_id)
+    data = read_version(version)
+    meeting.transcription_id = version.id
+    # Versions from before summaries were stored with the transcript are summarized again
+    meeting.summary = data.get("summary") or summarize_text(data.get("full_text", ""), data.get("language") or "vi")
+    meeting.status = "completed"
+    meeting.updated_at = datetime.now()
+    db.commit()
+    
+    logger.info(f"📌 Meeting {meeting_id} now uses transcript version {version.version}")
+    return {"meeting_id": meeting_id, **version_dict(version, meeting.transcription_id)}
+
+# ==================== PEOPLE DIRECTORY ENDPOINTS ====================
+
+def person_dict(person: Person) -> dict:
+    return {"id": person.id, "name": person.name, "email": person.email, "department": person.department}
+
+def get_person_or_404(db: Session, person_id: str) -> Person:
+    person = db.query(Person).filter(Person.id == person_id).first()
+    if not person:
+        raise HTTPException(status_code=404, detail="Không tìm thấy người này")
+    return person
+
+@app.get("/api/people")
+def list_people(
+    q: str = Query(..., min_length=1, description="Email hoặc tên (khớp phần đầu)"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Tìm người trong danh bạ theo email/tên"""
+    return FastJSONResponse([person_dict(person) for person in search_people(db, q, limit)])
+
+@app.get("/api/people/{person_id}")
+def get_person(person_id: str, db: Session = Depends(get_db)):
+    """Thông tin một người và số cuộc họp đã tham dự"""
+    person = get_person_or_404(db, person_id)
+    meetings = db.query(func.count(func.distinct(Participant.meeting_id))).filter(Participant.person_id == person_id).scalar()
+    return FastJSONResponse({**person_dict(person), "meeting_count": meetings})
+
+@app.get("/api/people/{person_id}/meetings", **projected(List[MeetingResponse]))
+def list_person_meetings(
+    person_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[MeetingStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description="Chỉ trả về các trường này, vd: id,title,start_time,status"),
+    db: Session = Depends(get_db)
+):
+    """Các cuộc họp mà một người tham dự, mới nhất trước"""
+    get_person_or_404(db, person_id)
+    selected = parse_fields(fields, MEETING_FIELDS)
+    query = db.query(*meeting_columns(selected)).filter(Meeting.id.in_(person_meeting_ids(person_id)))
+    if start_date:
+        query = query.filter(Meeting.start_time >= start_date)
+    if end_date:
+        query = query.filter(Meeting.end_time <= end_date)
+    if status:
+        query = query.filter(Meeting.status == status.value)
+    rows = query.order_by(Meeting.start_time.desc()).offset(offset).limit(limit).all()
+    return FastJSONResponse(project_meetings(db, rows, selected))
+
+@app.get("/api/people/{person_id}/calendar")
+def get_person_calendar(
+    person_id: str,
+    start: datetime = Query(..., description="Ngày bắt đầu (ISO format)"),
+    end: datetime = Query(..., description="Ngày kết thúc (ISO format)"),
+    db: Session = Depends(get_db)
+):
+    """Lịch của một người trong khoảng thời gian (cùng định dạng /api/meetings/calendar)"""
+    get_person_or_404(db, person_id)
+    meetings = db.query(*CALENDAR_COLUMNS).filter(
+        Meeting.id.in_(person_meeting_ids(person_id)),
+        Meeting.start_time >= start,
+        Meeting.end_time <= end
+    ).order_by(Meeting.start_time).all()
+    return FastJSONResponse(calendar_events(meetings))
+
 # ==================== TRANSCRIPTION ENDPOINTS ====================
 
+def model_threads(concurrency: int) -> dict:
+    """CPU threads per model replica and replicas per model, so concurrent jobs share the CPU budget"""
+    return {
+        "cpu_threads": TUNING_PROFILE.threads_for(concurrency, HARDWARE.cpu_budget),
+        "num_workers": concurrency,
+    }
+
+# whisper_worker replaces this with its own --concurrency
+MODEL_THREADS = model_threads(TRANSCRIPTION_WORKERS)
+
 def get_or_load_model(options: TranscriptionOptions):
     """Get or load model from cache"""
-    key = f"{options.model_size}_{options.device}_{options.compute_type}"
-    
-    if key not in model_cache:
-        logger.info(f"📥 Loading model: {options.model_size} on {options.device} with {options.compute_type}")
-        model = WhisperModel(
-            options.model_size,
-            device=options.device,
-            compute_type=options.compute_type,
-            download_root=os.environ.get("MODEL_DIR", None)
+    compute_type = options.compute_type
+    threads = {}
+    if options.device == "cpu":
+        compute_type = TUNING_PROFILE.resolve_compute_type(options.compute_type, HARDWARE)
+        threads = MODEL_THREADS
+    key = f"{options.model_size}_{options.device}_{compute_type}"
+    
+    with model_cache_lock:
+        if key not in model_cache:
+            logger.info(f"📥 Loading model: {options.model_size} on {options.device} with {compute_type} "
+                        f"{threads} ({get_backend_name()} backend)")
+            model = load_whisper_model(
+                options.model_size,
+                device=options.device,
+                compute_type=compute_type,
+                **threads
+            )
+            model_cache[key] = model
+        
+        return model_cache[key]
+
+def route_options(options: TranscriptionOptions, task_id: Optional[str]) -> Tuple[TranscriptionOptions, Optional[RouteDecision]]:
+    """Resolve model_size="auto" and unset compute type / beam size for a job that is about to run"""
+    if options.model_size != AUTO_MODEL:
+        return options.model_copy(update={
+            "compute_type": options.compute_type or TUNING_PROFILE.compute_type,
+            "beam_size": options.beam_size or DEFAULT_BEAM_SIZE,
+        }), None
+    
+    task = transcription_tasks.get(task_id, {}) if task_id else {}
+    waited = 0.0
+    if task.get("created_at"):
+        waited = max((datetime.now() - datetime.fromisoformat(task["created_at"])).total_seconds(), 0.0)
+    queue = job_queue.stats()
+    decision = model_router.route(
+        task.get("audio_duration") or 0.0,
+        waited,
+        queue.get("queued_audio_seconds", 0.0),
+        queue.get("live_workers") or queue["workers"],
+        task.get("priority"),
+    )
+    logger.info(f"🧭 Task {task_id}: {decision.tier.key} ({decision.reason}, waited {waited:.0f}s, "
+                f"predicted {decision.predicted_seconds:.0f}s, SLA {decision.sla_seconds:.0f}s)")
+    return options.model_copy(update={
+        "model_size": decision.tier.model_size,
+        "compute_type": options.compute_type or decision.tier.compute_type,
+        "beam_size": options.beam_size or decision.tier.beam_size,
+    }), decision
+
+def options_tier(options: TranscriptionOptions) -> ModelTier:
+    return ModelTier(options.model_size, options.compute_type, options.beam_size)
+
+def escalate_low_confidence(
+    segments_data: list,
+    audio_path: str,
+    decision: Optional[RouteDecision],
+    options: TranscriptionOptions,
+    language: Optional[str],
+    elapsed: float,
+    cancel_event: Optional[threading.Event] = None
+) -> dict:
+    """Re-transcribe low-confidence spans of a routed (smaller model) transcript with the best tier.
+    
+    Only spans that fit in the time left before the SLA are redone; segments are replaced in place.
+    """
+    if decision is None or not segments_data:
+        return {"segments": 0, "seconds": 0.0}
+    budget = model_router.escalation_budget(decision, elapsed)
+    spans = model_router.escalation_spans(segments_data, segments_data[-1]["end"], budget) if budget > 0 else []
+    if not spans:
+        return {"segments": 0, "seconds": 0.0}
+    
+    tier = model_router.best
+    model = get_or_load_model(options.model_copy(update={"model_size": tier.model_size, "compute_type": tier.compute_type}))
+    audio = load_audio(audio_path)
+    started = time.perf_counter()
+    replaced, seconds = 0, 0.0
+    # Replace from the end so earlier span indexes stay valid
+    for span in reversed(spans):
+        clip = audio[int(span["start"] * SAMPLE_RATE):int(span["end"] * SAMPLE_RATE)]
+        segments, _ = model.transcribe(
+            clip,
+            language=language,
+            beam_size=tier.beam_size,
+            word_timestamps=options.word_timestamps,
+            vad_filter=False,
+            condition_on_previous_text=False
         )
-        model_cache[key] = model
-    
-    return model_cache[key]
+        segments_data[span["first"]:span["last"] + 1] = [
+            segment_to_dict(segment, 0, span["start"], options.word_timestamps)
+            for segment in collect_segments(segments, cancel_event)
+        ]
+        replaced += span["last"] - span["first"] + 1
+        seconds += span["end"] - span["start"]
+    for index, segment in enumerate(segments_data):
+        segment["id"] = index
+    
+    model_router.observe(tier, seconds, time.perf_counter() - started)
+    model_router.record_escalation(replaced, seconds)
+    logger.info(f"🔁 Re-transcribed {replaced} low-confidence segment(s) ({seconds:.1f}s of audio) with {tier.key}")
+    return {"model_size": tier.model_size, "segments": replaced, "seconds": round(seconds, 1)}
+
+def model_info(options: TranscriptionOptions, decision: Optional[RouteDecision], escalated: dict) -> dict:
+    """How the transcript was produced (stored with the result)"""
+    if decision is not None:
+        info = decision.to_dict()
+    else:
+        info = {"model_size": options.model_size, "compute_type": options.compute_type,
+                "beam_size": options.beam_size, "reason": "requested"}
+    return {**info, "escalated": escalated}
 
-async def summarize_text_async(text: str, language_code: str) -> Optional[str]:
-    """Summarize text asynchronously"""
+def summarize_text(text: str, language_code: str) -> Optional[str]:
+    """Summarize text (blocking, call from a worker thread)"""
     language_map = {
         "en": "english",
         "vi": "english",  # Sumy doesn't have Vietnamese, use English tokenizer
@@ -873,93 +2371,124 @@ async def summarize_text_async(text: str, language_code: str) -> Optional[str]:
             logger.error(f"❌ Error during Sumy summarization: {e}")
             return f"Lỗi tóm tắt: {str(e)}"
 
+    return sumy_task(text)
+
+async def summarize_text_async(text: str, language_code: str) -> Optional[str]:
+    """Summarize text asynchronously"""
     loop = asyncio.get_event_loop()
-    summary = await loop.run_in_executor(executor, sumy_task, text)
+    summary = await loop.run_in_executor(executor, summarize_text, text, language_code)
     return summary
 
-async def process_transcription(task_id: str, file_path: str, options: TranscriptionOptions):
-    """Process transcription in background"""
-    try:
-        transcription_tasks[task_id]["status"] = "processing"
-        
-        # Load model
-        model = get_or_load_model(options)
+def decode_kwargs(model, options: TranscriptionOptions, guess: Optional[LanguageGuess]):
+    """Model (batched pipeline when requested) and transcribe() parameters for `options`"""
+    kwargs = {
+        "beam_size": options.beam_size,
+        "word_timestamps": options.word_timestamps,
+        "vad_filter": options.vad_filter,
+        "condition_on_previous_text": options.condition_on_previous_text,
+    }
+    
+    if options.language or guess:
+        kwargs["language"] = options.language or guess.language
         
-        # Prepare transcription parameters
-        kwargs = {
-            "beam_size": options.beam_size,
-            "word_timestamps": options.word_timestamps,
-            "vad_filter": options.vad_filter,
-            "condition_on_previous_text": options.condition_on_previous_text,
-        }
+    if options.vad_parameters:
+        kwargs["vad_parameters"] = options.vad_parameters
+    
+    # Batched inference plans its chunks from VAD, so it needs vad_filter
+    if options.use_batched_mode and options.vad_filter:
+        model = batched_pipeline(model)
+        kwargs["batch_size"] = options.batch_size or 16
+    return model, kwargs
+
+def process_transcription(
+    task_id: str,
+    file_path: str,
+    options: TranscriptionOptions,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Process transcription (runs in a job queue worker thread)"""
+    checkpoint, state = open_checkpoint(task_id)
+    keep_checkpoint = False
+    try:
+        _set_task_status(task_id, "processing")
         
-        if options.language:
-            kwargs["language"] = options.language
-            
-        if options.vad_parameters:
-            kwargs["vad_parameters"] = options.vad_parameters
+        # Pick model / compute type / beam size for this job
+        with stage("route"):
+            options, decision = route_options(options, task_id)
+        with stage("load_model"):
+            model = get_or_load_model(options)
+        with stage("language_id"):
+            guess = None if options.language else identify_language(model, file_path, state)
+        model, kwargs = decode_kwargs(model, options, guess)
         
         # Run transcription
         start_time = datetime.now()
-        segments, info = model.transcribe(file_path, **kwargs)
-        segments_list = list(segments)
+        with stage("speech_map"):
+            speech = speech_map_for(file_path, kwargs)
+        with stage("decode"):
+            segments_data, language, language_probability = run_checkpointed_transcription(
+                model, file_path, kwargs, checkpoint, state, cancel_event, options.word_timestamps, speech
+            )
+        audio_duration = segments_data[-1]["end"] if segments_data else 0
+        if guess is not None:
+            language_probability = guess.probability
+        if not (state and state.segments):
+            # A resumed run only decoded part of the audio
+            model_router.observe(options_tier(options), audio_duration, (datetime.now() - start_time).total_seconds())
+        with stage("escalate"):
+            escalated = escalate_low_confidence(
+                segments_data, file_path, decision, options, language,
+                (datetime.now() - start_time).total_seconds(), cancel_event
+            )
         processing_time = (datetime.now() - start_time).total_seconds()
         
-        # Prepare result
-        segments_data = []
-        for i, segment in enumerate(segments_list):
-            segment_data = {
-                "id": i,
-                "seek": segment.seek,
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text,
-                "tokens": segment.tokens,
-                "temperature": segment.temperature,
-                "avg_logprob": segment.avg_logprob,
-                "compression_ratio": segment.compression_ratio,
-                "no_speech_prob": segment.no_speech_prob,
-            }
-            
-            if options.word_timestamps and hasattr(segment, 'words'):
-                segment_data["words"] = [
-                    {"word": word.word, "start": word.start, "end": word.end, "probability": word.probability}
-                    for word in segment.words
-                ]
-                
-            segments_data.append(segment_data)
-        
         result = {
             "segments": segments_data,
-            "language": info.language,
-            "language_probability": info.language_probability,
+            "language": language,
+            "language_probability": language_probability,
+            "language_source": "requested" if options.language else guess.source if guess else "whisper",
             "processing_time": processing_time,
-            "audio_duration": segments_list[-1].end if segments_list else 0,
+            "audio_duration": audio_duration,
+            "speech": speech.summary() if speech else None,
+            "model": model_info(options, decision, escalated),
         }
         
-        transcription_tasks[task_id]["status"] = "completed"
-        transcription_tasks[task_id]["result"] = result
+        # Giữ kết quả dạng cột nén trong registry; giải nén khi client đọc task
+        with stage("store"):
+            _set_task_status(task_id, "completed", result=CompactTranscript.from_dict(result))
         
         logger.info(f"✅ Transcription completed for task {task_id}")
         
+    except JobCancelled:
+        if job_queue.shutting_down and checkpoint is not None:
+            # Server is stopping: keep the upload and checkpoint so the job resumes on next start
+            logger.info(f"💾 Transcription {task_id} interrupted, will resume from checkpoint")
+            keep_checkpoint = True
+        else:
+            logger.info(f"🛑 Transcription cancelled for task {task_id}")
+            _set_task_status(task_id, "cancelled")
     except Exception as e:
         logger.exception(f"❌ Error processing transcription: {str(e)}")
-        transcription_tasks[task_id]["status"] = "failed"
-        transcription_tasks[task_id]["error"] = str(e)
+        _set_task_status(task_id, "failed", error=str(e))
     finally:
+        if checkpoint is not None:
+            if keep_checkpoint:
+                checkpoint.close()
+            else:
+                checkpoint.discard()
         try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
+            if not keep_checkpoint:
+                storage.delete(file_path)
         except Exception as e:
             logger.error(f"❌ Error removing temporary file: {str(e)}")
 
 def parse_form_options(
-    model_size: str = Form("large-v3"),
+    model_size: str = Form(AUTO_MODEL),
     device: str = Form("cpu"),
-    compute_type: str = Form("int8"),
+    compute_type: Optional[str] = Form(None),
     language: Optional[str] = Form(None),
     batch_size: int = Form(16),
-    beam_size: int = Form(5),
+    beam_size: Optional[int] = Form(None),
     word_timestamps: str = Form("false"),
     vad_filter: str = Form("true"),
     condition_on_previous_text: str = Form("true"),
@@ -985,12 +2514,10 @@ def parse_form_options(
     )
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
+def read_root(request: Request):
     """Serve main HTML page"""
     try:
-        with open("templates/index.html", "r", encoding="utf-8") as f:
-            html_content = f.read()
-        return HTMLResponse(content=html_content)
+        return template_cache.get("templates/index.html").response(request.headers)
     except Exception as e:
         logger.error(f"❌ Error loading template: {e}")
         return HTMLResponse(content="""
@@ -1023,27 +2550,48 @@ async def read_root():
         </html>""")
 
 @app.get("/index.html", response_class=HTMLResponse)
-async def serve_index_html():
-    return await read_root()
+def serve_index_html(request: Request):
+    return read_root(request)
+
+def get_client_id(request: Request) -> str:
+    """Identify the submitter for per-client limits (X-Client-ID header or IP)"""
+    return request.headers.get("X-Client-ID") or (request.client.host if request.client else "unknown")
+
+def _admission_rejected(e: AdmissionError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=e.message,
+        headers={"Retry-After": str(e.retry_after)}
+    )
 
 @app.post("/api/transcribe", response_model=TranscriptionTask)
-async def transcribe_audio(
-    background_tasks: BackgroundTasks,
+def transcribe_audio(
+    request: Request,
     file: UploadFile = File(...),
-    options: TranscriptionOptions = Depends(parse_form_options)
+    options: TranscriptionOptions = Depends(parse_form_options),
+    priority: JobPriority = Form(JobPriority.ADHOC)
 ):
     """Transcribe audio file"""
     logger.info(f"🎯 Received transcription request with options: {options}")
+    client_id = get_client_id(request)
+    
+    # Reject before writing anything to UPLOAD_DIR
+    try:
+        job_queue.check_admission(client_id)
+    except AdmissionError as e:
+        logger.warning(f"⏳ Rejected transcription from {client_id}: {e.message}")
+        raise _admission_rejected(e)
     
     # Create task
     task_id = str(uuid.uuid4())
-    file_path = UPLOAD_DIR / f"{task_id}_{file.filename}"
+    file_path = storage.upload_path(task_id, file.filename or "")
     
     try:
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save file (indexed with an expiry so crashes never leave it behind)
+        storage.save_upload(task_id, file.filename or "", file.file)
+        audio_duration = probe_duration(str(file_path))
     except Exception as e:
+        storage.delete(file_path)
         raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
     
     # Create task entry
@@ -1052,17 +2600,16 @@ async def transcribe_audio(
         "status": "queued",
         "created_at": datetime.now().isoformat(),
         "file_name": file.filename,
+        "audio_duration": round(audio_duration, 2),
+        "priority": priority.value,
     }
     
-    transcription_tasks[task_id] = task
-    
-    # Start processing in background
-    background_tasks.add_task(
-        process_transcription,
-        task_id=task_id,
-        file_path=str(file_path),
-        options=options
-    )
+    # Queue for processing
+    try:
+        enqueue_transcription_job(task, str(file_path), client_id, options=options, temp_file=True)
+    except AdmissionError as e:
+        storage.delete(file_path)
+        raise _admission_rejected(e)
     
     return JSONResponse(status_code=202, content=task)
 
@@ -1086,17 +2633,42 @@ async def summarize_text_api(data: SummaryRequest):
         logger.error(f"❌ Summarization API error: {e}")
         return {"summary": f"Lỗi trong quá trình tóm tắt: {str(e)}"}
 
-@app.get("/api/tasks/{task_id}", response_model=TranscriptionTask)
-async def get_task(task_id: str):
+@app.get("/api/tasks/{task_id}", **projected(TranscriptionTask))
+def get_task(
+    task_id: str,
+    fields: Optional[str] = Query(None, description="Chỉ trả về các trường này (phân tách bằng dấu phẩy)"),
+    segment_fields: Optional[str] = Query(None, description="Trường của mỗi segment trong result, vd: start,end,text")
+):
     """Get transcription task status"""
+    selected = parse_fields(fields, TASK_FIELDS)
+    if JOB_QUEUE_BACKEND == "database":
+        task = job_queue.get_task(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return FastJSONResponse(project_task(task, selected, parse_segment_fields(segment_fields)))
+    
     if task_id not in transcription_tasks:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return transcription_tasks[task_id]
+    task = transcription_tasks[task_id]
+    if task["status"] == "queued":
+        task.update(job_queue.estimate(task_id) or {})
+    return FastJSONResponse(project_task(task, selected, parse_segment_fields(segment_fields)))
 
-@app.get("/api/tasks", response_model=List[TranscriptionTask])
-async def list_tasks(limit: int = 10, status: Optional[str] = None):
+@app.get("/api/tasks", **projected(List[TranscriptionTask]))
+def list_tasks(
+    limit: int = 10,
+    status: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Chỉ trả về các trường này, vd: id,status,queue_position,estimated_wait_seconds"),
+    segment_fields: Optional[str] = Query(None, description="Trường của mỗi segment trong result, vd: start,end,text")
+):
     """List transcription tasks"""
+    selected = parse_fields(fields, TASK_FIELDS)
+    seg_fields = parse_segment_fields(segment_fields)
+    if JOB_QUEUE_BACKEND == "database":
+        return FastJSONResponse([project_task(task, selected, seg_fields)
+                                 for task in job_queue.list_tasks(limit, status)])
+    
     tasks = list(transcription_tasks.values())
     
     if status:
@@ -1104,10 +2676,14 @@ async def list_tasks(limit: int = 10, status: Optional[str] = None):
     
     tasks.sort(key=lambda x: x["created_at"], reverse=True)
     
-    return tasks[:limit]
+    for task in tasks[:limit]:
+        if task["status"] == "queued":
+            task.update(job_queue.estimate(task["id"]) or {})
+    
+    return FastJSONResponse([project_task(task, selected, seg_fields) for task in tasks[:limit]])
 
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Health check endpoint"""
     try:
         # Check database connection
@@ -1119,11 +2695,12 @@ async def health_check(db: Session = Depends(get_db)):
         transcriptions_count = db.query(Meeting).filter(Meeting.transcription_id.isnot(None)).count()
         
         # Check transcription files
-        data_dir = Path("data") / "transcriptions"
-        transcription_files_count = len(list(data_dir.glob("*.json"))) if data_dir.exists() else 0
+        # Counts come from the storage index, not a directory scan
+        storage_stats = storage.stats()
+        transcription_files_count = storage_stats[TRANSCRIPTION]["files"]
         
         # Check audio files
-        audio_files_count = len(list(MEETING_AUDIO_DIR.glob("*"))) if MEETING_AUDIO_DIR.exists() else 0
+        audio_files_count = storage_stats[MEETING_AUDIO]["files"]
         
         return {
             "status": "healthy", 
@@ -1137,6 +2714,10 @@ async def health_check(db: Session = Depends(get_db)):
                 "active_tasks": len(transcription_tasks),
                 "cached_models": len(model_cache)
             },
+            "storage": storage_stats,
+            "whisper_backend": get_backend_name(),
+            "hardware": {**HARDWARE.to_dict(), "profile": TUNING_PROFILE.to_dict(), "model_threads": MODEL_THREADS},
+            "queue": job_queue.stats(),
             "limits": {
                 "max_audio_size_mb": MAX_AUDIO_SIZE // (1024*1024),
                 "max_file_upload": "50MB"
@@ -1151,12 +2732,62 @@ async def health_check(db: Session = Depends(get_db)):
             "error": str(e)
         }
 
+class TaskUpdate(BaseModel):
+    priority: JobPriority
+
+@app.patch("/api/tasks/{task_id}", response_model=TranscriptionTask)
+def update_task(task_id: str, update: TaskUpdate):
+    """Change the priority class of a queued task"""
+    if JOB_QUEUE_BACKEND == "database":
+        task = job_queue.get_task(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if not job_queue.set_priority(task_id, update.priority.value):
+            raise HTTPException(status_code=409, detail=f"Task is already {task['status']}")
+        return job_queue.get_task(task_id)
+    
+    if task_id not in transcription_tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    task = transcription_tasks[task_id]
+    if not job_queue.set_priority(task_id, update.priority.value):
+        raise HTTPException(status_code=409, detail=f"Task is already {task['status']}")
+    
+    task["priority"] = update.priority.value
+    task.update(job_queue.estimate(task_id) or {})
+    return task
+
+@app.get("/api/queue")
+def get_queue_status():
+    """Transcription queue depth, capacity, observed real-time factor and model routing"""
+    return {**job_queue.stats(), "routing": model_router.stats(), "language_id": language_identifier.stats(),
+            "speech_maps": speech_maps.stats()}
+
 @app.delete("/api/tasks/{task_id}")
-async def delete_task(task_id: str):
-    """Delete transcription task"""
+def delete_task(task_id: str):
+    """Cancel an active transcription task, or delete a finished one"""
+    if JOB_QUEUE_BACKEND == "database":
+        outcome = job_queue.cancel(task_id)
+        if outcome:
+            logger.info(f"🛑 Cancelled task {task_id} ({outcome})")
+            return {"status": "cancelled", "task_id": task_id}
+        if not job_queue.delete_task(task_id):
+            raise HTTPException(status_code=404, detail="Task not found")
+        return {"status": "deleted", "task_id": task_id}
+    
     if task_id not in transcription_tasks:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    task = transcription_tasks[task_id]
+    if task["status"] in ("queued", "processing"):
+        # Queued jobs are dropped with their temp file; running jobs stop at the next segment
+        outcome = job_queue.cancel(task_id)
+        task["status"] = "cancelled"
+        task.pop("queue_position", None)
+        task.pop("estimated_wait_seconds", None)
+        logger.info(f"🛑 Cancelled task {task_id} ({outcome})")
+        return {"status": "cancelled", "task_id": task_id}
+    
     del transcription_tasks[task_id]
     
     return {"status": "deleted", "task_id": task_id}
@@ -1164,12 +2795,12 @@ async def delete_task(task_id: str):
 # ==================== UTILITY ENDPOINTS ====================
 
 @app.get("/api/stats")
-async def get_statistics(db: Session = Depends(get_db)):
+def get_statistics(db: Session = Depends(get_db)):
     """Get system statistics"""
     try:
         # Meeting statistics
         total_meetings = db.query(Meeting).count()
-        meetings_by_status = db.query(Meeting.status, db.func.count(Meeting.id)).group_by(Meeting.status).all()
+        meetings_by_status = db.query(Meeting.status, func.count(Meeting.id)).group_by(Meeting.status).all()
         
         # Transcription statistics
         with_transcription = db.query(Meeting).filter(Meeting.transcription_id.isnot(None)).count()
@@ -1188,7 +2819,8 @@ async def get_statistics(db: Session = Depends(get_db)):
             "system": {
                 "transcription_tasks": len(transcription_tasks),
                 "cached_models": len(model_cache),
-                "temp_files": len(list(UPLOAD_DIR.glob("*"))) if UPLOAD_DIR.exists() else 0
+                "temp_files": storage.stats()["upload"]["files"],
+                "queue": job_queue.stats()
             },
             "recent_activity": [
                 {
@@ -1206,7 +2838,7 @@ async def get_statistics(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Could not retrieve statistics")
 
 @app.get("/api/search")
-async def search_meetings(
+def search_meetings(
     query: str = Query(..., min_length=2),
     db: Session = Depends(get_db)
 ):
@@ -1241,6 +2873,94 @@ async def search_meetings(
         logger.error(f"❌ Search error: {e}")
         raise HTTPException(status_code=500, detail="Search failed")
 
+# ==================== PROFILING ====================
+
+def require_profiling(request: Request):
+    """Endpoint debug chỉ có khi bật PROFILING (và đúng X-Profile-Token nếu có đặt)"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling chưa được bật (PROFILING=1)")
+    if not profiler.authorized(request.headers.get(TOKEN_HEADER)):
+        raise HTTPException(status_code=403, detail="Sai X-Profile-Token")
+
+class ProfileJobsRequest(BaseModel):
+    jobs: int = Field(1, ge=0, le=100)
+    mode: str = "cprofile"
+    
+    @field_validator("mode")
+    @classmethod
+    def validate_mode(cls, v):
+        if v not in MODES:
+            raise ValueError(f"mode phải là một trong {MODES}")
+        return v
+
+@app.get("/api/debug/profiles", dependencies=[Depends(require_profiling)])
+def list_profiles():
+    """Các profile đã lưu (mới nhất trước) và số job kế tiếp sẽ được profile"""
+    return {"profiles": profiler.profiles(), "armed": profiler.armed()}
+
+@app.post("/api/debug/profiling", dependencies=[Depends(require_profiling)])
+def arm_job_profiling(data: ProfileJobsRequest):
+    """Profile `jobs` job kế tiếp chạy trong process API (0 = hủy)"""
+    profiler.arm(data.jobs, data.mode)
+    return profiler.armed()
+
+@app.get("/api/debug/profiles/{file_name}", dependencies=[Depends(require_profiling)])
+def download_profile(file_name: str):
+    """Tải artifact: <id>.pstats, <id>.speedscope.json hoặc <id>.meta.json"""
+    path = profiler.artifact(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy profile")
+    media_type = "application/octet-stream" if file_name.endswith(".pstats") else "application/json"
+    return FileResponse(path, media_type=media_type, filename=file_name)
+
+@app.delete("/api/debug/profiles/{profile_id}", dependencies=[Depends(require_profiling)])
+def delete_profile(profile_id: str):
+    if not profiler.delete(profile_id):
+        raise HTTPException(status_code=404, detail="Không tìm thấy profile")
+    return {"deleted": profile_id}
+
+@app.get("/api/debug/tracemalloc", dependencies=[Depends(require_profiling)])
+def tracemalloc_status():
+    """Trạng thái tracemalloc, bộ nhớ đang theo dõi và các snapshot còn giữ"""
+    return {**memory_tracer.status(), "registries": memory_tracer.registry_sizes()}
+
+@app.post("/api/debug/tracemalloc/start", dependencies=[Depends(require_profiling)])
+def start_tracemalloc(frames: Optional[int] = Query(None, ge=1, le=100)):
+    """Bật tracemalloc (làm chậm mọi cấp phát bộ nhớ cho tới khi tắt)"""
+    return memory_tracer.start(frames)
+
+@app.post("/api/debug/tracemalloc/stop", dependencies=[Depends(require_profiling)])
+def stop_tracemalloc():
+    """Tắt tracemalloc và bỏ các snapshot"""
+    return memory_tracer.stop()
+
+def _group_by(group_by: str) -> str:
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by phải là một trong {GROUP_BY}")
+    return group_by
+
+@app.post("/api/debug/tracemalloc/snapshots", dependencies=[Depends(require_profiling)])
+def take_tracemalloc_snapshot(limit: int = Query(20, ge=1, le=200), group_by: str = Query("lineno")):
+    """Chụp snapshot: top cấp phát và kích thước transcription_tasks / model_cache"""
+    group_by = _group_by(group_by)
+    try:
+        return memory_tracer.snapshot(limit, group_by)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="tracemalloc chưa bật (POST /api/debug/tracemalloc/start)")
+
+@app.get("/api/debug/tracemalloc/diff", dependencies=[Depends(require_profiling)])
+def diff_tracemalloc_snapshots(
+    base: Optional[str] = Query(None, description="Mặc định: snapshot ngay trước `other`"),
+    other: Optional[str] = Query(None, description="Mặc định: snapshot mới nhất"),
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno")
+):
+    """Cấp phát tăng/giảm giữa hai snapshot (lớn nhất trước)"""
+    diff = memory_tracer.diff(base, other, limit, _group_by(group_by))
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Cần ít nhất hai snapshot hợp lệ")
+    return diff
+
 # ==================== MAIN ENTRY POINT ====================
 
 if __name__ == "__main__":
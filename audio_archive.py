@@ -0,0 +1,171 @@
+# audio_archive.py - Nén audio cuộc họp đã phiên âm xong sang Opus mono để lưu trữ và phát lại
+"""
+Audio được lưu nguyên như lúc upload (WAV từ máy ghi âm, webm từ trình
+duyệt...). Sau khi cuộc họp đã phiên âm xong, ``AudioArchiver`` chuyển file
+sang Opus mono ở bitrate cho giọng nói (mặc định 24 kbps) trong container
+WebM mà mọi trình duyệt phát được, rồi thay thế file gốc:
+
+    data/meeting_audio/3f/a2/<meeting_id>_<timestamp>.opus.webm
+
+Job phiên âm luôn đọc file nó được giao (không bao giờ đọc bản đang nén),
+nên audio của job đang chờ/chạy bị bỏ qua cho đến khi job kết thúc. File
+mà bản Opus không nhỏ hơn (vd: đã là Opus bitrate thấp) được giữ nguyên.
+
+    python -m audio_archive run [--limit N]
+"""
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from models import Meeting
+from storage import MEETING_AUDIO, WAVEFORM, StorageManager
+from waveform import waveform_path
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+ARCHIVE_SETTINGS = {
+    "interval": _env_float("AUDIO_ARCHIVE_INTERVAL", 600),  # giây; 0 = tắt nén nền
+    "bitrate": int(_env_float("AUDIO_OPUS_BITRATE", 24000)),  # bit/s
+    # Chờ sau khi phiên âm xong (người dùng thường nghe lại ngay sau cuộc họp)
+    "min_age": _env_float("AUDIO_ARCHIVE_MIN_AGE", 300),
+    "batch_size": int(_env_float("AUDIO_ARCHIVE_BATCH", 20)),
+}
+
+ARCHIVE_SUFFIX = ".opus.webm"
+OPUS_SAMPLE_RATE = 48000
+OPUS_FRAME_SIZE = 960  # 20 ms ở 48 kHz
+
+
+def is_archived(path) -> bool:
+    return str(path).endswith(ARCHIVE_SUFFIX)
+
+
+def transcode_to_opus(source, target, bitrate: int = ARCHIVE_SETTINGS["bitrate"]) -> Path:
+    """Giải mã `source` và ghi Opus mono (WebM) vào `target` qua file tạm"""
+    import av
+
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        with av.open(str(source)) as container, av.open(str(tmp), "w", format="webm") as output:
+            stream = output.add_stream("libopus", rate=OPUS_SAMPLE_RATE, layout="mono",
+                                       options={"application": "voip"})
+            stream.bit_rate = bitrate
+            resampler = av.AudioResampler(format=stream.format.name, layout="mono",
+                                          rate=OPUS_SAMPLE_RATE, frame_size=OPUS_FRAME_SIZE)
+            for frame in container.decode(audio=0):
+                frame.pts = None
+                for resampled in resampler.resample(frame):
+                    output.mux(stream.encode(resampled))
+            for resampled in resampler.resample(None):
+                output.mux(stream.encode(resampled))
+            output.mux(stream.encode(None))
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return target
+
+
+class AudioArchiver:
+    def __init__(self, storage: StorageManager, **settings):
+        self.storage = storage
+        self.settings = {**ARCHIVE_SETTINGS, **settings}
+        # Đường dẫn mà bản Opus không nhỏ hơn; không thử lại trong vòng đời process
+        self._skipped = set()
+
+    def pending(self, limit: Optional[int] = None) -> list:
+        """Audio của meeting đã phiên âm xong, chưa nén"""
+        cutoff = datetime.now() - timedelta(seconds=self.settings["min_age"])
+        with self.storage.session_factory() as db:
+            rows = db.query(Meeting.id, Meeting.audio_file_path).filter(
+                Meeting.audio_file_path.isnot(None),
+                ~Meeting.audio_file_path.like(f"%{ARCHIVE_SUFFIX}"),
+                Meeting.transcription_id.isnot(None),
+                Meeting.status == "completed",
+                Meeting.updated_at < cutoff,
+            ).order_by(Meeting.updated_at).limit(limit or self.settings["batch_size"]).all()
+        return [(meeting_id, path) for meeting_id, path in rows if path not in self._skipped]
+
+    def archive(self, meeting_id: str, path: str) -> bool:
+        """Nén audio hiện tại của meeting; True nếu đã thay bằng bản Opus"""
+        source = Path(path)
+        if not source.exists() or path in self.storage.active_paths():
+            return False
+        target = transcode_to_opus(source, self.storage.audio_path(meeting_id, ARCHIVE_SUFFIX),
+                                   self.settings["bitrate"])
+        source_size, target_size = source.stat().st_size, target.stat().st_size
+        if target_size >= source_size:
+            target.unlink()
+            self._skipped.add(path)
+            logger.info(f"⏭️ Kept {source} as is, Opus would not be smaller ({target_size} >= {source_size} bytes)")
+            return False
+
+        self.storage.register(MEETING_AUDIO, meeting_id, target)
+        with self.storage.session_factory() as db:
+            meeting = db.query(Meeting).filter(Meeting.id == meeting_id, Meeting.audio_file_path == path).first()
+            # Audio có thể đã bị thay/xóa, hoặc được đưa lại vào hàng đợi trong lúc nén
+            if meeting is None or path in self.storage.active_paths():
+                replaced = False
+            else:
+                name = Path(meeting.audio_file_name or source.name)
+                meeting.audio_file_path = str(target)
+                meeting.audio_file_name = f"{name.stem}.webm"
+                meeting.audio_file_size = target_size / (1024 * 1024)  # MB
+                db.commit()
+                replaced = True
+        if not replaced:
+            self.storage.delete(target)
+            return False
+
+        self.storage.delete(source)
+        # Peak dạng sóng không đổi khi nén; chuyển theo file audio mới
+        peaks = waveform_path(source)
+        if peaks.exists():
+            os.replace(peaks, waveform_path(target))
+            self.storage.register(WAVEFORM, meeting_id, waveform_path(target))
+            self.storage.delete(peaks)
+        logger.info(f"🗜️ Archived audio for meeting {meeting_id}: {source_size / 1024 / 1024:.2f} MB -> "
+                    f"{target_size / 1024 / 1024:.2f} MB ({target})")
+        return True
+
+    def run_once(self, limit: Optional[int] = None) -> Dict[str, int]:
+        result = {"archived": 0, "skipped": 0, "failed": 0}
+        for meeting_id, path in self.pending(limit):
+            try:
+                result["archived" if self.archive(meeting_id, path) else "skipped"] += 1
+            except Exception as e:
+                # File hỏng/định dạng lạ: giữ nguyên, không thử lại mỗi lượt
+                self._skipped.add(path)
+                result["failed"] += 1
+                logger.error(f"❌ Audio archiving failed for meeting {meeting_id} ({path}): {e}")
+        return result
+
+
+def main():
+    import app as whisper_app
+
+    parser = argparse.ArgumentParser(description="Transcode transcribed meeting audio to Opus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Nén audio của các cuộc họp đã phiên âm xong")
+    run.add_argument("--limit", type=int, default=None)
+    run.add_argument("--min-age", type=float, default=0, help="Giây kể từ khi phiên âm xong")
+    args = parser.parse_args()
+
+    archiver = AudioArchiver(whisper_app.storage, min_age=args.min_age)
+    print(archiver.run_once(args.limit))
+
+
+if __name__ == "__main__":
+    main()
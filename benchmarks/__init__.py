@@ -0,0 +1 @@
+# benchmarks - Bộ đo hiệu năng cho pipeline phiên âm và HTTP API
@@ -0,0 +1,322 @@
+# benchmarks/bench_api.py - Load test HTTP API trên SQLite đã nạp dữ liệu
+"""
+Khởi động uvicorn trong process riêng với một DB SQLite tạm (đã nạp sẵn
+meetings + participants) và một model Whisper giả, rồi đo độ trễ các
+endpoint không liên quan đến ML: CRUD meeting, calendar, search, tasks.
+
+    python benchmarks/bench_api.py --meetings 5000 --concurrency 16 --output api.json
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+
+# Ensure the repository root is on sys.path so `import app` works
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+from benchmarks.common import REPO_ROOT, emit_results, latency_summary, prepare_audio
+
+WORDS = [
+    "kế hoạch", "ngân sách", "tuyển dụng", "sprint", "review", "báo cáo",
+    "khách hàng", "marketing", "sản phẩm", "roadmap", "đào tạo", "vận hành",
+]
+ORGANIZERS = [f"Organizer {i}" for i in range(25)]
+STATUSES = ["draft", "scheduled", "in_progress", "completed", "cancelled"]
+BASE_TIME = datetime(2025, 1, 1, 8, 0, 0)
+
+
+def populate_database(db_url: str, meetings: int, seed: int = 0) -> list:
+    """Nạp dữ liệu tất định vào DB, trả về danh sách meeting id"""
+    from sqlalchemy.orm import sessionmaker
+    from database import Base, create_db_engine
+    from models import Meeting, Participant
+
+    engine = create_db_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    rng = random.Random(seed)
+    meeting_ids = []
+    try:
+        for i in range(meetings):
+            meeting_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            start = BASE_TIME + timedelta(hours=rng.randint(0, 24 * 365))
+            topic = " ".join(rng.sample(WORDS, 2))
+            meeting = Meeting(
+                id=meeting_id,
+                title=f"Họp {topic} #{i}",
+                description=f"Thảo luận về {topic}. " * rng.randint(1, 20),
+                start_time=start,
+                end_time=start + timedelta(minutes=rng.choice([30, 60, 90])),
+                location_type=rng.choice(["physical", "online"]),
+                location=f"Phòng {rng.randint(1, 20)}",
+                organizer=rng.choice(ORGANIZERS),
+                status=rng.choice(STATUSES),
+                tags='["benchmark"]',
+                summary="Tóm tắt. " * rng.randint(0, 30) or None,
+            )
+            session.add(meeting)
+            for j in range(rng.randint(2, 8)):
+                session.add(Participant(
+                    id=str(uuid.UUID(int=rng.getrandbits(128))),
+                    meeting_id=meeting_id,
+                    name=f"Người {rng.randint(0, 500)}",
+                    email=f"user{rng.randint(0, 500)}@example.com",
+                    role="member",
+                    department=rng.choice(["IT", "HR", "Sales", "Ops"]),
+                ))
+            meeting_ids.append(meeting_id)
+            if i % 500 == 499:
+                session.commit()
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+    return meeting_ids
+
+
+def serve(db_url: str, port: int, fake_rtf: float):
+    """Chạy API trong process con với DB tạm và backend Whisper giả"""
+    os.environ["WHISPER_BACKEND"] = "fake"
+    os.environ["FAKE_WHISPER_RTF"] = str(fake_rtf)
+    # API và pipeline nền dùng cùng DB tạm
+    os.environ["DATABASE_URL"] = db_url
+    os.chdir(REPO_ROOT)
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    import uvicorn
+    import app as whisper_app
+
+    uvicorn.run(whisper_app.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not become ready")
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def run_scenario(name: str, make_request, total: int, concurrency: int) -> dict:
+    """Chạy `total` request với `concurrency` luồng song song"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = make_request(_session(), i)
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall_time = time.perf_counter() - started
+
+    result = {"scenario": name, "concurrency": concurrency, **latency_summary(latencies, errors, wall_time)}
+    print(f"  {name:<18} p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+          f"rps={result['throughput_rps']} errors={errors}", file=sys.stderr)
+    return result
+
+
+def run_task_polling(base_url: str, audio_path: Path, total: int, concurrency: int, poll_interval: float) -> list:
+    """Gửi file lên /api/transcribe rồi poll /api/tasks/{id} đến khi xong.
+
+    Khi server trả 429, chờ theo Retry-After rồi gửi lại (đếm số lần bị từ chối).
+    """
+    submit_latencies, poll_latencies, turnaround = [], [], []
+    errors = 0
+    rejected = 0
+    lock = threading.Lock()
+    audio_bytes = audio_path.read_bytes()
+
+    def one(i):
+        nonlocal errors, rejected
+        session = _session()
+        started = time.perf_counter()
+        try:
+            while True:
+                response = session.post(
+                    f"{base_url}/api/transcribe",
+                    files={"file": (f"bench_{i}.wav", audio_bytes, "audio/wav")},
+                    data={"model_size": "tiny"},
+                    headers={"X-Client-ID": f"bench-{i % concurrency}"},
+                )
+                if response.status_code != 429:
+                    break
+                with lock:
+                    rejected += 1
+                time.sleep(min(float(response.headers.get("Retry-After", 1)), 5.0))
+            submitted = time.perf_counter()
+            if response.status_code != 202:
+                raise RuntimeError(response.status_code)
+            task_id = response.json()["id"]
+            polls = []
+            while True:
+                poll_started = time.perf_counter()
+                task = session.get(f"{base_url}/api/tasks/{task_id}").json()
+                polls.append((time.perf_counter() - poll_started) * 1000)
+                if task["status"] in ("completed", "failed", "cancelled"):
+                    break
+                time.sleep(poll_interval)
+            done = time.perf_counter()
+            with lock:
+                submit_latencies.append((submitted - started) * 1000)
+                poll_latencies.extend(polls)
+                turnaround.append((done - started) * 1000)
+                if task["status"] != "completed":
+                    errors += 1
+        except Exception:
+            with lock:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall_time = time.perf_counter() - started
+
+    results = [
+        {"scenario": "task_submit", "concurrency": concurrency, "rejected_429": rejected,
+         **latency_summary(submit_latencies, errors, wall_time)},
+        {"scenario": "task_poll", "concurrency": concurrency, **latency_summary(poll_latencies, 0, wall_time)},
+        {"scenario": "task_turnaround", "concurrency": concurrency, **latency_summary(turnaround, errors, wall_time)},
+    ]
+    for r in results:
+        print(f"  {r['scenario']:<18} p50={r['p50_ms']:.1f}ms p99={r['p99_ms']:.1f}ms", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP API with a stub model")
+    parser.add_argument("--meetings", type=int, default=2000, help="Số meeting nạp sẵn vào DB")
+    parser.add_argument("--requests", type=int, default=300, help="Số request mỗi kịch bản")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tasks", type=int, default=50, help="Số job phiên âm cho kịch bản task polling")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--fake-rtf", type=float, default=0.0, help="Real-time factor của backend giả")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="whisper_bench_api_"))
+    db_url = f"sqlite:///{workdir / 'bench.db'}"
+    print(f"🗄️  Populating {args.meetings} meetings in {db_url}", file=sys.stderr)
+    meeting_ids = populate_database(db_url, args.meetings, args.seed)
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    ctx = multiprocessing.get_context("spawn")
+    server = ctx.Process(target=serve, args=(db_url, port, args.fake_rtf), daemon=True)
+    server.start()
+    try:
+        _wait_ready(base_url)
+        created_ids = []
+        created_lock = threading.Lock()
+
+        def list_meetings(s, i):
+            return s.get(f"{base_url}/api/meetings", params={"limit": 50, "offset": (i * 50) % args.meetings}).ok
+
+        def get_meeting(s, i):
+            return s.get(f"{base_url}/api/meetings/{meeting_ids[i % len(meeting_ids)]}").ok
+
+        def calendar(s, i):
+            start = BASE_TIME + timedelta(days=(i * 7) % 330)
+            params = {"start": start.isoformat(), "end": (start + timedelta(days=31)).isoformat()}
+            return s.get(f"{base_url}/api/meetings/calendar", params=params).ok
+
+        def search(s, i):
+            return s.get(f"{base_url}/api/search", params={"query": WORDS[i % len(WORDS)]}).ok
+
+        def create_meeting(s, i):
+            start = BASE_TIME + timedelta(days=i % 365, hours=9)
+            response = s.post(f"{base_url}/api/meetings", json={
+                "title": f"Bench meeting {i}",
+                "description": "Tạo bởi benchmark",
+                "start_time": start.isoformat(),
+                "end_time": (start + timedelta(hours=1)).isoformat(),
+                "organizer": ORGANIZERS[i % len(ORGANIZERS)],
+                "tags": ["bench"],
+                "participants": [{"name": f"Người {k}", "email": f"p{k}@example.com"} for k in range(4)],
+            })
+            if response.ok:
+                with created_lock:
+                    created_ids.append(response.json()["id"])
+            return response.ok
+
+        def update_meeting(s, i):
+            return s.put(f"{base_url}/api/meetings/{meeting_ids[(i * 7919) % len(meeting_ids)]}", json={
+                "title": f"Updated {i}",
+                "participants": [{"name": f"Người {k}"} for k in range(3)],
+            }).ok
+
+        def delete_meeting(s, i):
+            return s.delete(f"{base_url}/api/meetings/{created_ids[i]}").ok
+
+        print(f"🚀 Load testing {base_url}", file=sys.stderr)
+        results = [
+            run_scenario("list_meetings", list_meetings, args.requests, args.concurrency),
+            run_scenario("get_meeting", get_meeting, args.requests, args.concurrency),
+            run_scenario("calendar", calendar, args.requests, args.concurrency),
+            run_scenario("search", search, args.requests, args.concurrency),
+            run_scenario("create_meeting", create_meeting, args.requests, args.concurrency),
+            run_scenario("update_meeting", update_meeting, args.requests, args.concurrency),
+        ]
+        results.append(run_scenario("delete_meeting", delete_meeting, len(created_ids), args.concurrency))
+        results.extend(run_task_polling(
+            base_url, prepare_audio(5.0), args.tasks, args.concurrency, args.poll_interval
+        ))
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+
+    emit_results(
+        "api",
+        {"meetings": args.meetings, "requests": args.requests, "concurrency": args.concurrency,
+         "tasks": args.tasks, "seed": args.seed, "fake_rtf": args.fake_rtf},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
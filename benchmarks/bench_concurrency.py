@@ -0,0 +1,152 @@
+# benchmarks/bench_concurrency.py - p99 của màn hình cuộc họp theo số client song song
+"""
+Đo list_meetings và calendar với số client tăng dần, tùy chọn kèm tải nền
+(search + cập nhật meeting) từ các client khác. Truy vấn DB chạy trên event
+loop sẽ làm p99 tăng tuyến tính theo số request đang chờ; khi chạy trong
+threadpool, request nhanh không phải xếp hàng sau request chậm.
+
+    python benchmarks/bench_concurrency.py --concurrency 1,8,32 --background 4 --output conc.json
+
+``--fields`` thêm kịch bản list_meetings_fields chỉ lấy các trường đó
+(vd: ``--fields id,title,start_time,status``).
+
+Dùng ``--base-url`` để đo một server đang chạy thay vì server tạm.
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+# Ensure the repository root is on sys.path so `import app` works
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+from benchmarks.bench_api import (
+    BASE_TIME, WORDS, _free_port, _session, _wait_ready, populate_database, run_scenario, serve,
+)
+from benchmarks.common import emit_results
+
+
+def background_load(base_url: str, meeting_ids: list, clients: int, stop: threading.Event) -> dict:
+    """Tải nền: search toàn văn và cập nhật meeting cho đến khi `stop` được bật"""
+    counts = {"requests": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def loop(n):
+        session = _session()
+        i = n
+        while not stop.is_set():
+            try:
+                if i % 2:
+                    ok = session.get(f"{base_url}/api/search", params={"query": WORDS[i % len(WORDS)]}).ok
+                else:
+                    ok = session.put(f"{base_url}/api/meetings/{meeting_ids[(i * 7919) % len(meeting_ids)]}",
+                                     json={"title": f"Background {i}"}).ok
+            except Exception:
+                ok = False
+            with lock:
+                counts["requests"] += 1
+                counts["errors"] += 0 if ok else 1
+            i += clients
+
+    threads = [threading.Thread(target=loop, args=(n,), daemon=True) for n in range(clients)]
+    for t in threads:
+        t.start()
+    return {"threads": threads, "counts": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of meeting reads under parallel clients")
+    parser.add_argument("--meetings", type=int, default=2000)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="Số client song song, phân tách bằng dấu phẩy")
+    parser.add_argument("--requests", type=int, default=200, help="Số request mỗi mức concurrency")
+    parser.add_argument("--background", type=int, default=0, help="Số client tải nền (search + update)")
+    parser.add_argument("--base-url", help="Đo server có sẵn (phải có dữ liệu) thay vì server tạm")
+    parser.add_argument("--fields", help="Thêm kịch bản list_meetings với ?fields= này")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    server = None
+    if args.base_url:
+        base_url = args.base_url.rstrip("/")
+        meeting_ids = [m["id"] for m in _session().get(f"{base_url}/api/meetings", params={"limit": 500}).json()]
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="whisper_bench_conc_"))
+        db_url = f"sqlite:///{workdir / 'bench.db'}"
+        print(f"🗄️  Populating {args.meetings} meetings in {db_url}", file=sys.stderr)
+        meeting_ids = populate_database(db_url, args.meetings, args.seed)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = multiprocessing.get_context("spawn").Process(target=serve, args=(db_url, port, 0.0), daemon=True)
+        server.start()
+
+    try:
+        _wait_ready(base_url)
+
+        def list_meetings(s, i):
+            return s.get(f"{base_url}/api/meetings",
+                         params={"limit": 50, "offset": (i * 50) % max(len(meeting_ids), 1)}).ok
+
+        def calendar(s, i):
+            start = BASE_TIME + timedelta(days=(i * 7) % 330)
+            params = {"start": start.isoformat(), "end": (start + timedelta(days=31)).isoformat()}
+            return s.get(f"{base_url}/api/meetings/calendar", params=params).ok
+
+        def list_meetings_fields(s, i):
+            return s.get(f"{base_url}/api/meetings",
+                         params={"limit": 50, "offset": (i * 50) % max(len(meeting_ids), 1),
+                                 "fields": args.fields}).ok
+
+        scenarios = [("list_meetings", list_meetings), ("calendar", calendar)]
+        if args.fields:
+            scenarios.append(("list_meetings_fields", list_meetings_fields))
+
+        stop = threading.Event()
+        background = None
+        if args.background:
+            print(f"🔁 Starting {args.background} background clients", file=sys.stderr)
+            background = background_load(base_url, meeting_ids, args.background, stop)
+
+        results = []
+        started = time.perf_counter()
+        for level in levels:
+            print(f"▶️  concurrency={level}", file=sys.stderr)
+            for name, func in scenarios:
+                result = run_scenario(name, func, args.requests, level)
+                result["background_clients"] = args.background
+                results.append(result)
+
+        if background:
+            stop.set()
+            for t in background["threads"]:
+                t.join(timeout=30)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "scenario": "background",
+                "concurrency": args.background,
+                "requests": background["counts"]["requests"],
+                "errors": background["counts"]["errors"],
+                "throughput_rps": round(background["counts"]["requests"] / elapsed, 2),
+            })
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join(timeout=10)
+
+    emit_results(
+        "concurrency",
+        {"meetings": args.meetings, "concurrency": levels, "requests": args.requests,
+         "background": args.background, "fields": args.fields, "seed": args.seed},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# benchmarks/bench_db.py - Độ trễ đọc của database khi có ghi nặng đồng thời
+"""
+Đo độ trễ các truy vấn đọc của màn hình cuộc họp (danh sách, calendar,
+chi tiết) từ nhiều thread, trước và trong khi có writer ghi liên tục
+(cập nhật meeting, thêm participant, ghi job phiên âm) - giống pipeline
+nền ghi kết quả trong lúc người dùng duyệt lịch.
+
+Mỗi profile chạy trên một file SQLite mới:
+
+- ``legacy``: rollback journal, synchronous=FULL, cache mặc định (cấu hình cũ)
+- ``tuned``: cấu hình mặc định của create_db_engine (WAL, NORMAL, cache, mmap)
+
+    python benchmarks/bench_db.py --meetings 2000 --readers 8 --writers 2 --duration 10
+
+Dùng ``--database-url`` để chạy kịch bản trên một DB khác (vd: PostgreSQL).
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Ensure the repository root is on sys.path so `import database` works
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+from benchmarks.bench_api import BASE_TIME, populate_database
+from benchmarks.common import emit_results, latency_summary
+
+PROFILES = {
+    "legacy": {"journal_mode": "DELETE", "synchronous": "FULL", "cache_size_kb": 2000, "mmap_size_mb": 0},
+    "tuned": {},
+}
+
+
+def read_ops(Meeting, meeting_ids):
+    """Các truy vấn đọc của UI cuộc họp"""
+    from sqlalchemy import desc
+    from sqlalchemy.orm import joinedload
+
+    def list_meetings(db, rng):
+        return db.query(Meeting).options(joinedload(Meeting.participants)) \
+            .order_by(desc(Meeting.start_time)).offset(rng.randrange(0, len(meeting_ids), 50)).limit(50).all()
+
+    def calendar(db, rng):
+        start = BASE_TIME + timedelta(days=rng.randint(0, 330))
+        return db.query(Meeting).filter(
+            Meeting.start_time >= start, Meeting.start_time < start + timedelta(days=31)
+        ).all()
+
+    def get_meeting(db, rng):
+        return db.query(Meeting).options(joinedload(Meeting.participants)) \
+            .filter(Meeting.id == rng.choice(meeting_ids)).first()
+
+    return [list_meetings, calendar, get_meeting]
+
+
+def write_op(Meeting, Participant, TranscriptionJob, meeting_ids, batch: int):
+    """Một transaction ghi nặng: cập nhật meeting, thêm participant và job"""
+
+    def write(db, rng):
+        now = datetime.now()
+        for meeting_id in rng.sample(meeting_ids, batch):
+            db.query(Meeting).filter(Meeting.id == meeting_id).update(
+                {"summary": "Tóm tắt mới. " * rng.randint(1, 30), "updated_at": now},
+                synchronize_session=False
+            )
+            db.add(Participant(id=str(uuid.uuid4()), meeting_id=meeting_id, name="Bench", role="member"))
+        db.add(TranscriptionJob(
+            id=str(uuid.uuid4()), kind="meeting", status="completed", priority="meeting",
+            audio_path="/dev/null", audio_duration=60.0, result='{"segments": []}',
+            created_at=now, started_at=now, finished_at=now,
+        ))
+        db.commit()
+
+    return write
+
+
+def run_phase(SessionFactory, ops, workers: int, duration: float, seed: int, stop_event=None) -> dict:
+    """Chạy `ops` xoay vòng trên `workers` thread trong `duration` giây"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(n):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + n)
+        local, local_errors = [], 0
+        i = n
+        while time.perf_counter() < deadline and not (stop_event and stop_event.is_set()):
+            op = ops[i % len(ops)]
+            i += 1
+            db = SessionFactory()
+            started = time.perf_counter()
+            try:
+                op(db, rng)
+                local.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                db.rollback()
+                local_errors += 1
+            finally:
+                db.close()
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    threads = [threading.Thread(target=loop, args=(n,)) for n in range(workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latency_summary(latencies, errors, time.perf_counter() - started)
+
+
+def run_profile(name: str, db_url: str, args) -> dict:
+    from sqlalchemy.orm import sessionmaker
+    from database import create_db_engine
+    from models import Meeting, Participant, TranscriptionJob
+
+    meeting_ids = populate_database(db_url, args.meetings, args.seed)
+    engine = create_db_engine(db_url, pool_size=args.readers + args.writers, **PROFILES.get(name, {}))
+    SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    reads = read_ops(Meeting, meeting_ids)
+    write = write_op(Meeting, Participant, TranscriptionJob, meeting_ids, args.write_batch)
+
+    print(f"▶️  [{name}] reads only", file=sys.stderr)
+    idle = run_phase(SessionFactory, reads, args.readers, args.duration / 2, args.seed)
+
+    print(f"▶️  [{name}] reads during writes", file=sys.stderr)
+    write_result = {}
+    writers = threading.Thread(target=lambda: write_result.update(
+        run_phase(SessionFactory, [write], args.writers, args.duration, args.seed + 1)
+    ))
+    writers.start()
+    loaded = run_phase(SessionFactory, reads, args.readers, args.duration, args.seed)
+    writers.join()
+
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar() \
+            if engine.dialect.name == "sqlite" else None
+    engine.dispose()
+    return {
+        "profile": name,
+        "journal_mode": journal_mode,
+        "reads_idle": idle,
+        "reads_under_write": loaded,
+        "writes": write_result,
+        "p99_slowdown": round(loaded["p99_ms"] / idle["p99_ms"], 2) if idle["p99_ms"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database read latency under concurrent writes")
+    parser.add_argument("--profiles", default="legacy,tuned", help=f"Phân tách bằng dấu phẩy: {', '.join(PROFILES)}")
+    parser.add_argument("--meetings", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--write-batch", type=int, default=50, help="Số meeting cập nhật mỗi transaction ghi")
+    parser.add_argument("--duration", type=float, default=10.0, help="Số giây của pha đọc+ghi")
+    parser.add_argument("--database-url", help="Chạy trên DB này thay vì file SQLite tạm (chỉ profile đầu tiên)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    workdir = Path(tempfile.mkdtemp(prefix="whisper_bench_db_"))
+    results = []
+    for name in profiles[:1] if args.database_url else profiles:
+        db_url = args.database_url or f"sqlite:///{workdir / f'{name}.db'}"
+        print(f"🗄️  Populating {args.meetings} meetings in {db_url}", file=sys.stderr)
+        results.append(run_profile(name, db_url, args))
+
+    emit_results(
+        "database",
+        {"meetings": args.meetings, "readers": args.readers, "writers": args.writers,
+         "write_batch": args.write_batch, "duration": args.duration, "seed": args.seed},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
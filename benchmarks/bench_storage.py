@@ -0,0 +1,135 @@
+# benchmarks/bench_storage.py - Dung lượng đĩa/RAM của bản phiên âm: JSON so với .wtc
+"""
+Sinh bản phiên âm giống kết quả /api/transcribe (tokens, words tùy chọn) và
+so sánh file JSON ``indent=2`` với định dạng cột nén của transcript_store:
+số byte trên đĩa, RAM khi giữ trong bộ nhớ, thời gian mã hóa/giải mã toàn
+bộ và chỉ các cột start,end,text.
+
+    python benchmarks/bench_storage.py --segments 500,2000 --codecs zlib,zstd
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Ensure the repository root is on sys.path so `import transcript_store` works
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+from benchmarks.common import emit_results
+from benchmarks.bench_api import WORDS
+
+
+def synthetic_transcript(n_segments: int, word_timestamps: bool, seed: int = 0) -> dict:
+    """Segment cùng cấu trúc segment_to_dict (word.probability là float32 như model trả về)"""
+    from array import array
+
+    rng = random.Random(seed)
+    segments, t = [], 0.0
+    for i in range(n_segments):
+        start = round(t, 2)
+        words = []
+        for _ in range(rng.randint(4, 16)):
+            word_start = round(t, 2)
+            t += rng.uniform(0.15, 0.6)
+            words.append({"word": " " + rng.choice(WORDS), "start": word_start, "end": round(t, 2),
+                          "probability": array("f", [rng.random()])[0]})
+        segment = {
+            "id": i, "seek": int(start * 100), "start": start, "end": round(t, 2),
+            "text": "".join(w["word"] for w in words),
+            "tokens": [rng.randint(50364, 51865) for _ in range(len(words) + 2)],
+            "temperature": 0.0, "avg_logprob": rng.uniform(-1.0, 0.0),
+            "compression_ratio": rng.uniform(1.0, 2.4), "no_speech_prob": array("f", [rng.random() / 10])[0],
+        }
+        if word_timestamps:
+            segment["words"] = words
+        segments.append(segment)
+        t += rng.uniform(0.0, 1.0)
+    return {"segments": segments, "language": "vi", "language_probability": 0.98,
+            "processing_time": 12.5, "audio_duration": round(t, 2)}
+
+
+def _timed(func, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return value, round(best, 2)
+
+
+def _retained_bytes(func) -> int:
+    tracemalloc.start()
+    value = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def run_case(n_segments: int, word_timestamps: bool, codec: str, repeat: int) -> dict:
+    from transcript_store import CompactTranscript, encode_transcript
+
+    data = synthetic_transcript(n_segments, word_timestamps)
+    text = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    blob, encode_ms = _timed(lambda: encode_transcript(data, codec), repeat)
+    transcript = CompactTranscript(blob)
+    decoded, decode_ms = _timed(transcript.to_dict, repeat)
+    _, decode_text_ms = _timed(lambda: transcript.to_dict(["start", "end", "text"]), repeat)
+    _, json_load_ms = _timed(lambda: json.loads(text), repeat)
+    if decoded != data:
+        raise AssertionError("round trip mismatch")
+
+    dict_ram = _retained_bytes(lambda: json.loads(text))
+    compact_ram = _retained_bytes(lambda: CompactTranscript(encode_transcript(data, codec)))
+    return {
+        "scenario": "words" if word_timestamps else "segments",
+        "segments": n_segments,
+        "codec": codec,
+        "json_bytes": len(text),
+        "compact_bytes": len(blob),
+        "disk_ratio": round(len(text) / len(blob), 1),
+        "dict_ram_bytes": dict_ram,
+        "compact_ram_bytes": compact_ram,
+        "ram_ratio": round(dict_ram / compact_ram, 1),
+        "encode_ms": encode_ms,
+        "decode_ms": decode_ms,
+        "decode_text_ms": decode_text_ms,
+        "json_load_ms": json_load_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compact transcript storage against JSON")
+    parser.add_argument("--segments", default="500,2000", help="Số segment, phân tách bằng dấu phẩy")
+    parser.add_argument("--codecs", default="zlib,zstd")
+    parser.add_argument("--word-timestamps", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    from transcript_store import zstandard
+
+    codecs = [c for c in args.codecs.split(",") if c and (c != "zstd" or zstandard is not None)]
+    words = {"on": [True], "off": [False], "both": [True, False]}[args.word_timestamps]
+    results = []
+    for n in [int(s) for s in args.segments.split(",") if s.strip()]:
+        for word_timestamps in words:
+            for codec in codecs:
+                print(f"▶️  {n} segments, words={word_timestamps}, {codec}", file=sys.stderr)
+                results.append(run_case(n, word_timestamps, codec, args.repeat))
+
+    emit_results(
+        "storage",
+        {"segments": args.segments, "codecs": codecs, "word_timestamps": args.word_timestamps,
+         "repeat": args.repeat},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_transcription.py - Đo throughput của process_transcription
+"""
+Chạy process_transcription trên một ma trận cấu hình và báo cáo
+real-time factor (RTF), peak RSS và số segment/giây.
+
+Mỗi cấu hình chạy trong một process riêng để peak RSS không bị lẫn giữa
+các model. Ví dụ:
+
+    python benchmarks/bench_transcription.py --durations 30,120 \\
+        --model-sizes tiny,base --beam-sizes 1,5 --output bench.json
+
+Dùng ``--backend fake`` để kiểm tra nhanh phần hàng đợi/lưu trữ mà
+không cần tải model.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Ensure the repository root is on sys.path so `import app` works
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root))
+
+from benchmarks.common import REPO_ROOT, emit_results, peak_rss_mb, prepare_audio
+
+
+def _csv(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def _bool_list(value):
+    mapping = {"on": [True], "off": [False], "both": [True, False]}
+    return mapping[value]
+
+
+def run_config(config: dict, audio_path: str, audio_duration: float, repeat: int) -> dict:
+    """Chạy một cấu hình (trong process con) và trả về số đo"""
+    os.chdir(REPO_ROOT)
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    import app as whisper_app
+
+    options = whisper_app.TranscriptionOptions(
+        model_size=config["model_size"],
+        device=config["device"],
+        compute_type=config["compute_type"],
+        beam_size=config["beam_size"],
+        vad_filter=config["vad_filter"],
+        use_batched_mode=config["batched"],
+        batch_size=config["batch_size"],
+    )
+
+    started = time.perf_counter()
+    whisper_app.get_or_load_model(options)
+    load_time = time.perf_counter() - started
+
+    runs = []
+    for _ in range(repeat):
+        task_id = f"bench-{uuid.uuid4()}"
+        # process_transcription xóa file đầu vào khi xong, nên dùng bản sao
+        work_path = whisper_app.UPLOAD_DIR / f"{task_id}_{Path(audio_path).name}"
+        shutil.copyfile(audio_path, work_path)
+        whisper_app.transcription_tasks[task_id] = {
+            "id": task_id,
+            "status": "queued",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "file_name": work_path.name,
+        }
+
+        started = time.perf_counter()
+        whisper_app.process_transcription(task_id, str(work_path), options)
+        wall_time = time.perf_counter() - started
+
+        task = whisper_app.transcription_tasks.pop(task_id)
+        if task["status"] != "completed":
+            runs.append({"error": task.get("error", task["status"]), "wall_time_s": wall_time})
+            continue
+
+        segments = len(task["result"]["segments"])
+        runs.append({
+            "wall_time_s": round(wall_time, 4),
+            "segments": segments,
+            "rtf": round(wall_time / audio_duration, 4),
+            "segments_per_s": round(segments / wall_time, 3) if wall_time > 0 else 0.0,
+        })
+
+    ok = [r for r in runs if "error" not in r]
+    summary = {
+        **config,
+        "audio_duration_s": audio_duration,
+        "model_load_s": round(load_time, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "runs": runs,
+        "errors": len(runs) - len(ok),
+    }
+    if ok:
+        summary["rtf_median"] = statistics.median(r["rtf"] for r in ok)
+        summary["segments_per_s_median"] = statistics.median(r["segments_per_s"] for r in ok)
+        summary["wall_time_s_median"] = statistics.median(r["wall_time_s"] for r in ok)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_transcription")
+    parser.add_argument("--durations", default="10,60", help="Thời lượng audio (giây), phân tách bằng dấu phẩy")
+    parser.add_argument("--source", default="synthetic", help="'synthetic' hoặc đường dẫn file audio để lặp lại")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model-sizes", default="tiny")
+    parser.add_argument("--compute-types", default="int8")
+    parser.add_argument("--beam-sizes", default="1,5")
+    parser.add_argument("--vad", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--batched", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default=None, help="Ghi đè WHISPER_BACKEND (vd: fake)")
+    parser.add_argument("--output", help="Ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    if args.backend:
+        # Process con (spawn) kế thừa biến môi trường
+        os.environ["WHISPER_BACKEND"] = args.backend
+
+    durations = _csv(args.durations, float)
+    matrix = list(itertools.product(
+        durations,
+        _csv(args.model_sizes),
+        _csv(args.compute_types),
+        _csv(args.beam_sizes, int),
+        _bool_list(args.vad),
+        _bool_list(args.batched),
+    ))
+
+    audio_files = {d: str(prepare_audio(d, args.source, args.seed)) for d in durations}
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for i, (duration, model_size, compute_type, beam_size, vad_filter, batched) in enumerate(matrix, 1):
+        config = {
+            "model_size": model_size,
+            "compute_type": compute_type,
+            "beam_size": beam_size,
+            "vad_filter": vad_filter,
+            "batched": batched,
+            "batch_size": args.batch_size,
+            "device": args.device,
+        }
+        print(f"▶️  [{i}/{len(matrix)}] {duration:g}s {config}", file=sys.stderr)
+        with ctx.Pool(1) as pool:
+            try:
+                result = pool.apply(run_config, (config, audio_files[duration], duration, args.repeat))
+            except Exception as e:
+                result = {**config, "audio_duration_s": duration, "error": str(e)}
+        results.append(result)
+
+    emit_results(
+        "transcription",
+        {"durations": durations, "source": args.source, "seed": args.seed, "repeat": args.repeat,
+         "backend": os.environ.get("WHISPER_BACKEND", "faster-whisper")},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/common.py - Tiện ích dùng chung: sinh audio, đo RSS, xuất kết quả JSON
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import wave
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_RATE = 16000
+AUDIO_CACHE_DIR = Path(tempfile.gettempdir()) / "whisper_bench_audio"
+
+
+def synthesize_speech_like(duration_s: float, seed: int = 0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Sinh tín hiệu giống giọng nói (âm tiết + khoảng lặng), tất định theo seed"""
+    rng = np.random.default_rng(seed)
+    total = int(duration_s * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+
+    pos = 0
+    while pos < total:
+        # Một "câu" gồm vài âm tiết, sau đó là khoảng lặng
+        for _ in range(int(rng.integers(3, 12))):
+            length = int(rng.uniform(0.12, 0.35) * sample_rate)
+            if pos + length >= total:
+                break
+            t = np.arange(length) / sample_rate
+            f0 = rng.uniform(100, 220)
+            vibrato = 1 + 0.02 * np.sin(2 * np.pi * 5 * t)
+            phase = 2 * np.pi * f0 * np.cumsum(vibrato) / sample_rate
+            voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+            envelope = np.hanning(length)
+            audio[pos:pos + length] = 0.3 * voiced * envelope
+            pos += length + int(rng.uniform(0.02, 0.08) * sample_rate)
+        pos += int(rng.uniform(0.3, 1.5) * sample_rate)
+
+    audio += rng.normal(0, 0.003, total).astype(np.float32)
+    return np.clip(audio, -1.0, 1.0)
+
+
+def load_bundled_audio(path: str, duration_s: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Giải mã file audio có sẵn và lặp lại cho đủ thời lượng yêu cầu"""
+    from faster_whisper import decode_audio
+
+    source = decode_audio(path, sampling_rate=sample_rate)
+    if source.size == 0:
+        raise ValueError(f"Audio rỗng: {path}")
+    total = int(duration_s * sample_rate)
+    repeats = int(np.ceil(total / source.size))
+    return np.tile(source, repeats)[:total].astype(np.float32)
+
+
+def write_wav(path: Path, audio: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """Ghi PCM 16-bit mono"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+
+
+def prepare_audio(duration_s: float, source: str = "synthetic", seed: int = 0) -> Path:
+    """Trả về đường dẫn WAV cho thời lượng yêu cầu (có cache giữa các lần chạy)"""
+    AUDIO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    if source == "synthetic":
+        name = f"synthetic_{duration_s:g}s_seed{seed}.wav"
+    else:
+        name = f"bundled_{Path(source).stem}_{duration_s:g}s.wav"
+    path = AUDIO_CACHE_DIR / name
+    if not path.exists():
+        if source == "synthetic":
+            audio = synthesize_speech_like(duration_s, seed=seed)
+        else:
+            audio = load_bundled_audio(source, duration_s)
+        tmp_path = path.with_suffix(".tmp")
+        write_wav(tmp_path, audio)
+        os.replace(tmp_path, path)
+    return path
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS của process hiện tại (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+def latency_summary(latencies_ms, errors: int, wall_time_s: float) -> dict:
+    """Tóm tắt phân bố độ trễ cho một kịch bản"""
+    count = len(latencies_ms)
+    return {
+        "requests": count + errors,
+        "errors": errors,
+        "mean_ms": round(float(np.mean(latencies_ms)), 3) if count else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3) if count else 0.0,
+        "throughput_rps": round(count / wall_time_s, 2) if wall_time_s > 0 else 0.0,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def environment_info() -> dict:
+    return {
+        "git_revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def emit_results(suite: str, config: dict, results: list, output: str = None) -> dict:
+    """Ghi kết quả ra JSON (file hoặc stdout) để so sánh giữa các commit"""
+    report = {
+        "suite": suite,
+        "environment": environment_info(),
+        "config": config,
+        "results": results,
+    }
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).write_text(payload, encoding="utf-8")
+        print(f"📄 Results written to {output}", file=sys.stderr)
+    else:
+        print(payload)
+    return report
@@ -0,0 +1,65 @@
+# benchmarks/compare.py - So sánh hai file kết quả benchmark JSON
+"""
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+
+In chênh lệch (%) của các chỉ số chính và trả về exit code 1 nếu có
+chỉ số xấu đi quá ngưỡng.
+"""
+import argparse
+import json
+import sys
+
+# Chỉ số -> True nếu giá trị càng lớn càng tốt
+METRICS = {
+    "transcription": {"rtf_median": False, "segments_per_s_median": True, "peak_rss_mb": False},
+    "api": {"p50_ms": False, "p99_ms": False, "throughput_rps": True},
+    "storage": {"compact_bytes": False, "compact_ram_bytes": False, "decode_ms": False},
+}
+KEY_FIELDS = ("scenario", "concurrency", "audio_duration_s", "model_size", "compute_type",
+              "beam_size", "vad_filter", "batched", "segments", "codec")
+
+
+def _key(result: dict) -> tuple:
+    return tuple((f, result[f]) for f in KEY_FIELDS if f in result)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> int:
+    metrics = METRICS.get(baseline["suite"], {})
+    base_results = {_key(r): r for r in baseline["results"]}
+    regressions = 0
+
+    print(f"{baseline['environment']['git_revision']} -> {candidate['environment']['git_revision']}")
+    for result in candidate["results"]:
+        base = base_results.get(_key(result))
+        if base is None:
+            continue
+        label = ", ".join(f"{k}={v}" for k, v in _key(result))
+        for metric, higher_is_better in metrics.items():
+            if metric not in result or not base.get(metric):
+                continue
+            change = (result[metric] - base[metric]) / base[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = "❌" if worse > threshold else "  "
+            regressions += worse > threshold
+            print(f"{flag} {label} {metric}: {base[metric]} -> {result[metric]} ({change:+.1f}%)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Ngưỡng xấu đi (%) để báo regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    if baseline["suite"] != candidate["suite"]:
+        sys.exit(f"Suite mismatch: {baseline['suite']} vs {candidate['suite']}")
+    sys.exit(compare(baseline, candidate, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+# bulk_import.py - Tạo/cập nhật/xóa cuộc họp hàng loạt từ NDJSON hoặc CSV
+"""
+Mỗi dòng (NDJSON: một object; CSV: một hàng có header) là một cuộc họp.
+Dòng được đọc và kiểm tra lần lượt (không nạp cả file vào RAM), gom thành
+từng chunk ``chunk_size`` dòng hợp lệ và ghi bằng ``bulk_insert_mappings`` /
+``bulk_update_mappings`` trong một transaction mỗi chunk. Dòng lỗi không làm
+hỏng các dòng khác; kết quả trả về theo từng dòng.
+
+- create: các trường của MeetingCreate, ``id`` tùy chọn (import lặp lại an toàn)
+- update: ``id`` + các trường của MeetingUpdate (``participants`` là danh sách mới, ghi theo diff)
+- delete: ``id``
+
+CSV: ``tags`` là JSON hoặc phân tách bằng ``;``; ``participants`` là JSON hoặc
+``Tên <email>; Tên 2``. Ô trống được coi như không có giá trị.
+
+API: ``POST /api/meetings/bulk/{create|update|delete}``; CLI dùng cùng code:
+
+    python -m bulk_import create meetings.csv --results results.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import re
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import Meeting, Participant, Transcription
+from people import sync_participants
+
+logger = logging.getLogger("whisper-api")
+
+OPERATIONS = ("create", "update", "delete")
+FORMATS = ("ndjson", "csv")
+DEFAULT_CHUNK_SIZE = 1000
+PARTICIPANT_PATTERN = re.compile(r"^\s*(?P<name>[^<]+?)\s*(?:<(?P<email>[^>]*)>)?\s*$")
+
+
+class BulkError(Exception):
+    """Lỗi của cả request (định dạng/thao tác không hợp lệ), khác với lỗi từng dòng"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def detect_format(content_type: Optional[str]) -> str:
+    if content_type and "csv" in content_type.lower():
+        return "csv"
+    return "ndjson"
+
+
+# ---------- Đọc dòng ----------
+
+def iter_ndjson(text: Iterable[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(số dòng, object, lỗi) cho mỗi dòng không rỗng"""
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def _split_list(value: str) -> list:
+    value = value.strip()
+    if value.startswith("["):
+        return json.loads(value)
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+
+def _csv_row(row: dict) -> dict:
+    parsed = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        key = key.strip()
+        if key == "tags":
+            parsed[key] = _split_list(value)
+        elif key == "participants":
+            items = _split_list(value)
+            participants = []
+            for item in items:
+                if isinstance(item, dict):
+                    participants.append(item)
+                    continue
+                match = PARTICIPANT_PATTERN.match(item)
+                participants.append({"name": match.group("name"), "email": match.group("email") or None}
+                                    if match else {"name": item})
+            parsed[key] = participants
+        else:
+            parsed[key] = value
+    return parsed
+
+
+def iter_csv(text: Iterable[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    reader = csv.DictReader(text)
+    for row in reader:
+        try:
+            yield reader.line_num, _csv_row(row), None
+        except ValueError as e:
+            yield reader.line_num, None, f"Invalid list value: {e}"
+
+
+def iter_rows(stream, fmt: str):
+    """Đọc từng dòng từ file nhị phân `stream`; dừng ở dòng không đọc được (sai encoding/CSV)"""
+    if fmt not in FORMATS:
+        raise BulkError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        yield from iter_csv(text) if fmt == "csv" else iter_ndjson(text)
+    except (UnicodeDecodeError, csv.Error) as e:
+        yield None, None, f"Unreadable input, stopped here: {e}"
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+
+
+# ---------- Ghi ----------
+
+class BulkMeetingWriter:
+    """Kiểm tra và ghi cuộc họp theo chunk; dùng chung cho API và CLI.
+
+    `create_model`/`update_model` là MeetingCreate/MeetingUpdate của API, để
+    dòng hàng loạt được kiểm tra giống hệt request từng cuộc họp.
+    """
+
+    def __init__(self, session_factory, create_model, update_model, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 before_delete: Optional[Callable[[List[str]], None]] = None):
+        self.session_factory = session_factory
+        self.create_model = create_model
+        self.update_model = update_model
+        self.chunk_size = max(chunk_size, 1)
+        # Gọi với các meeting sắp bị xóa (hủy job refine/retranscribe/xử lý audio của chúng)
+        self.before_delete = before_delete or (lambda ids: None)
+
+    def run(self, operation: str, stream, fmt: str, include: str = "all") -> dict:
+        """Xử lý toàn bộ `stream`; `include` = all | errors | none quyết định dòng nào có trong results"""
+        if operation not in OPERATIONS:
+            raise BulkError(f"Unsupported operation '{operation}', expected one of {', '.join(OPERATIONS)}")
+        if fmt not in FORMATS:
+            raise BulkError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+        prepare = getattr(self, f"_prepare_{operation}")
+        write = getattr(self, f"_write_{operation}")
+        started = time.perf_counter()
+        counts = {"rows": 0, "created": 0, "updated": 0, "deleted": 0, "not_found": 0, "errors": 0}
+        results = []
+
+        def collect(items):
+            for item in items:
+                counts["errors" if item["status"] == "error" else item["status"]] += 1
+                if include == "all" or (include == "errors" and item["status"] in ("error", "not_found")):
+                    results.append(item)
+
+        chunk = []
+        for line_no, row, error in iter_rows(stream, fmt):
+            counts["rows"] += 1
+            if error is None:
+                try:
+                    chunk.append((line_no, prepare(row)))
+                except ValidationError as e:
+                    error = _validation_message(e)
+                except (ValueError, TypeError) as e:
+                    error = str(e)
+            if error is not None:
+                collect([{"line": line_no, "status": "error", "id": row.get("id") if row else None, "error": error}])
+            if len(chunk) >= self.chunk_size:
+                collect(self._write_chunk(write, chunk))
+                chunk = []
+        if chunk:
+            collect(self._write_chunk(write, chunk))
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "operation": operation,
+            **counts,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_second": round(counts["rows"] / elapsed) if elapsed else None,
+        }
+        logger.info(f"📥 Bulk {operation}: {counts['rows']} rows, {counts['errors']} errors in {elapsed:.2f}s")
+        # Lỗi validate được ghi ngay, dòng hợp lệ khi chunk của nó được ghi: sắp lại theo dòng
+        results.sort(key=lambda item: (item["line"] is None, item["line"] or 0))
+        return {**summary, "results": results}
+
+    def _write_chunk(self, write, chunk: list) -> List[dict]:
+        with self.session_factory() as db:
+            try:
+                results = write(db, chunk)
+                db.commit()
+                return results
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ Bulk chunk failed: {e}")
+                return [{"line": line_no, "status": "error", "id": item.get("id"), "error": f"Database error: {e}"}
+                        for line_no, item in chunk]
+
+    # ----- create -----
+
+    def _prepare_create(self, row: dict) -> dict:
+        meeting_id = row.get("id")
+        meeting = self.create_model.model_validate(row)
+        return {"id": str(meeting_id) if meeting_id else str(uuid.uuid4()), "meeting": meeting}
+
+    def _write_create(self, db, chunk: list) -> List[dict]:
+        ids = [item["id"] for _, item in chunk]
+        existing = {mid for (mid,) in db.query(Meeting.id).filter(Meeting.id.in_(ids))}
+        now = datetime.now()
+        meetings, participants, results, seen = [], {}, [], set()
+        for line_no, item in chunk:
+            meeting_id, meeting = item["id"], item["meeting"]
+            if meeting_id in existing or meeting_id in seen:
+                results.append({"line": line_no, "status": "error", "id": meeting_id,
+                                "error": "Meeting id already exists"})
+                continue
+            seen.add(meeting_id)
+            meetings.append({
+                "id": meeting_id,
+                "title": meeting.title,
+                "description": meeting.description,
+                "start_time": meeting.start_time,
+                "end_time": meeting.end_time,
+                "location_type": meeting.location_type,
+                "location": meeting.location,
+                "organizer": meeting.organizer,
+                "status": meeting.status.value,
+                "recurrence_rule": meeting.recurrence_rule,
+                "tags": json.dumps(meeting.tags or [], ensure_ascii=False),
+                "created_at": now,
+                "updated_at": now,
+            })
+            participants[meeting_id] = meeting.participants
+            results.append({"line": line_no, "status": "created", "id": meeting_id})
+        # render_nulls: dòng có/không có email vẫn cùng một câu lệnh, không bị tách thành từng INSERT
+        db.bulk_insert_mappings(Meeting, meetings, render_nulls=True)
+        sync_participants(db, participants, now, existing=False)
+        return results
+
+    # ----- update -----
+
+    def _prepare_update(self, row: dict) -> dict:
+        meeting_id = row.get("id")
+        if not meeting_id:
+            raise ValueError("id is required")
+        update = self.update_model.model_validate({k: v for k, v in row.items() if k != "id"})
+        return {"id": str(meeting_id), "update": update}
+
+    def _write_update(self, db, chunk: list) -> List[dict]:
+        ids = [item["id"] for _, item in chunk]
+        existing = {mid for (mid,) in db.query(Meeting.id).filter(Meeting.id.in_(ids))}
+        now = datetime.now()
+        mappings, participants, results = [], {}, []
+        for line_no, item in chunk:
+            meeting_id = item["id"]
+            if meeting_id not in existing:
+                results.append({"line": line_no, "status": "not_found", "id": meeting_id})
+                continue
+            # Cùng quy tắc với PUT /api/meetings/{id}
+            mapping = {"id": meeting_id, "updated_at": now}
+            for field, value in item["update"].model_dump(exclude_unset=True).items():
+                if field == "status" and value:
+                    mapping["status"] = value.value
+                elif field == "tags" and value:
+                    mapping["tags"] = json.dumps(value, ensure_ascii=False)
+                elif field == "participants" and value:
+                    participants[meeting_id] = item["update"].participants
+                elif field != "participants" and value is not None:
+                    mapping[field] = value
+            mappings.append(mapping)
+            results.append({"line": line_no, "status": "updated", "id": meeting_id})
+        db.bulk_update_mappings(Meeting, mappings)
+        if participants:
+            sync_participants(db, participants, now)
+        return results
+
+    # ----- delete -----
+
+    def _prepare_delete(self, row: dict) -> dict:
+        meeting_id = row.get("id")
+        if not meeting_id:
+            raise ValueError("id is required")
+        return {"id": str(meeting_id)}
+
+    def _write_delete(self, db, chunk: list) -> List[dict]:
+        ids = list(dict.fromkeys(item["id"] for _, item in chunk))
+        existing = {mid for (mid,) in db.query(Meeting.id).filter(Meeting.id.in_(ids)).all()}
+        if existing:
+            # Không chỉ meeting in_progress: meeting đã xong vẫn có thể còn job refine/retranscribe
+            self.before_delete(sorted(existing))
+            # Như DELETE /api/meetings/{id}: meeting và transcription tham chiếu lẫn nhau, bỏ liên kết trước
+            db.query(Meeting).filter(Meeting.id.in_(existing)).update(
+                {"transcription_id": None}, synchronize_session=False
+            )
+            db.query(Transcription).filter(Transcription.meeting_id.in_(existing)).delete(synchronize_session=False)
+            db.query(Participant).filter(Participant.meeting_id.in_(existing)).delete(synchronize_session=False)
+            db.query(Meeting).filter(Meeting.id.in_(existing)).delete(synchronize_session=False)
+        # Audio/transcript của meeting đã xóa được storage GC dọn như file mồ côi
+        results, seen = [], set()
+        for line_no, item in chunk:
+            found = item["id"] in existing and item["id"] not in seen
+            seen.add(item["id"])
+            results.append({"line": line_no, "status": "deleted" if found else "not_found", "id": item["id"]})
+        return results
+
+
+def main():
+    import app as whisper_app
+
+    parser = argparse.ArgumentParser(description="Bulk create/update/delete meetings from NDJSON or CSV")
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument("file", help="Đường dẫn file, hoặc - để đọc stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Mặc định: theo đuôi file (.csv), còn lại NDJSON")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--results", help="Ghi kết quả từng dòng (NDJSON) ra file")
+    parser.add_argument("--include", choices=["all", "errors", "none"], default="errors",
+                        help="Dòng nào được ghi vào --results")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    writer = whisper_app.bulk_writer(args.chunk_size)
+    if args.file == "-":
+        outcome = writer.run(args.operation, sys.stdin.buffer, fmt, args.include)
+    else:
+        with open(args.file, "rb") as f:
+            outcome = writer.run(args.operation, f, fmt, args.include)
+
+    results = outcome.pop("results")
+    if args.results:
+        with open(args.results, "w", encoding="utf-8") as f:
+            for item in results:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(json.dumps(outcome, ensure_ascii=False))
+    sys.exit(1 if outcome["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
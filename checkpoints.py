@@ -0,0 +1,139 @@
+# checkpoints.py - Checkpoint append-only cho job phiên âm để tiếp tục sau khi restart
+"""
+Mỗi job có một file JSONL trong CHECKPOINT_DIR:
+
+- dòng đầu ``{"type": "job", ...}``: mọi thứ cần để chạy lại job
+- ``{"type": "attempt"}``: mỗi lần job bắt đầu chạy
+- ``{"type": "info", ...}``: ngôn ngữ đã nhận diện
+- ``{"type": "segment", ...}``: từng segment ngay khi được decode
+
+File bị xóa khi job kết thúc (hoàn thành, lỗi hoặc bị hủy). File còn lại
+lúc khởi động nghĩa là job bị gián đoạn và có thể tiếp tục từ segment
+cuối cùng. Dòng cuối bị ghi dở (crash giữa chừng) được bỏ qua khi đọc.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger("whisper-api")
+
+CHECKPOINT_DIR = Path(os.environ.get("CHECKPOINT_DIR", "data/checkpoints"))
+
+
+@dataclass
+class CheckpointState:
+    header: dict
+    segments: List[dict] = field(default_factory=list)
+    language: Optional[str] = None
+    language_probability: Optional[float] = None
+    attempts: int = 0
+
+    @property
+    def resume_from(self) -> float:
+        """Timestamp (giây) để tiếp tục decode"""
+        return self.segments[-1]["end"] if self.segments else 0.0
+
+
+class JobCheckpoint:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.path = CHECKPOINT_DIR / f"{job_id}.jsonl"
+        self._file = None
+
+    @classmethod
+    def create(cls, job_id: str, kind: str, **header) -> "JobCheckpoint":
+        """Ghi header của job (gọi lúc đưa job vào hàng đợi)"""
+        CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+        checkpoint = cls(job_id)
+        with open(checkpoint.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "type": "job",
+                "job_id": job_id,
+                "kind": kind,
+                "created_at": datetime.now().isoformat(),
+                **header
+            }, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return checkpoint
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def header(self) -> Optional[dict]:
+        """Chỉ đọc dòng header (không nạp các segment)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def append(self, record: dict):
+        """Ghi thêm một dòng và fsync để không mất khi process bị kill"""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def start_attempt(self):
+        self.append({"type": "attempt", "at": datetime.now().isoformat()})
+
+    def record_info(self, language: str, language_probability: float):
+        self.append({"type": "info", "language": language, "language_probability": language_probability})
+
+    def append_segment(self, segment: dict):
+        self.append({"type": "segment", **segment})
+
+    def load(self) -> Optional[CheckpointState]:
+        if not self.path.exists():
+            return None
+        state = None
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    record = json.loads(line)
+                except ValueError:
+                    # Dòng cuối ghi dở khi crash: cắt bỏ để lần ghi tiếp không nối vào nó
+                    os.truncate(self.path, valid_bytes)
+                    break
+                valid_bytes += len(line)
+                kind = record.pop("type", None)
+                if kind == "job":
+                    state = CheckpointState(header=record)
+                elif state is None:
+                    break
+                elif kind == "attempt":
+                    state.attempts += 1
+                elif kind == "info":
+                    state.language = record.get("language")
+                    state.language_probability = record.get("language_probability")
+                elif kind == "segment":
+                    state.segments.append(record)
+        return state
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"❌ Could not remove checkpoint {self.path}: {e}")
+
+
+def list_checkpoints() -> List[JobCheckpoint]:
+    """Các checkpoint còn lại trên đĩa (job bị gián đoạn)"""
+    if not CHECKPOINT_DIR.exists():
+        return []
+    return [JobCheckpoint(p.stem) for p in sorted(CHECKPOINT_DIR.glob("*.jsonl"))]
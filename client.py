@@ -3,6 +3,16 @@ import json
 import time
 import sys
 import os
+import argparse
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".mp4", ".webm", ".ogg", ".opus", ".flac", ".aac", ".wma", ".mkv"}
+MANIFEST_NAME = ".whisper-batch.jsonl"
+TASK_STATUS_FIELDS = "id,status,error,queue_position,estimated_wait_seconds,audio_duration"
 
 def transcribe_audio(api_url, file_path, options=None):
     """
@@ -100,9 +110,303 @@ def save_transcription(result, output_path):
         f.write(f"Processing time: {result['processing_time']:.2f} seconds\n")
         f.write(f"Audio duration: {result['audio_duration']:.2f} seconds\n")
 
+def format_timestamp(seconds, separator=","):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+def save_srt(result, output_path):
+    """
+    Save transcription result as SRT subtitles
+    
+    Args:
+        result (dict): Transcription result
+        output_path (str): Path to save the subtitles
+    """
+    with open(output_path, "w", encoding="utf-8") as f:
+        for index, segment in enumerate(result["segments"], start=1):
+            f.write(f"{index}\n{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n")
+            f.write(f"{segment['text'].strip()}\n\n")
+
+def save_json(result, output_path):
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+WRITERS = {"txt": save_transcription, "json": save_json, "srt": save_srt}
+
+def _glob_root(pattern):
+    """Directory part of a glob pattern before the first wildcard"""
+    parts = []
+    for part in Path(pattern).parts[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path(".")
+
+def collect_inputs(patterns):
+    """
+    Expand files, directories (recursively) and glob patterns into audio files
+    
+    Returns:
+        list: (file_path, relative_path) pairs; the relative path mirrors the
+        input layout under the output directory
+    """
+    inputs, seen = [], set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = Path(pattern)
+            candidates = [p for p in sorted(root.rglob("*")) if p.suffix.lower() in AUDIO_EXTENSIONS]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+            root = _glob_root(pattern) if glob.has_magic(pattern) else None
+            candidates = [Path(p) for p in matches]
+        for path in candidates:
+            if not path.is_file():
+                print(f"Skipping {path}: not a file")
+                continue
+            key = str(path.resolve())
+            if key in seen:
+                continue
+            seen.add(key)
+            try:
+                relative = path.relative_to(root) if root else Path(path.name)
+            except ValueError:
+                relative = Path(path.name)
+            inputs.append((path, relative))
+    return inputs
+
+class Manifest:
+    """Append-only JSONL log of batch progress, used to resume after an interruption"""
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partial last line from an interrupted run
+                    self.entries[entry["file"]] = entry
+    
+    def record(self, file_key, **fields):
+        with self._lock:
+            entry = {**self.entries.get(file_key, {}), "file": file_key, **fields}
+            self.entries[file_key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return entry
+
+class BatchClient:
+    """
+    Transcribe many files with a bounded number of jobs in flight
+    
+    Uploads share one pooled requests.Session. Each job is polled with
+    adaptive backoff: the server's queue estimate while queued, growing
+    intervals while processing, and Retry-After when the server rejects
+    an upload because this client already has too many jobs.
+    """
+    
+    def __init__(self, api_url, output_dir, options=None, formats=("txt",), concurrency=4,
+                 priority="background", min_poll=0.5, max_poll=15.0, client_id=None):
+        self.api_url = api_url.rstrip("/")
+        self.output_dir = Path(output_dir)
+        self.options = options or {}
+        self.formats = formats
+        self.concurrency = concurrency
+        self.priority = priority
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if client_id:
+            self.session.headers["X-Client-ID"] = client_id
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = Manifest(self.output_dir / MANIFEST_NAME)
+    
+    @staticmethod
+    def _fingerprint(path):
+        stat = path.stat()
+        return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+    
+    def _outputs(self, relative):
+        base = self.output_dir / relative
+        return {fmt: str(base.with_suffix("." + fmt)) for fmt in self.formats}
+    
+    def _is_done(self, path, entry):
+        if not entry or entry.get("status") != "completed" or entry.get("source") != self._fingerprint(path):
+            return False
+        return all(os.path.exists(p) for p in entry.get("outputs", {}).values()) \
+            and set(entry.get("outputs", {})) >= set(self.formats)
+    
+    def submit(self, path):
+        """Upload one file; waits and retries while the server is at its per-client limit"""
+        form_data = {key: str(value).lower() if isinstance(value, bool) else str(value)
+                     for key, value in self.options.items()}
+        form_data["priority"] = self.priority
+        while True:
+            with open(path, "rb") as f:
+                response = self.session.post(f"{self.api_url}/api/transcribe",
+                                             files={"file": (path.name, f)}, data=form_data)
+            if response.status_code == 429:
+                time.sleep(float(response.headers.get("Retry-After", 5)))
+                continue
+            if response.status_code != 202:
+                raise RuntimeError(f"upload failed: {response.status_code} - {response.text[:200]}")
+            return response.json()["id"]
+    
+    def wait(self, task_id):
+        """Poll a task until it finishes; returns the result, or None if the task is gone"""
+        delay = self.min_poll
+        while True:
+            response = self.session.get(f"{self.api_url}/api/tasks/{task_id}",
+                                        params={"fields": TASK_STATUS_FIELDS})
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                raise RuntimeError(f"status check failed: {response.status_code} - {response.text[:200]}")
+            task = response.json()
+            if task["status"] == "completed":
+                response = self.session.get(f"{self.api_url}/api/tasks/{task_id}", params={"fields": "result"})
+                response.raise_for_status()
+                return response.json()["result"]
+            if task["status"] in ("failed", "cancelled"):
+                raise RuntimeError(f"transcription {task['status']}: {task.get('error') or 'unknown error'}")
+            
+            if task["status"] == "queued" and task.get("estimated_wait_seconds"):
+                # Sleep most of the estimated wait instead of polling through it
+                delay = task["estimated_wait_seconds"] * 0.8
+            else:
+                delay *= 1.5
+            time.sleep(min(max(delay, self.min_poll), self.max_poll))
+    
+    def process(self, path, relative):
+        key = str(path.resolve())
+        entry = self.manifest.entries.get(key)
+        if self._is_done(path, entry):
+            return {**entry, "status": "skipped"}
+        
+        started = time.monotonic()
+        result = None
+        source = self._fingerprint(path)
+        if entry and entry.get("task_id") and entry.get("source") == source and entry.get("status") == "submitted":
+            # Interrupted while the server was still working: pick the task back up
+            result = self.wait(entry["task_id"])
+        if result is None:
+            task_id = self.submit(path)
+            self.manifest.record(key, status="submitted", task_id=task_id, source=source)
+            result = self.wait(task_id)
+            if result is None:
+                raise RuntimeError(f"task {task_id} disappeared from the server")
+        
+        outputs = self._outputs(relative)
+        for fmt, output_path in outputs.items():
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            WRITERS[fmt](result, output_path)
+        return self.manifest.record(
+            key, status="completed", source=source, outputs=outputs,
+            audio_duration=result.get("audio_duration") or 0,
+            processing_time=result.get("processing_time") or 0,
+            wall_time=round(time.monotonic() - started, 2),
+        )
+    
+    def run(self, inputs):
+        """Transcribe all inputs; returns summary statistics"""
+        counts = {"completed": 0, "skipped": 0, "failed": 0}
+        audio_seconds = processing_seconds = 0.0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.process, path, relative): path for path, relative in inputs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    counts["failed"] += 1
+                    self.manifest.record(str(path.resolve()), status="failed", error=str(e))
+                    print(f"[{done}/{len(inputs)}] FAILED {path}: {e}")
+                    continue
+                counts[entry["status"]] += 1
+                if entry["status"] == "completed":
+                    audio_seconds += entry["audio_duration"]
+                    processing_seconds += entry["processing_time"]
+                    print(f"[{done}/{len(inputs)}] {path} ({entry['audio_duration']:.1f}s audio, "
+                          f"{entry['wall_time']:.1f}s) -> {', '.join(entry['outputs'].values())}")
+                else:
+                    print(f"[{done}/{len(inputs)}] {path} already done, skipped")
+        elapsed = time.monotonic() - started
+        return {
+            **counts,
+            "elapsed_seconds": round(elapsed, 1),
+            "audio_seconds": round(audio_seconds, 1),
+            "files_per_minute": round(counts["completed"] / elapsed * 60, 2) if elapsed else 0.0,
+            # Audio seconds transcribed per wall-clock second across all jobs
+            "throughput_x_realtime": round(audio_seconds / elapsed, 2) if elapsed else 0.0,
+            # Server-side processing time / audio duration
+            "server_rtf": round(processing_seconds / audio_seconds, 3) if audio_seconds else None,
+            "effective_rtf": round(elapsed / audio_seconds, 3) if audio_seconds else None,
+        }
+
+def print_summary(summary):
+    print("\n# Batch summary\n")
+    print(f"Completed: {summary['completed']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+    print(f"Elapsed: {summary['elapsed_seconds']:.1f}s for {summary['audio_seconds']:.1f}s of audio "
+          f"({summary['files_per_minute']} files/min)")
+    print(f"Throughput: {summary['throughput_x_realtime']}x real time")
+    if summary["server_rtf"] is not None:
+        print(f"Real-time factor: server {summary['server_rtf']}, end-to-end {summary['effective_rtf']}")
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog="client.py batch", description="Transcribe many audio files")
+    parser.add_argument("api_url")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="transcriptions")
+    parser.add_argument("-f", "--format", default="txt", help="Comma separated: txt,json,srt")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help="Jobs in flight (keep within the server's MAX_JOBS_PER_CLIENT)")
+    parser.add_argument("--priority", default="background", choices=["urgent", "meeting", "adhoc", "background"])
+    parser.add_argument("--model-size")
+    parser.add_argument("--language")
+    parser.add_argument("--word-timestamps", action="store_true")
+    parser.add_argument("--client-id", help="X-Client-ID sent with every request")
+    parser.add_argument("--max-poll", type=float, default=15.0, help="Longest wait between status checks")
+    args = parser.parse_args(argv)
+    
+    formats = tuple(f.strip() for f in args.format.split(",") if f.strip())
+    unknown = set(formats) - set(WRITERS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+    options = {}
+    if args.model_size:
+        options["model_size"] = args.model_size
+    if args.language:
+        options["language"] = args.language
+    if args.word_timestamps:
+        options["word_timestamps"] = True
+    
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        parser.error("no audio files found")
+    client = BatchClient(args.api_url, args.output_dir, options, formats, max(args.concurrency, 1),
+                         args.priority, max_poll=args.max_poll, client_id=args.client_id)
+    summary = client.run(inputs)
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(batch_main(sys.argv[2:]))
+    
     if len(sys.argv) < 3:
         print("Usage: python client.py <api_url> <audio_file> [output_file]")
+        print("       python client.py batch <api_url> <files|dirs|globs>... [-o DIR] [-f txt,json,srt] [-c N]")
         sys.exit(1)
     
     api_url = sys.argv[1].rstrip('/')  # Remove trailing slash if present
@@ -0,0 +1,124 @@
+# compression.py - Nén response (br/gzip) theo Accept-Encoding
+"""
+``CompressionMiddleware`` nén các response một khối (JSON, HTML...) lớn hơn
+``minimum_size`` bằng brotli (nếu cài ``brotli``) hoặc gzip tùy header
+Accept-Encoding của client. Response dạng stream (FileResponse,
+StreamingResponse) và response đã có Content-Encoding (asset nén sẵn) được
+chuyển nguyên vẹn. Body lớn được nén trong threadpool để không chặn event loop.
+"""
+import gzip
+import os
+from typing import Iterable, Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn; khi đó chỉ dùng gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))  # 4: nhanh, đủ tốt cho response động
+# Body lớn hơn ngưỡng này được nén ngoài event loop
+THREADPOOL_MIN_SIZE = 64 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def available_encodings() -> tuple:
+    """Các encoding server hỗ trợ, theo thứ tự ưu tiên"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str, available: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Encoding tốt nhất trong `available` mà client chấp nhận (None = không nén)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available or available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Nén `data`; `level` là quality với br, compresslevel với gzip"""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Giữ lại header cho đến khi biết body là một khối hay stream
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if is_compressible(headers.get("content-type")) and "content-encoding" not in headers:
+                headers.add_vary_header("Accept-Encoding")
+                if not message.get("more_body") and len(body) >= self.minimum_size \
+                        and start["status"] not in (204, 206, 304):
+                    if len(body) >= THREADPOOL_MIN_SIZE:
+                        compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+                    else:
+                        compressed = compress(body, encoding)
+                    if len(compressed) < len(body):
+                        body = compressed
+                        headers["Content-Encoding"] = encoding
+                        headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
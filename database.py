@@ -1,8 +1,10 @@
-# database.py - Kết nối SQLite với SQLAlchemy
+# database.py - Kết nối database với SQLAlchemy (SQLite mặc định, hoặc DATABASE_URL bất kỳ)
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from contextlib import contextmanager
 import logging
 
@@ -10,17 +12,135 @@ logger = logging.getLogger(__name__)
 
 # Đường dẫn database - sử dụng đường dẫn tuyệt đối
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'data', 'app.db')}"
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'data', 'app.db')}"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL
 
 # Tạo thư mục data nếu chưa tồn tại
 os.makedirs(os.path.join(BASE_DIR, 'data'), exist_ok=True)
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Cấu hình mặc định (ghi đè bằng biến môi trường hoặc tham số của create_db_engine)
+DB_SETTINGS = {
+    "pool_size": _env_int("DB_POOL_SIZE", 10),
+    "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+    "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+    "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),  # Chỉ dùng cho server DB
+    "busy_timeout_ms": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+    # WAL: reader không bị chặn bởi writer (và ngược lại)
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    # NORMAL an toàn với WAL (chỉ có thể mất transaction cuối khi mất điện)
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size_kb": _env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024),
+    "mmap_size_mb": _env_int("SQLITE_MMAP_SIZE_MB", 256),
+    "echo": os.environ.get("DB_ECHO", "false").lower() == "true",  # Đặt True để debug SQL queries
+}
+
+
+def _sqlite_pragmas(settings: dict, memory: bool) -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}",
+        f"PRAGMA synchronous = {settings['synchronous']}",
+        f"PRAGMA cache_size = -{int(settings['cache_size_kb'])}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not memory:
+        # journal_mode là thuộc tính của file; :memory: luôn dùng MEMORY
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings['journal_mode']}")
+        pragmas.append(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    return pragmas
+
+
+def create_db_engine(url: str = None, **overrides):
+    """Tạo engine cho `url` (mặc định DATABASE_URL).
+
+    SQLite: pragma WAL/synchronous/cache/mmap/busy_timeout trên mỗi connection,
+    pool cỡ pool_size + max_overflow (StaticPool cho :memory:).
+    DB khác: pool_size/max_overflow/pool_timeout/pool_recycle và pool_pre_ping.
+    """
+    url = url or SQLALCHEMY_DATABASE_URL
+    settings = {**DB_SETTINGS, **overrides}
+    parsed = make_url(url)
+
+    if parsed.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=settings["pool_size"],
+            max_overflow=settings["max_overflow"],
+            pool_timeout=settings["pool_timeout"],
+            pool_recycle=settings["pool_recycle"],
+            pool_pre_ping=True,
+            echo=settings["echo"],
+        )
+
+    memory = parsed.database in (None, "", ":memory:")
+    if memory:
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            echo=settings["echo"],
+        )
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(parsed.database)), exist_ok=True)
+        engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": settings["busy_timeout_ms"] / 1000,
+            },
+            pool_size=settings["pool_size"],
+            max_overflow=settings["max_overflow"],
+            pool_timeout=settings["pool_timeout"],
+            echo=settings["echo"],
+        )
+
+    pragmas = _sqlite_pragmas(settings, memory)
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
+
+
 # Tạo engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    echo=False  # Đặt True để debug SQL queries
-)
+engine = create_db_engine()
+
+def upgrade_schema(bind, metadata) -> list:
+    """Thêm cột (nullable) và index mới vào bảng đã có; create_all chỉ tạo bảng chưa có"""
+    inspector = inspect(bind)
+    changes = []
+    with bind.begin() as conn:
+        for table in metadata.tables.values():
+            if not inspector.has_table(table.name):
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns and column.nullable:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    changes.append(f"{table.name}.{column.name}")
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    changes.append(index.name)
+    if changes:
+        logger.info(f"Upgraded database schema: {', '.join(changes)}")
+    return changes
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -43,4 +163,4 @@ def get_db_session():
         db.rollback()
         raise e
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
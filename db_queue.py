@@ -0,0 +1,435 @@
+# db_queue.py - Hàng đợi job phiên âm trong database, dùng chung giữa API và worker
+"""
+Dùng khi JOB_QUEUE_BACKEND=database: API chỉ ghi job vào bảng
+``transcription_jobs``, còn việc phiên âm do một hoặc nhiều process
+``python -m whisper_worker`` (có thể ở máy khác) đảm nhận.
+
+- Worker nhận job bằng UPDATE có điều kiện (``status = 'queued'``), nên
+  hai worker không bao giờ cùng nhận một job.
+- Job đang chạy có lease; worker gia hạn bằng heartbeat. Lease hết hạn
+  (worker chết) thì job quay lại hàng đợi, tối đa ``max_attempts`` lần.
+- Lập lịch và ước lượng thời gian chờ dùng lại JobQueue: trạng thái được
+  nạp từ database trước mỗi lần tính. Virtual time của lớp ưu tiên và của
+  (lớp, submitter) là số giây audio của các job đã bắt đầu chạy trong
+  ``fair_window`` giây gần nhất, nên mỗi lần worker nhận job là một lần
+  "tính phí" bền vững, dùng chung giữa mọi worker và API.
+"""
+import json
+import logging
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+
+from checkpoints import JobCheckpoint
+from job_queue import IDLE_PRIORITIES, Job, JobQueue, PRIORITY_WEIGHTS
+from models import Meeting, Transcription, TranscriptionJob
+from transcript_versions import VERSION_CANCELLED, VERSION_FAILED, VERSION_PROCESSING, VERSION_QUEUED
+
+logger = logging.getLogger("whisper-api")
+
+ACTIVE_STATUSES = ("queued", "processing")
+# Dịch vụ đã nhận (giây audio đã bắt đầu chạy) được tính vào virtual time trong khoảng này
+FAIR_WINDOW_SECONDS = float(os.environ.get("QUEUE_FAIR_WINDOW_SECONDS", 3600))
+
+
+class DatabaseJobQueue(JobQueue):
+    """Cùng giao diện với JobQueue (admission, ước lượng, hủy, đổi ưu tiên)
+    nhưng trạng thái nằm trong database; job được chạy bởi whisper_worker"""
+
+    def __init__(self, session_factory, max_attempts: int = 3, fair_window: float = FAIR_WINDOW_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts
+        self.fair_window = fair_window
+        self.live_workers = 0
+
+    # ---------- Đồng bộ trạng thái ----------
+
+    @staticmethod
+    def _to_job(row: TranscriptionJob, now: float, now_wall: datetime) -> Job:
+        def monotonic(moment: Optional[datetime]) -> Optional[float]:
+            return now - (now_wall - moment).total_seconds() if moment else None
+
+        return Job(
+            id=row.id,
+            client_id=row.client_id or "",
+            func=None,
+            audio_duration=row.audio_duration or 0.0,
+            priority=row.priority,
+            submitted_at=monotonic(row.created_at) or now,
+            started_at=monotonic(row.started_at) if row.status == "processing" else None,
+        )
+
+    def _vtimes(self, db, now_wall: datetime) -> Tuple[Dict[str, float], Dict[tuple, float]]:
+        """Virtual time của lớp và của (lớp, submitter) từ các job đã bắt đầu trong `fair_window`"""
+        service = db.query(
+            TranscriptionJob.priority, TranscriptionJob.client_id, func.sum(TranscriptionJob.audio_duration)
+        ).filter(
+            TranscriptionJob.started_at >= now_wall - timedelta(seconds=self.fair_window)
+        ).group_by(TranscriptionJob.priority, TranscriptionJob.client_id).all()
+        class_vtime, flow_vtime = {}, {}
+        for priority, client_id, seconds in service:
+            # Cùng cách tính như JobQueue._charge
+            class_vtime[priority] = class_vtime.get(priority, 0.0) + (seconds or 0.0) / self._weight(priority)
+            flow_vtime[(priority, client_id or "")] = seconds or 0.0
+        return class_vtime, flow_vtime
+
+    def _sync(self):
+        """Nạp job đang chờ/đang chạy, virtual time và RTF gần đây từ database"""
+        now, now_wall = time.monotonic(), datetime.now()
+        with self.session_factory() as db:
+            rows = db.query(TranscriptionJob).filter(TranscriptionJob.status.in_(ACTIVE_STATUSES)).all()
+            self._class_vtime, self._flow_vtime = self._vtimes(db, now_wall)
+            recent = db.query(
+                TranscriptionJob.audio_duration, TranscriptionJob.started_at, TranscriptionJob.finished_at
+            ).filter(
+                TranscriptionJob.status == "completed",
+                TranscriptionJob.audio_duration > 0,
+                TranscriptionJob.started_at.isnot(None),
+            ).order_by(TranscriptionJob.finished_at.desc()).limit(20).all()
+
+        pending, running, workers = [], {}, set()
+        for row in rows:
+            job = self._to_job(row, now, now_wall)
+            if row.status == "processing" and row.lease_expires_at and row.lease_expires_at > now_wall:
+                running[row.id] = job
+                workers.add(row.worker_id)
+            else:
+                # Lease hết hạn: job sẽ được chạy lại
+                job.started_at = None
+                pending.append(job)
+        self._pending, self._running = pending, running
+        self.live_workers = len(workers)
+        if recent:
+            self.rtf = statistics.median(
+                (finished - started).total_seconds() / duration for duration, started, finished in recent
+            )
+
+    # ---------- Giao diện JobQueue ----------
+
+    def check_admission(self, client_id: str):
+        with self._lock:
+            self._sync()
+            super().check_admission(client_id)
+
+    def submit(self, job: Job, force: bool = False) -> dict:
+        if not force:
+            self.check_admission(job.client_id)
+        if job.priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{job.priority}'")
+        payload = job.payload or {}
+        with self.session_factory() as db:
+            db.add(TranscriptionJob(
+                id=job.id,
+                kind=payload.get("kind", "transcription"),
+                status="queued",
+                priority=job.priority,
+                client_id=job.client_id,
+                meeting_id=payload.get("meeting_id"),
+                audio_path=payload["audio_path"],
+                file_name=payload.get("file_name"),
+                audio_duration=job.audio_duration,
+                temp_file=payload.get("temp_file", False),
+                options=json.dumps(payload["options"]) if payload.get("options") else None,
+                created_at=datetime.now(),
+            ))
+            db.commit()
+        return self.estimate(job.id) or {"queue_position": 0, "estimated_wait_seconds": 0.0}
+
+    def estimate(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            self._sync()
+            return super().estimate(job_id)
+
+    def regular_waiting(self) -> bool:
+        with self.session_factory() as db:
+            return db.query(TranscriptionJob.id).filter(
+                TranscriptionJob.status == "queued",
+                TranscriptionJob.priority.notin_(IDLE_PRIORITIES)
+            ).first() is not None
+
+    def set_priority(self, job_id: str, priority: str) -> bool:
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{priority}'")
+        with self.session_factory() as db:
+            changed = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id, TranscriptionJob.status == "queued")
+                .values(priority=priority)
+            ).rowcount
+            db.commit()
+        return changed == 1
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        with self.session_factory() as db:
+            dequeued = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id, TranscriptionJob.status == "queued")
+                .values(status="cancelled", finished_at=datetime.now())
+            ).rowcount
+            if dequeued:
+                db.commit()
+                self._cleanup(db, db.get(TranscriptionJob, job_id), "cancelled")
+                return "dequeued"
+            # Worker thấy cờ này ở lần heartbeat kế tiếp
+            flagged = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id, TranscriptionJob.status == "processing")
+                .values(cancel_requested=True)
+            ).rowcount
+            db.commit()
+        return "cancelling" if flagged else None
+
+    async def start(self):
+        logger.info(f"🗄️ Database job queue: max depth {self.max_depth}, "
+                    f"{self.per_client_limit} jobs per client, jobs run in whisper_worker processes")
+
+    async def stop(self):
+        self.shutting_down = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._sync()
+            stats = super().stats()
+        with self.session_factory() as db:
+            counts = dict(
+                db.query(TranscriptionJob.status, func.count(TranscriptionJob.id))
+                .group_by(TranscriptionJob.status).all()
+            )
+        stats.update(
+            backend="database",
+            live_workers=self.live_workers,
+            completed=counts.get("completed", 0),
+            cancelled=counts.get("cancelled", 0),
+            failed=counts.get("failed", 0),
+        )
+        return stats
+
+    # ---------- Task API (thay cho transcription_tasks trong process) ----------
+
+    @staticmethod
+    def _task_dict(row: TranscriptionJob) -> dict:
+        task = {
+            "id": row.id,
+            "status": row.status,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "file_name": row.file_name,
+            "audio_duration": row.audio_duration,
+            "priority": row.priority,
+            "meeting_id": row.meeting_id,
+        }
+        if row.result:
+            task["result"] = json.loads(row.result)
+        if row.error:
+            task["error"] = row.error
+        return task
+
+    def get_task(self, job_id: str) -> Optional[dict]:
+        with self.session_factory() as db:
+            row = db.get(TranscriptionJob, job_id)
+            task = self._task_dict(row) if row else None
+        if task and task["status"] == "queued":
+            task.update(self.estimate(job_id) or {})
+        return task
+
+    def list_tasks(self, limit: int = 10, status: Optional[str] = None) -> List[dict]:
+        with self.session_factory() as db:
+            query = db.query(TranscriptionJob)
+            if status:
+                query = query.filter(TranscriptionJob.status == status)
+            tasks = [self._task_dict(row) for row in
+                     query.order_by(TranscriptionJob.created_at.desc()).limit(limit).all()]
+        if any(task["status"] == "queued" for task in tasks):
+            with self._lock:
+                self._sync()
+                for task in tasks:
+                    if task["status"] == "queued":
+                        task.update(JobQueue.estimate(self, task["id"]) or {})
+        return tasks
+
+    def delete_task(self, job_id: str) -> bool:
+        """Xóa job đã kết thúc"""
+        with self.session_factory() as db:
+            deleted = db.query(TranscriptionJob).filter(
+                TranscriptionJob.id == job_id,
+                TranscriptionJob.status.notin_(ACTIVE_STATUSES)
+            ).delete(synchronize_session=False)
+            db.commit()
+        return deleted == 1
+
+    def active_task_ids(self, meeting_id: str) -> List[str]:
+        with self.session_factory() as db:
+            return [row.id for row in db.query(TranscriptionJob.id).filter(
+                TranscriptionJob.meeting_id == meeting_id,
+                TranscriptionJob.status.in_(ACTIVE_STATUSES)
+            ).all()]
+
+    def active_audio_paths(self) -> List[str]:
+        with self.session_factory() as db:
+            return [path for (path,) in db.query(TranscriptionJob.audio_path).filter(
+                TranscriptionJob.status.in_(ACTIVE_STATUSES)
+            ).all()]
+
+    # ---------- Phía worker ----------
+
+    def _cleanup(self, db, row: TranscriptionJob, status: str, error: Optional[str] = None):
+        """Dọn checkpoint, file tạm và phiên bản transcript của job kết thúc mà không qua pipeline"""
+        JobCheckpoint(row.id).discard()
+        if row.temp_file:
+            Path(row.audio_path).unlink(missing_ok=True)
+        if row.kind == "retranscribe":
+            # Như on_cancel của hàng đợi trong process: phiên bản không còn ở trạng thái chờ mãi
+            version = db.get(Transcription, row.id)
+            if version is not None and version.status in (VERSION_QUEUED, VERSION_PROCESSING):
+                version.status = VERSION_CANCELLED if status == "cancelled" else VERSION_FAILED
+                version.error = error
+                version.updated_at = datetime.now()
+                db.commit()
+        elif row.kind == "meeting" and row.meeting_id and status == "cancelled":
+            # Job hủy khi còn chờ: cuộc họp không bị kẹt ở in_progress
+            meeting = db.get(Meeting, row.meeting_id)
+            if meeting is not None and meeting.status == "in_progress":
+                meeting.status = "scheduled"
+                meeting.updated_at = datetime.now()
+                db.commit()
+
+    def _reap_expired(self, db, now: datetime):
+        """Trả job có lease hết hạn về hàng đợi, hoặc đánh dấu lỗi sau max_attempts lần"""
+        expired = db.query(TranscriptionJob).filter(
+            TranscriptionJob.status == "processing",
+            TranscriptionJob.lease_expires_at < now
+        ).all()
+        for row in expired:
+            previous_worker = row.worker_id
+            if row.cancel_requested:
+                values = {"status": "cancelled", "finished_at": now}
+            elif (row.attempts or 0) >= self.max_attempts:
+                values = {"status": "failed", "finished_at": now,
+                          "error": f"Worker lost {row.attempts} times, giving up"}
+            else:
+                values = {"status": "queued"}
+            reaped = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == row.id,
+                       TranscriptionJob.status == "processing",
+                       TranscriptionJob.lease_expires_at < now)
+                .values(worker_id=None, lease_expires_at=None, **values)
+            ).rowcount
+            db.commit()
+            if not reaped:
+                continue
+            logger.warning(f"⌛ Lease of job {row.id} (worker {previous_worker}) expired -> {values['status']}")
+            if values["status"] != "queued":
+                self._cleanup(db, row, values["status"], values.get("error"))
+                # Lượt tinh chỉnh/phiên âm lại hỏng không làm hỏng cuộc họp đã có bản phiên âm
+                if values["status"] == "failed" and row.meeting_id and row.kind == "meeting":
+                    meeting = db.query(Meeting).filter(Meeting.id == row.meeting_id).first()
+                    if meeting:
+                        meeting.status = "failed"
+                        meeting.updated_at = now
+                        db.commit()
+
+    def claim(self, worker_id: str, lease_seconds: float, allow_idle: bool = True) -> Optional[dict]:
+        """Nhận job kế tiếp theo thứ tự lập lịch, hoặc None nếu hàng đợi trống.
+
+        Job lớp idle chỉ được nhận khi `allow_idle` và không còn job thường nào chờ.
+        """
+        now, now_wall = time.monotonic(), datetime.now()
+        with self.session_factory() as db:
+            self._reap_expired(db, now_wall)
+            rows = {row.id: row for row in db.query(TranscriptionJob).filter(TranscriptionJob.status == "queued").all()}
+            candidates = [self._to_job(row, now, now_wall) for row in rows.values()]
+            # started_at của job được nhận là phí của lượt này cho các lần nhận sau
+            class_vtime, flow_vtime = self._vtimes(db, now_wall)
+            while candidates:
+                runnable = self._regular(candidates) or (candidates if allow_idle else [])
+                if not runnable:
+                    break
+                job = self._pick(runnable, class_vtime, flow_vtime, now)
+                claimed = db.execute(
+                    update(TranscriptionJob)
+                    .where(TranscriptionJob.id == job.id, TranscriptionJob.status == "queued")
+                    .values(
+                        status="processing",
+                        worker_id=worker_id,
+                        lease_expires_at=now_wall + timedelta(seconds=lease_seconds),
+                        started_at=now_wall,
+                        attempts=TranscriptionJob.attempts + 1,
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:
+                    row = rows[job.id]
+                    db.refresh(row)
+                    return {
+                        "id": row.id,
+                        "kind": row.kind,
+                        "priority": row.priority,
+                        "client_id": row.client_id,
+                        "meeting_id": row.meeting_id,
+                        "audio_path": row.audio_path,
+                        "file_name": row.file_name,
+                        "audio_duration": row.audio_duration,
+                        "temp_file": row.temp_file,
+                        "options": json.loads(row.options) if row.options else None,
+                        "attempts": row.attempts,
+                        "created_at": row.created_at.isoformat() if row.created_at else None,
+                    }
+                # Worker khác đã nhận trước
+                candidates.remove(job)
+        return None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> Tuple[bool, bool]:
+        """Gia hạn lease; trả về (còn giữ job, job bị yêu cầu hủy)"""
+        with self.session_factory() as db:
+            renewed = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id,
+                       TranscriptionJob.worker_id == worker_id,
+                       TranscriptionJob.status == "processing")
+                .values(lease_expires_at=datetime.now() + timedelta(seconds=lease_seconds))
+            ).rowcount
+            db.commit()
+            if not renewed:
+                return False, False
+            return True, bool(db.query(TranscriptionJob.cancel_requested)
+                              .filter(TranscriptionJob.id == job_id).scalar())
+
+    def finish(self, job_id: str, worker_id: str, status: str,
+               result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+        """Ghi kết quả; False nếu worker đã mất lease (job thuộc worker khác)"""
+        with self.session_factory() as db:
+            finished = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id,
+                       TranscriptionJob.worker_id == worker_id,
+                       TranscriptionJob.status == "processing")
+                .values(
+                    status=status,
+                    result=json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error=error,
+                    finished_at=datetime.now(),
+                    lease_expires_at=None,
+                )
+            ).rowcount
+            db.commit()
+        return finished == 1
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Trả job về hàng đợi khi worker tắt (không tính là một lần thử)"""
+        with self.session_factory() as db:
+            released = db.execute(
+                update(TranscriptionJob)
+                .where(TranscriptionJob.id == job_id,
+                       TranscriptionJob.worker_id == worker_id,
+                       TranscriptionJob.status == "processing")
+                .values(status="queued", worker_id=None, lease_expires_at=None,
+                        attempts=TranscriptionJob.attempts - 1)
+            ).rowcount
+            db.commit()
+        return released == 1
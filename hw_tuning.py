@@ -0,0 +1,315 @@
+# hw_tuning.py - Chia CPU cho suy luận theo phần cứng thật: core, quota cgroup, tập lệnh
+"""
+``WhisperModel`` mặc định dùng 4 thread (``cpu_threads``) và 1 worker bất
+kể máy có bao nhiêu core, còn ``os.cpu_count()`` trong container trả về số
+core của host chứ không phải giới hạn CPU của container. Vài model chạy
+song song vì thế tranh nhau core, còn một job đơn lẻ lại không dùng hết.
+
+``detect_hardware`` đọc:
+
+- số CPU được phép chạy (``sched_getaffinity``) và quota cgroup (v2
+  ``cpu.max``, v1 ``cpu.cfs_quota_us``): ngân sách thread = min của hai số
+- tên CPU và cờ tập lệnh (AVX2, AVX-512, VNNI, AMX...) trong ``/proc/cpuinfo``
+- compute type CTranslate2 hỗ trợ trên CPU này
+
+``TuningProfile`` là cách chia ngân sách đó: compute type, số job chạy song
+song và số thread mỗi job (job × thread = ngân sách). Không có profile đã
+đo thì dùng ước lượng (``default_profile``). Đo trên máy thật bằng:
+
+    python -m hw_tuning benchmark --model base --clip samples/meeting.wav
+
+Lệnh này chạy clip tham chiếu với từng tổ hợp (compute type, thread, số
+job song song), ghi tổ hợp có throughput cao nhất vào ``HW_PROFILE_PATH``.
+Profile đo trên phần cứng khác (fingerprint khác) bị bỏ qua.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+TUNING_SETTINGS = {
+    "profile_path": os.environ.get("HW_PROFILE_PATH", "data/hw_profile.json"),
+    "cpu_budget": int(_env_float("CPU_BUDGET", 0)),  # 0 = tự phát hiện
+    # Thread mỗi job khi chưa đo: encoder của Whisper tăng tốc kém dần sau khoảng 4-8 thread
+    "default_threads_per_job": int(_env_float("DEFAULT_THREADS_PER_JOB", 4)),
+}
+
+# Compute type được thử khi đo, theo thứ tự ưu tiên khi throughput ngang nhau
+BENCHMARK_COMPUTE_TYPES = ("int8", "int8_float32", "int8_bfloat16", "bfloat16", "float32")
+BENCHMARK_CONCURRENCY = (1, 2, 4, 8)
+# Cờ tập lệnh liên quan đến tốc độ suy luận
+ISA_FLAGS = ("sse4_2", "fma", "f16c", "avx2", "avx512f", "avx512bw", "avx512_vnni", "avx_vnni",
+             "avx512_bf16", "avx512_fp16", "amx_bf16", "amx_int8", "asimd", "asimddp", "i8mm")
+
+
+# ---------- Phát hiện phần cứng ----------
+
+def _read(path) -> Optional[str]:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """Số CPU mà quota cgroup cho phép (vd: 2.5), None nếu không giới hạn"""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<quota> <period>" hoặc "max <period>"
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")  # cgroup v1
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def affinity_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS/Windows
+        return os.cpu_count() or 1
+
+
+def _cpuinfo() -> Tuple[str, List[str]]:
+    model, flags = "", []
+    for line in (_read("/proc/cpuinfo") or "").splitlines():
+        key, _, value = line.partition(":")
+        key = key.strip()
+        if key in ("model name", "Model") and not model:
+            model = value.strip()
+        elif key in ("flags", "Features") and not flags:
+            flags = value.split()
+    return model or platform.processor() or platform.machine(), [flag for flag in ISA_FLAGS if flag in flags]
+
+
+def supported_compute_types(device: str = "cpu") -> List[str]:
+    try:
+        import ctranslate2
+    except ImportError:  # backend giả / chưa cài: không lọc
+        return []
+    return sorted(ctranslate2.get_supported_compute_types(device))
+
+
+@dataclass
+class HardwareInfo:
+    logical_cpus: int
+    affinity_cpus: int
+    cgroup_cpus: Optional[float]
+    cpu_budget: int  # Tổng số thread suy luận nên dùng
+    cpu_model: str
+    isa: List[str]
+    compute_types: List[str]
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.cpu_model}|{self.cpu_budget}|{','.join(self.isa)}"
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "fingerprint": self.fingerprint}
+
+
+def detect_hardware(cpu_budget: int = TUNING_SETTINGS["cpu_budget"]) -> HardwareInfo:
+    logical, allowed, quota = os.cpu_count() or 1, affinity_cpus(), cgroup_cpu_limit()
+    budget = cpu_budget or min(allowed, max(math.floor(quota), 1) if quota else allowed)
+    model, isa = _cpuinfo()
+    return HardwareInfo(logical, allowed, quota, max(budget, 1), model, isa, supported_compute_types())
+
+
+# ---------- Profile ----------
+
+@dataclass
+class TuningProfile:
+    compute_type: str
+    cpu_threads: int  # Thread mỗi job
+    concurrency: int  # Số job chạy song song
+    source: str = "default"  # "default" (ước lượng) hoặc "benchmark"
+    fingerprint: str = ""
+    model_size: Optional[str] = None  # Model đã dùng để đo
+    measured_at: Optional[str] = None
+    results: List[dict] = field(default_factory=list)
+
+    def threads_for(self, concurrency: int, cpu_budget: int) -> int:
+        """Thread mỗi job khi chạy `concurrency` job song song (chia đều ngân sách nếu khác profile)"""
+        if concurrency == self.concurrency:
+            return self.cpu_threads
+        return max(cpu_budget // max(concurrency, 1), 1)
+
+    def resolve_compute_type(self, requested: Optional[str], hardware: HardwareInfo) -> str:
+        """Compute type sẽ dùng: theo yêu cầu nếu CPU hỗ trợ, ngược lại theo profile"""
+        if requested and (not hardware.compute_types or requested in hardware.compute_types):
+            return requested
+        if requested:
+            logger.info(f"⚙️ Compute type {requested} is not supported on this CPU, using {self.compute_type}")
+        return self.compute_type
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+        os.replace(tmp, path)
+        return path
+
+
+def default_profile(hardware: HardwareInfo) -> TuningProfile:
+    """Ước lượng khi chưa đo: int8, mỗi job `default_threads_per_job` thread"""
+    threads = max(min(TUNING_SETTINGS["default_threads_per_job"], hardware.cpu_budget), 1)
+    concurrency = max(hardware.cpu_budget // threads, 1)
+    compute_type = "int8" if not hardware.compute_types or "int8" in hardware.compute_types else "float32"
+    return TuningProfile(compute_type, hardware.cpu_budget // concurrency, concurrency,
+                         fingerprint=hardware.fingerprint)
+
+
+def load_profile(hardware: HardwareInfo, path=None) -> TuningProfile:
+    """Profile đã đo cho phần cứng này, hoặc ước lượng mặc định"""
+    path = Path(path or TUNING_SETTINGS["profile_path"])
+    try:
+        profile = TuningProfile(**json.loads(path.read_text()))
+    except (OSError, ValueError, TypeError):
+        return default_profile(hardware)
+    if profile.fingerprint != hardware.fingerprint:
+        logger.warning(f"⚠️ Ignoring {path}: measured on different hardware ({profile.fingerprint})")
+        return default_profile(hardware)
+    return profile
+
+
+# ---------- Đo ----------
+
+def candidates(hardware: HardwareInfo, compute_types: Optional[List[str]] = None) -> List[Tuple[str, int, int]]:
+    """Các tổ hợp (compute_type, cpu_threads, concurrency) dùng hết ngân sách thread"""
+    types = compute_types or [t for t in BENCHMARK_COMPUTE_TYPES
+                              if not hardware.compute_types or t in hardware.compute_types]
+    combos = []
+    for concurrency in BENCHMARK_CONCURRENCY:
+        if concurrency > hardware.cpu_budget:
+            break
+        for compute_type in types:
+            combos.append((compute_type, hardware.cpu_budget // concurrency, concurrency))
+    return combos
+
+
+def measure(loader: Callable, model_size: str, clip, clip_seconds: float,
+            compute_type: str, cpu_threads: int, concurrency: int) -> dict:
+    """Chạy `concurrency` lượt phiên âm `clip` song song trên một model, trả về throughput"""
+    model = loader(model_size, device="cpu", compute_type=compute_type,
+                   cpu_threads=cpu_threads, num_workers=concurrency)
+    # Lượt khởi động (cấp phát bộ nhớ, nạp kernel) không tính
+    segments, _ = model.transcribe(clip[:len(clip) // 4], beam_size=1)
+    list(segments)
+
+    errors = []
+
+    def run():
+        try:
+            segments, _ = model.transcribe(clip, beam_size=5)
+            list(segments)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return {
+        "compute_type": compute_type,
+        "cpu_threads": cpu_threads,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        # Giây audio xử lý được mỗi giây (toàn máy) và RTF của từng job
+        "throughput": round(concurrency * clip_seconds / elapsed, 3),
+        "job_rtf": round(elapsed / clip_seconds, 4),
+    }
+
+
+def benchmark(hardware: HardwareInfo, model_size: str, clip, clip_seconds: float, loader: Callable,
+              compute_types: Optional[List[str]] = None) -> TuningProfile:
+    results = []
+    for compute_type, cpu_threads, concurrency in candidates(hardware, compute_types):
+        try:
+            result = measure(loader, model_size, clip, clip_seconds, compute_type, cpu_threads, concurrency)
+        except Exception as e:
+            logger.warning(f"⚠️ {compute_type} × {cpu_threads} threads × {concurrency} jobs failed: {e}")
+            continue
+        logger.info(f"⏱️ {compute_type} × {cpu_threads} threads × {concurrency} jobs: "
+                    f"{result['throughput']}s audio/s (job RTF {result['job_rtf']})")
+        results.append(result)
+    if not results:
+        raise RuntimeError("No tuning candidate could be measured")
+    # Throughput cao nhất; gần bằng nhau (trong 5%) thì chọn ít job song song hơn (độ trễ mỗi job thấp hơn),
+    # rồi compute type theo thứ tự ưu tiên
+    top = max(r["throughput"] for r in results)
+    order = {compute_type: i for i, compute_type in enumerate(BENCHMARK_COMPUTE_TYPES)}
+    best = min((r for r in results if r["throughput"] >= top * 0.95),
+               key=lambda r: (r["concurrency"], order.get(r["compute_type"], len(order)), -r["throughput"]))
+    return TuningProfile(
+        best["compute_type"], best["cpu_threads"], best["concurrency"],
+        source="benchmark",
+        fingerprint=hardware.fingerprint,
+        model_size=model_size,
+        measured_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+
+
+def main():
+    from whisper_backends import SAMPLE_RATE, load_audio, load_whisper_model
+
+    parser = argparse.ArgumentParser(description="Detect hardware and tune inference threads")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="In phần cứng phát hiện được và profile đang dùng")
+    run = sub.add_parser("benchmark", help="Đo các tổ hợp trên clip tham chiếu và lưu profile tốt nhất")
+    run.add_argument("--model", default="base")
+    run.add_argument("--clip", default=None, help="Audio tham chiếu (mặc định: 30s nhiễu tổng hợp)")
+    run.add_argument("--seconds", type=float, default=30.0, help="Chỉ dùng ngần này giây đầu của clip")
+    run.add_argument("--compute-types", default=None, help="vd: int8,float32")
+    run.add_argument("--output", default=TUNING_SETTINGS["profile_path"])
+    args = parser.parse_args()
+
+    hardware = detect_hardware()
+    if args.command == "show":
+        print(json.dumps({"hardware": hardware.to_dict(), "profile": load_profile(hardware).to_dict()},
+                         ensure_ascii=False, indent=2))
+        return
+
+    if args.clip:
+        clip = load_audio(args.clip)[:int(args.seconds * SAMPLE_RATE)]
+    else:
+        import numpy as np
+        clip = (np.random.default_rng(0).standard_normal(int(args.seconds * SAMPLE_RATE)) * 0.05).astype(np.float32)
+    profile = benchmark(hardware, args.model, clip, len(clip) / SAMPLE_RATE, load_whisper_model,
+                        args.compute_types.split(",") if args.compute_types else None)
+    profile.save(args.output)
+    print(f"{profile.compute_type}, {profile.cpu_threads} threads × {profile.concurrency} jobs -> {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
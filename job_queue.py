@@ -0,0 +1,454 @@
+# job_queue.py - Hàng đợi job phiên âm có giới hạn (admission control + backpressure)
+"""
+Lập lịch hai tầng:
+
+1. Giữa các lớp ưu tiên: weighted fair queuing theo virtual finish time
+   (vtime của lớp + chi phí job / trọng số lớp).
+2. Trong một lớp: công bằng giữa các submitter theo cùng cơ chế, và với
+   mỗi submitter ưu tiên job ngắn nhất (SJF) có aging để job dài không
+   bị bỏ đói.
+
+Chi phí job ước lượng từ thời lượng audio.
+
+Lớp trong ``IDLE_PRIORITIES`` (vd: lượt tinh chỉnh bản phiên âm nháp) chỉ
+dùng công suất thừa: job của lớp này chỉ được chạy khi không còn job nào
+khác đang chờ, luôn chừa ít nhất một worker cho job mới đến, và không tính
+vào giới hạn độ sâu hàng đợi / số job của client.
+"""
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("whisper-api")
+
+# Trọng số của từng lớp ưu tiên (lớp nặng hơn nhận phần công suất lớn hơn)
+PRIORITY_WEIGHTS = {
+    "urgent": 8.0,
+    "meeting": 4.0,
+    "adhoc": 2.0,
+    "background": 1.0,
+    "refinement": 0.5,
+}
+DEFAULT_PRIORITY = "adhoc"
+# Lớp chỉ chạy khi hàng đợi không còn job nào khác
+IDLE_PRIORITIES = ("refinement",)
+# Sau mỗi AGING_SECONDS chờ, chi phí dùng cho SJF giảm một nửa
+AGING_SECONDS = 600.0
+
+
+def _locked(method):
+    """Giữ khóa của hàng đợi trong suốt lời gọi: endpoint đồng bộ gọi từ
+    threadpool, còn worker chạy trên event loop"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class AdmissionError(Exception):
+    """Job bị từ chối vì hàng đợi đầy hoặc client vượt giới hạn"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """Job đang chạy đã bị hủy (ném ra từ hàm xử lý khi thấy cancel_event)"""
+
+
+@dataclass
+class Job:
+    id: str
+    client_id: str
+    func: Callable[[], None]  # Hàm đồng bộ, chạy trong worker thread
+    audio_duration: float = 0.0
+    priority: str = DEFAULT_PRIORITY
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    # Hàm xử lý kiểm tra cờ này giữa các segment để dừng sớm
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    # Dọn dẹp khi job bị hủy trước khi chạy (vd: xóa file tạm)
+    on_cancel: Optional[Callable[[], None]] = None
+    # Mô tả job dạng JSON cho hàng đợi trong database (worker không gọi được func)
+    payload: Optional[dict] = None
+
+
+class JobQueue:
+    """Hàng đợi có độ sâu tối đa, giới hạn job đồng thời mỗi client,
+    lập lịch công bằng theo lớp ưu tiên và ước lượng thời gian chờ từ
+    real-time factor quan sát được"""
+
+    def __init__(self, max_depth: int = 32, workers: int = 2, per_client_limit: int = 4,
+                 initial_rtf: float = 0.5, rtf_smoothing: float = 0.2):
+        self.max_depth = max_depth
+        self.workers = max(workers, 1)
+        self.per_client_limit = per_client_limit
+        self.rtf = initial_rtf
+        self.rtf_smoothing = rtf_smoothing
+        self.completed = 0
+        self.cancelled = 0
+        # Bật khi tắt server: job đang chạy dừng lại nhưng giữ checkpoint để tiếp tục
+        self.shutting_down = False
+
+        self._pending: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        # Virtual time (dịch vụ đã nhận / trọng số) của lớp và của (lớp, submitter)
+        self._class_vtime: Dict[str, float] = {}
+        self._flow_vtime: Dict[tuple, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.RLock()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcribe")
+
+    # ---------- Ước lượng ----------
+
+    def _estimated_cost(self, job: Job) -> float:
+        return job.audio_duration * self.rtf
+
+    def _remaining(self, job: Job, now: float) -> float:
+        return max(self._estimated_cost(job) - (now - job.started_at), 0.0)
+
+    def _slot_free_times(self, now: float) -> List[float]:
+        """Thời điểm (tương đối) mỗi worker rảnh, tính từ các job đang chạy"""
+        slots = sorted(self._remaining(job, now) for job in self._running.values())
+        return (slots + [0.0] * self.workers)[:self.workers]
+
+    def _simulate(self, pending: List[Job], now: float) -> Dict[str, float]:
+        """Giả lập gán job vào worker (theo thứ tự lập lịch) để ra thời gian chờ"""
+        slots = self._slot_free_times(now)
+        waits = {}
+        for job in self._dispatch_order(pending, now):
+            slot = min(range(len(slots)), key=slots.__getitem__)
+            waits[job.id] = slots[slot]
+            slots[slot] += self._estimated_cost(job)
+        return waits
+
+    @_locked
+    def estimate(self, job_id: str) -> Optional[dict]:
+        """Vị trí (theo thứ tự lập lịch) và thời gian chờ ước lượng của một job đang đợi"""
+        now = time.monotonic()
+        order = self._dispatch_order(self._pending, now)
+        for position, job in enumerate(order, 1):
+            if job.id == job_id:
+                wait = self._simulate(self._pending, now)[job_id]
+                return {"queue_position": position, "estimated_wait_seconds": round(wait, 1)}
+        return None
+
+    # ---------- Lập lịch ----------
+
+    @staticmethod
+    def _weight(priority: str) -> float:
+        return PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+
+    @staticmethod
+    def _sjf_key(job: Job, now: float) -> float:
+        waited = now - job.submitted_at
+        return job.audio_duration / (1.0 + waited / AGING_SECONDS)
+
+    def _pick(self, pending: List[Job], class_vtime: Dict[str, float],
+              flow_vtime: Dict[tuple, float], now: float) -> Job:
+        """Chọn job kế tiếp: lớp -> submitter -> job ngắn nhất"""
+        heads: Dict[tuple, Job] = {}
+        for job in pending:
+            flow = (job.priority, job.client_id)
+            head = heads.get(flow)
+            if head is None or self._sjf_key(job, now) < self._sjf_key(head, now):
+                heads[flow] = job
+
+        def flow_finish(flow):
+            return flow_vtime.get(flow, 0.0) + self._sjf_key(heads[flow], now)
+
+        # Job đại diện của mỗi lớp là head của submitter có virtual finish time nhỏ nhất
+        class_heads: Dict[str, Job] = {}
+        for flow in sorted(heads, key=flow_finish):
+            class_heads.setdefault(flow[0], heads[flow])
+
+        def class_finish(priority):
+            job = class_heads[priority]
+            return class_vtime.get(priority, 0.0) + self._sjf_key(job, now) / self._weight(priority)
+
+        return class_heads[min(class_heads, key=class_finish)]
+
+    @staticmethod
+    def _charge(job: Job, class_vtime: Dict[str, float], flow_vtime: Dict[tuple, float], weight: float):
+        flow = (job.priority, job.client_id)
+        class_vtime[job.priority] = class_vtime.get(job.priority, 0.0) + job.audio_duration / weight
+        flow_vtime[flow] = flow_vtime.get(flow, 0.0) + job.audio_duration
+
+    @staticmethod
+    def _regular(jobs: List[Job]) -> List[Job]:
+        return [j for j in jobs if j.priority not in IDLE_PRIORITIES]
+
+    def _idle_slots(self, running: List[Job]) -> int:
+        """Số job lớp idle còn được chạy thêm (luôn chừa một worker nếu có từ hai worker)"""
+        idle_running = sum(1 for j in running if j.priority in IDLE_PRIORITIES)
+        return max(self.workers - 1, 1) - idle_running
+
+    def _runnable(self, pending: List[Job], running: List[Job]) -> List[Job]:
+        """Job được phép chạy ngay: job thường, hoặc job idle khi không còn job thường nào chờ"""
+        regular = self._regular(pending)
+        if regular or self._idle_slots(running) <= 0:
+            return regular
+        return pending
+
+    def _dispatch_order(self, pending: List[Job], now: float) -> List[Job]:
+        """Thứ tự các job sẽ được chạy nếu không có job mới"""
+        remaining = list(pending)
+        class_vtime = dict(self._class_vtime)
+        flow_vtime = dict(self._flow_vtime)
+        order = []
+        while remaining:
+            job = self._pick(self._regular(remaining) or remaining, class_vtime, flow_vtime, now)
+            self._charge(job, class_vtime, flow_vtime, self._weight(job.priority))
+            remaining.remove(job)
+            order.append(job)
+        return order
+
+    def _activate(self, job: Job):
+        """Lớp/submitter vừa từ trạng thái rảnh trở lại không được "để dành" lượt"""
+        active = list(self._running.values()) + self._pending
+        flow = (job.priority, job.client_id)
+        if not any(j.priority == job.priority for j in active):
+            floor = min((self._class_vtime.get(j.priority, 0.0) for j in active), default=0.0)
+            self._class_vtime[job.priority] = max(self._class_vtime.get(job.priority, 0.0), floor)
+        if not any((j.priority, j.client_id) == flow for j in active):
+            floor = min((self._flow_vtime.get((j.priority, j.client_id), 0.0)
+                         for j in active if j.priority == job.priority), default=0.0)
+            self._flow_vtime[flow] = max(self._flow_vtime.get(flow, 0.0), floor)
+
+    def _retry_after(self, jobs: List[Job]) -> int:
+        """Số giây tới khi job sớm nhất trong danh sách hoàn thành"""
+        now = time.monotonic()
+        waits = self._simulate(self._pending, now)
+        finish = []
+        for job in jobs:
+            if job.started_at is not None:
+                finish.append(self._remaining(job, now))
+            else:
+                finish.append(waits.get(job.id, 0.0) + self._estimated_cost(job))
+        return max(1, math.ceil(min(finish))) if finish else 1
+
+    # ---------- Admission ----------
+
+    @_locked
+    def client_jobs(self, client_id: str) -> List[Job]:
+        return [j for j in self._regular(list(self._running.values()) + self._pending) if j.client_id == client_id]
+
+    @_locked
+    def regular_waiting(self) -> bool:
+        """Có job thường đang chờ (job idle đang chạy nên nhường worker)"""
+        return bool(self._regular(self._pending))
+
+    @_locked
+    def active_audio_paths(self) -> List[str]:
+        """Audio của job đang chờ/chạy (không được dọn khỏi ổ đĩa)"""
+        return [j.payload["audio_path"] for j in list(self._running.values()) + self._pending
+                if j.payload and j.payload.get("audio_path")]
+
+    @_locked
+    def check_admission(self, client_id: str):
+        """Ném AdmissionError nếu job mới của client này sẽ bị từ chối"""
+        if len(self._regular(self._pending)) >= self.max_depth:
+            raise AdmissionError(
+                f"Transcription queue is full ({self.max_depth} jobs waiting)",
+                self._retry_after(list(self._running.values()) or self._pending),
+            )
+        jobs = self.client_jobs(client_id)
+        if len(jobs) >= self.per_client_limit:
+            raise AdmissionError(
+                f"Too many active jobs for this client (limit {self.per_client_limit})",
+                self._retry_after(jobs),
+            )
+
+    @_locked
+    def submit(self, job: Job, force: bool = False) -> dict:
+        """Đưa job vào hàng đợi, trả về vị trí và thời gian chờ ước lượng.
+
+        force=True bỏ qua admission control (dùng khi khôi phục job sau restart).
+        """
+        if not force:
+            self.check_admission(job.client_id)
+        if job.priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{job.priority}'")
+        job.submitted_at = time.monotonic()
+        self._activate(job)
+        self._pending.append(job)
+        self._notify()
+        return self.estimate(job.id) or {"queue_position": 0, "estimated_wait_seconds": 0.0}
+
+    @_locked
+    def remove(self, job_id: str) -> bool:
+        """Bỏ một job chưa chạy khỏi hàng đợi"""
+        for job in self._pending:
+            if job.id == job_id:
+                self._pending.remove(job)
+                return True
+        return False
+
+    @_locked
+    def set_priority(self, job_id: str, priority: str) -> bool:
+        """Đổi lớp ưu tiên của một job chưa chạy"""
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{priority}'")
+        for job in self._pending:
+            if job.id == job_id:
+                self._pending.remove(job)
+                job.priority = priority
+                self._activate(job)
+                self._pending.append(job)
+                return True
+        return False
+
+    @_locked
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Hủy job: bỏ khỏi hàng đợi nếu chưa chạy, hoặc bật cờ hủy nếu đang chạy.
+
+        Trả về "dequeued", "cancelling" hoặc None nếu không tìm thấy job.
+        """
+        for job in self._pending:
+            if job.id == job_id:
+                self._pending.remove(job)
+                job.cancel_event.set()
+                self.cancelled += 1
+                if job.on_cancel:
+                    try:
+                        job.on_cancel()
+                    except Exception as e:
+                        logger.error(f"❌ Cleanup failed for cancelled job {job_id}: {e}")
+                return "dequeued"
+        job = self._running.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+            return "cancelling"
+        return None
+
+    # ---------- Worker ----------
+
+    def _ensure_workers(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        for n in range(len(self._worker_tasks), self.workers):
+            self._worker_tasks.append(asyncio.create_task(self._worker(n)))
+
+    def _notify(self):
+        """Đánh thức worker; submit có thể được gọi từ thread khác event loop"""
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is not None and current is self._loop:
+            self._ensure_workers()
+            self._wakeup.set()
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify)
+        # Chưa start(): job chờ đến khi worker khởi động
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._ensure_workers()
+        logger.info(f"🧵 Job queue started: {self.workers} workers, max depth {self.max_depth}, "
+                    f"{self.per_client_limit} jobs per client")
+
+    async def stop(self):
+        """Dừng worker; job đang chạy được ngắt ở segment kế tiếp"""
+        self.shutting_down = True
+        for job in list(self._running.values()):
+            job.cancel_event.set()
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+
+    @_locked
+    def _next_job(self) -> Optional[Job]:
+        """Lấy job kế tiếp và đánh dấu đang chạy (None nếu chưa có job được phép chạy).
+
+        Kiểm tra và lấy job trong cùng một lần giữ khóa: remove()/cancel() từ
+        threadpool có thể lấy mất job cuối cùng giữa hai lần khóa riêng.
+        """
+        runnable = self._runnable(self._pending, list(self._running.values()))
+        if not runnable:
+            return None
+        job = self._pick(runnable, self._class_vtime, self._flow_vtime, time.monotonic())
+        self._charge(job, self._class_vtime, self._flow_vtime, self._weight(job.priority))
+        self._pending.remove(job)
+        job.started_at = time.monotonic()
+        self._running[job.id] = job
+        return job
+
+    @_locked
+    def _finish(self, job: Job):
+        """Ghi nhận job đã chạy xong (hoặc bị hủy giữa chừng)"""
+        elapsed = time.monotonic() - job.started_at
+        self._running.pop(job.id, None)
+        if job.cancel_event.is_set():
+            # Thời gian của job bị hủy giữa chừng không phản ánh RTF
+            self.cancelled += 1
+        else:
+            self.completed += 1
+            if job.priority not in IDLE_PRIORITIES:
+                # Job idle có thể nhường worker giữa chừng
+                self._observe(job, elapsed)
+
+    async def _worker(self, n: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                await loop.run_in_executor(self._executor, job.func)
+            except Exception as e:
+                logger.exception(f"❌ Job {job.id} crashed in worker {n}: {e}")
+            finally:
+                self._finish(job)
+                if self._pending:
+                    # Job idle đang chờ có thể vừa được phép chạy
+                    self._wakeup.set()
+
+    def _observe(self, job: Job, elapsed: float):
+        """Cập nhật RTF (trung bình trượt) sau mỗi job"""
+        if job.audio_duration > 0:
+            observed = elapsed / job.audio_duration
+            self.rtf = (1 - self.rtf_smoothing) * self.rtf + self.rtf_smoothing * observed
+
+    @_locked
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "running": len(self._running),
+            "max_depth": self.max_depth,
+            "workers": self.workers,
+            "per_client_limit": self.per_client_limit,
+            "observed_rtf": round(self.rtf, 4),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "queued_by_priority": {
+                priority: sum(1 for j in self._pending if j.priority == priority)
+                for priority in PRIORITY_WEIGHTS
+            },
+            # Audio chờ của job thường (job idle không làm chậm ai)
+            "queued_audio_seconds": round(sum(j.audio_duration for j in self._regular(self._pending)), 1),
+            "backlog_seconds": round(self.drain_seconds(), 1),
+        }
+
+    @_locked
+    def drain_seconds(self) -> float:
+        """Thời gian ước lượng để xử lý hết hàng đợi hiện tại"""
+        now = time.monotonic()
+        waits = self._simulate(self._pending, now)
+        finish = [waits[j.id] + self._estimated_cost(j) for j in self._pending]
+        finish += self._slot_free_times(now)
+        return max(finish, default=0.0)
@@ -0,0 +1,206 @@
+# language_id.py - Nhận diện ngôn ngữ trên mẫu tiếng nói ngắn, nhớ theo cuộc họp / chuỗi họp / người tổ chức
+"""
+Khi không có ``language``, Whisper nhận diện ngôn ngữ trên 30 giây đầu của
+file, thường là khoảng lặng, nhạc chờ hay lời chào. Pipeline cuộc họp thì
+luôn giả định ``vi``, kể cả khi cuộc họp nói tiếng Anh.
+
+``LanguageIdentifier.identify`` trả về ngôn ngữ để truyền thẳng cho bước
+decode (không nhận diện lại trên cả file):
+
+1. Gợi ý đã lưu cho ngữ cảnh của job, theo thứ tự ưu tiên:
+   ``meeting:<id>`` (audio khác của cùng cuộc họp),
+   ``series:<người tổ chức>|<tiêu đề>|<lịch lặp>`` (cuộc họp định kỳ) và
+   ``organizer:<tên>``. Gợi ý cũ hơn ``max_age_days`` bị bỏ qua.
+2. Nếu chưa có: nhận diện trên tối đa ``sample_seconds`` giây tiếng nói
+   (ghép các đoạn VAD: lấy từ file ``.peaks`` nếu đã tính, ngược lại chạy
+   VAD trên ``scan_seconds`` giây đầu).
+3. Độ tin cậy dưới ``min_probability``: trả về None, Whisper tự nhận diện
+   như trước.
+
+Sau khi phiên âm, ``remember`` lưu kết quả cho mọi ngữ cảnh của job. Nếu
+bản phiên âm theo gợi ý từ cache có ``avg_logprob`` trung bình quá thấp
+(gợi ý sai, vd: chuỗi họp đổi ngôn ngữ), gợi ý bị xóa để lần sau nhận
+diện lại.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from models import LanguageHint
+from people import normalize_name
+from waveform import Waveform, pcm_prefix, speech_spans, waveform_path
+from whisper_backends import SAMPLE_RATE
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+LANGUAGE_SETTINGS = {
+    "sample_seconds": _env_float("LANGUAGE_SAMPLE_SECONDS", 20),  # Giây tiếng nói dùng để nhận diện
+    "scan_seconds": _env_float("LANGUAGE_SCAN_SECONDS", 300),  # Chỉ tìm tiếng nói trong phần đầu này
+    "min_probability": _env_float("LANGUAGE_MIN_PROBABILITY", 0.7),
+    "max_age_days": _env_float("LANGUAGE_HINT_MAX_AGE_DAYS", 90),
+    # avg_logprob trung bình (theo thời lượng) dưới ngưỡng này: gợi ý từ cache bị coi là sai
+    "logprob_threshold": _env_float("LANGUAGE_LOGPROB_THRESHOLD", -1.0),
+}
+# Mẫu ngắn hơn ngần này (giây) không đủ để nhận diện
+MIN_SAMPLE_SECONDS = 1.0
+
+
+@dataclass
+class LanguageGuess:
+    language: str
+    probability: float
+    source: str  # "sample" hoặc loại ngữ cảnh của gợi ý đã lưu (meeting/series/organizer)
+
+    def to_dict(self) -> dict:
+        return {"language": self.language, "probability": round(self.probability, 4), "source": self.source}
+
+
+def meeting_contexts(meeting) -> List[str]:
+    """Ngữ cảnh của audio cuộc họp, cụ thể nhất trước"""
+    contexts = [f"meeting:{meeting.id}"]
+    organizer = normalize_name(meeting.organizer)
+    if meeting.recurrence_rule:
+        contexts.append(f"series:{organizer}|{normalize_name(meeting.title)}|{meeting.recurrence_rule}")
+    if organizer:
+        contexts.append(f"organizer:{organizer}")
+    return contexts
+
+
+def speech_sample(audio_path, sample_seconds: float, scan_seconds: float) -> np.ndarray:
+    """Tối đa `sample_seconds` giây tiếng nói ghép lại từ `scan_seconds` giây đầu của audio"""
+    pcm = pcm_prefix(audio_path, scan_seconds)
+    peaks = waveform_path(audio_path)
+    speech = Waveform.from_file(peaks).speech if peaks.exists() else None
+    if speech is None:
+        speech = speech_spans(pcm)
+    pieces, remaining = [], sample_seconds
+    for start, end in speech:
+        if remaining <= 0 or start * SAMPLE_RATE >= len(pcm):
+            break
+        end = min(end, start + remaining)
+        pieces.append(pcm[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+        remaining -= end - start
+    if not pieces:
+        # Không thấy tiếng nói: để model tự xử lý phần đầu
+        return pcm[:int(sample_seconds * SAMPLE_RATE)]
+    return np.concatenate(pieces)
+
+
+def mean_logprob(segments: Iterable[dict]) -> Optional[float]:
+    """avg_logprob trung bình theo thời lượng segment (None nếu không có)"""
+    total, weight = 0.0, 0.0
+    for segment in segments:
+        if "avg_logprob" not in segment:
+            continue
+        duration = max(segment["end"] - segment["start"], 0.01)
+        total += segment["avg_logprob"] * duration
+        weight += duration
+    return total / weight if weight else None
+
+
+class LanguageIdentifier:
+    def __init__(self, session_factory, **settings):
+        self.session_factory = session_factory
+        self.settings = {**LANGUAGE_SETTINGS, **settings}
+        self.counts = {"cached": 0, "sampled": 0, "low_confidence": 0, "forgotten": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    # ---------- Cache ----------
+
+    def cached(self, contexts: List[str]) -> Optional[LanguageGuess]:
+        """Gợi ý đủ tin cậy của ngữ cảnh cụ thể nhất"""
+        if not contexts:
+            return None
+        cutoff = datetime.now() - timedelta(days=self.settings["max_age_days"])
+        with self.session_factory() as db:
+            hints = {hint.context: hint for hint in db.query(LanguageHint).filter(
+                LanguageHint.context.in_(contexts),
+                LanguageHint.updated_at >= cutoff,
+                LanguageHint.probability >= self.settings["min_probability"],
+            )}
+        for context in contexts:
+            hint = hints.get(context)
+            if hint is not None:
+                return LanguageGuess(hint.language, hint.probability, context.split(":", 1)[0])
+        return None
+
+    def remember(self, contexts: List[str], language: Optional[str], probability: Optional[float]):
+        if not contexts or not language or (probability or 0.0) < self.settings["min_probability"]:
+            return
+        now = datetime.now()
+        with self.session_factory() as db:
+            for context in contexts:
+                db.merge(LanguageHint(context=context, language=language, probability=probability, updated_at=now))
+            db.commit()
+
+    def forget(self, contexts: List[str]):
+        if not contexts:
+            return
+        with self.session_factory() as db:
+            db.query(LanguageHint).filter(LanguageHint.context.in_(contexts)).delete(synchronize_session=False)
+            db.commit()
+        self._count("forgotten")
+
+    # ---------- Nhận diện ----------
+
+    def detect(self, model, audio_path) -> Optional[LanguageGuess]:
+        """Nhận diện trên mẫu tiếng nói (chỉ chạy encoder trên mẫu, không decode)"""
+        sample = speech_sample(audio_path, self.settings["sample_seconds"], self.settings["scan_seconds"])
+        if len(sample) < MIN_SAMPLE_SECONDS * SAMPLE_RATE:
+            return None
+        # Segment là generator lười: chỉ bước nhận diện ngôn ngữ được chạy
+        _, info = model.transcribe(sample, language=None, beam_size=1, vad_filter=False,
+                                   condition_on_previous_text=False)
+        return LanguageGuess(info.language, float(info.language_probability), "sample")
+
+    def identify(self, model, audio_path, contexts: Optional[List[str]] = None) -> Optional[LanguageGuess]:
+        """Ngôn ngữ để decode `audio_path`, hoặc None để Whisper tự nhận diện trên cả file"""
+        guess = self.cached(contexts or [])
+        if guess is not None:
+            self._count("cached")
+            return guess
+        guess = self.detect(model, audio_path)
+        if guess is None or guess.probability < self.settings["min_probability"]:
+            self._count("low_confidence")
+            if guess is not None:
+                logger.info(f"🌐 Low language confidence for {Path(audio_path).name} "
+                            f"({guess.language} {guess.probability:.2f}), falling back to full detection")
+            return None
+        self._count("sampled")
+        return guess
+
+    def settle(self, contexts: List[str], guess: Optional[LanguageGuess], language: Optional[str],
+               probability: Optional[float], segments: List[dict]):
+        """Cập nhật cache sau khi phiên âm xong (`language`/`probability`: kết quả của Whisper)"""
+        if guess is not None and guess.source != "sample":
+            score = mean_logprob(segments)
+            if score is not None and score < self.settings["logprob_threshold"]:
+                logger.info(f"🌐 Cached language {guess.language} ({guess.source}) decoded poorly "
+                            f"(avg_logprob {score:.2f}), will re-detect next time")
+                self.forget(contexts)
+                return
+        if guess is not None:
+            language, probability = guess.language, guess.probability
+        self.remember(contexts, language, probability)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
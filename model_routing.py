@@ -0,0 +1,264 @@
+# model_routing.py - Chọn model/compute type/beam size cho từng job theo SLA và tải hàng đợi
+"""
+Job có ``model_size="auto"`` (mặc định) được định tuyến lúc bắt đầu chạy:
+``ModelRouter.route`` chọn tier lớn nhất (chính xác nhất) mà
+
+- job này vẫn xong trong SLA của lớp ưu tiên: đã chờ + thời lượng × RTF
+- phần audio đang chờ trong hàng đợi, nếu cũng chạy ở tier này, được xử lý
+  hết trong SLA (lúc cao điểm các job tự chuyển xuống model nhỏ hơn để
+  hàng đợi không dài ra mãi, và quay lại model lớn khi hàng đợi vơi)
+
+RTF của từng model là trung bình trượt của các job đã chạy; trước khi đo
+được thì suy ra từ model đã đo (hoặc từ ``initial_rtf`` của large-v3) theo
+tốc độ tương đối trong ``RELATIVE_COST``.
+
+Sau khi phiên âm bằng model nhỏ, chỉ các segment có ``avg_logprob`` thấp
+hoặc ``compression_ratio`` cao (cùng ngưỡng fallback của Whisper) được
+phiên âm lại bằng tier lớn nhất, trong phần thời gian còn lại của SLA.
+
+Tier cấu hình bằng ``ROUTING_TIERS`` (từ lớn đến nhỏ), vd:
+``large-v3:int8:5,small:int8:3,base:int8:1``.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+AUTO_MODEL = "auto"
+DEFAULT_COMPUTE_TYPE = "int8"
+DEFAULT_BEAM_SIZE = 5
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _parse_sla(value: str) -> Dict[str, float]:
+    """``urgent=120,meeting=1800`` -> {"urgent": 120.0, "meeting": 1800.0}"""
+    sla = {}
+    for item in value.split(","):
+        priority, _, seconds = item.partition("=")
+        try:
+            sla[priority.strip()] = float(seconds)
+        except ValueError:
+            continue
+    return sla
+
+
+ROUTING_SETTINGS = {
+    "tiers": os.environ.get("ROUTING_TIERS", "large-v3:int8:5,medium:int8:5,small:int8:3,base:int8:1"),
+    # Thời gian hoàn thành mục tiêu (chờ + xử lý, giây) theo lớp ưu tiên
+    "sla": {
+        "urgent": 120.0,
+        "adhoc": 300.0,
+        "meeting": 1800.0,
+        "background": 3600.0,
+        **_parse_sla(os.environ.get("ROUTING_SLA", "")),
+    },
+    "escalate": os.environ.get("ROUTING_ESCALATE", "1").lower() not in ("0", "false", "no"),
+    "logprob_threshold": _env_float("ROUTING_LOGPROB_THRESHOLD", -1.0),
+    "compression_ratio_threshold": _env_float("ROUTING_COMPRESSION_RATIO_THRESHOLD", 2.4),
+    # Không phiên âm lại quá tỉ lệ này của audio (còn lại là lỗi của chính bản ghi)
+    "max_escalated_ratio": _env_float("ROUTING_MAX_ESCALATED_RATIO", 0.3),
+    "rtf_smoothing": 0.2,
+}
+
+# Thời gian xử lý tương đối so với large-v3 (CPU int8, beam 5)
+RELATIVE_COST = {
+    "tiny": 0.06,
+    "base": 0.1,
+    "small": 0.25,
+    "medium": 0.5,
+    "large-v3-turbo": 0.3,
+    "turbo": 0.3,
+    "distil-large-v3": 0.3,
+    "large-v1": 1.0,
+    "large-v2": 1.0,
+    "large-v3": 1.0,
+}
+# Beam nhỏ hơn thì decode nhanh hơn (ước lượng thô, chỉ dùng trước khi đo được)
+BEAM_COST = {1: 0.6, 2: 0.7, 3: 0.8, 4: 0.9, 5: 1.0}
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    model_size: str
+    compute_type: str = DEFAULT_COMPUTE_TYPE
+    beam_size: int = DEFAULT_BEAM_SIZE
+
+    @property
+    def key(self) -> str:
+        return f"{self.model_size}:{self.compute_type}:{self.beam_size}"
+
+    @property
+    def relative_cost(self) -> float:
+        return RELATIVE_COST.get(self.model_size, 1.0) * BEAM_COST.get(self.beam_size, 1.0)
+
+
+def parse_tiers(value: str) -> List[ModelTier]:
+    """``large-v3:int8:5,base`` -> [ModelTier("large-v3", "int8", 5), ModelTier("base", "int8", 5)]"""
+    tiers = []
+    for item in value.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if not parts[0]:
+            continue
+        tiers.append(ModelTier(
+            parts[0],
+            parts[1] if len(parts) > 1 and parts[1] else DEFAULT_COMPUTE_TYPE,
+            int(parts[2]) if len(parts) > 2 and parts[2] else DEFAULT_BEAM_SIZE,
+        ))
+    if not tiers:
+        raise ValueError("At least one model tier is required")
+    return tiers
+
+
+@dataclass
+class RouteDecision:
+    tier: ModelTier
+    reason: str
+    sla_seconds: float
+    waited_seconds: float
+    predicted_seconds: float
+
+    def to_dict(self) -> dict:
+        return {
+            "model_size": self.tier.model_size,
+            "compute_type": self.tier.compute_type,
+            "beam_size": self.tier.beam_size,
+            "reason": self.reason,
+            "sla_seconds": self.sla_seconds,
+            "waited_seconds": round(self.waited_seconds, 1),
+            "predicted_seconds": round(self.predicted_seconds, 1),
+        }
+
+
+class ModelRouter:
+    def __init__(self, initial_rtf: float = 0.5, **settings):
+        self.settings = {**ROUTING_SETTINGS, **settings}
+        self.tiers = parse_tiers(self.settings["tiers"])
+        self.initial_rtf = initial_rtf  # RTF ước lượng của large-v3 trước khi đo được
+        self._rtf: Dict[str, float] = {}  # tier.key -> RTF quan sát
+        self._routed: Dict[str, int] = {}
+        self.escalated_segments = 0
+        self.escalated_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def best(self) -> ModelTier:
+        return self.tiers[0]
+
+    def sla(self, priority: Optional[str]) -> float:
+        return self.settings["sla"].get(priority or "adhoc", self.settings["sla"].get("adhoc", 300.0))
+
+    # ---------- RTF ----------
+
+    def rtf(self, tier: ModelTier) -> float:
+        with self._lock:
+            if tier.key in self._rtf:
+                return self._rtf[tier.key]
+            # Quy đổi từ tier đã đo gần nhất về chi phí tương đối
+            for key, observed in self._rtf.items():
+                measured = next((t for t in self.tiers if t.key == key), None)
+                if measured is not None:
+                    return observed * tier.relative_cost / measured.relative_cost
+        return self.initial_rtf * tier.relative_cost
+
+    def observe(self, tier: ModelTier, audio_seconds: float, elapsed: float):
+        """Cập nhật RTF của `tier` sau khi một job (hoặc một lượt phiên âm lại) chạy xong"""
+        if audio_seconds <= 0 or elapsed <= 0:
+            return
+        observed = elapsed / audio_seconds
+        smoothing = self.settings["rtf_smoothing"]
+        with self._lock:
+            previous = self._rtf.get(tier.key)
+            self._rtf[tier.key] = observed if previous is None else (1 - smoothing) * previous + smoothing * observed
+
+    # ---------- Định tuyến ----------
+
+    def route(self, audio_seconds: float, waited: float = 0.0, queued_audio_seconds: float = 0.0,
+              workers: int = 1, priority: Optional[str] = None) -> RouteDecision:
+        """Tier lớn nhất mà cả job này và phần audio đang chờ vẫn xong trong SLA"""
+        sla = self.sla(priority)
+        budget = sla - waited
+        workers = max(workers, 1)
+        for tier in self.tiers:
+            rtf = self.rtf(tier)
+            own = audio_seconds * rtf
+            backlog = queued_audio_seconds * rtf / workers
+            if own <= budget and backlog + own <= sla:
+                reason = "best" if tier == self.best else "load"
+                return self._decide(tier, reason, sla, waited, own)
+        # Không tier nào kịp: chạy nhanh nhất có thể
+        tier = self.tiers[-1]
+        return self._decide(tier, "over_sla", sla, waited, audio_seconds * self.rtf(tier))
+
+    def _decide(self, tier: ModelTier, reason: str, sla: float, waited: float, predicted: float) -> RouteDecision:
+        with self._lock:
+            self._routed[tier.key] = self._routed.get(tier.key, 0) + 1
+        return RouteDecision(tier, reason, sla, waited, predicted)
+
+    def escalation_budget(self, decision: RouteDecision, elapsed: float) -> float:
+        """Giây xử lý còn được dùng để phiên âm lại bằng tier lớn nhất"""
+        if not self.settings["escalate"] or decision.tier == self.best or decision.reason == "over_sla":
+            return 0.0
+        return max(decision.sla_seconds - decision.waited_seconds - elapsed, 0.0)
+
+    def is_low_confidence(self, segment: dict) -> bool:
+        return (segment.get("avg_logprob", 0.0) < self.settings["logprob_threshold"]
+                or segment.get("compression_ratio", 0.0) > self.settings["compression_ratio_threshold"])
+
+    def escalation_spans(self, segments: List[dict], audio_seconds: float, budget: float) -> List[dict]:
+        """Các đoạn segment liên tiếp có độ tin cậy thấp cần phiên âm lại, tệ nhất trước, vừa với `budget`.
+
+        Mỗi đoạn: ``{"first", "last", "start", "end", "score"}`` (chỉ số segment và mốc thời gian).
+        """
+        groups, current = [], None
+        for index, segment in enumerate(segments):
+            if self.is_low_confidence(segment):
+                if current is not None and current["last"] == index - 1:
+                    current["last"] = index
+                else:
+                    current = {"first": index, "last": index}
+                    groups.append(current)
+        spans = []
+        for group in groups:
+            first, last = segments[group["first"]], segments[group["last"]]
+            # Mở rộng tới sát segment bên cạnh (ranh giới segment của Whisper không chính xác)
+            start = segments[group["first"] - 1]["end"] if group["first"] > 0 else 0.0
+            end = segments[group["last"] + 1]["start"] if group["last"] + 1 < len(segments) else audio_seconds or last["end"]
+            start, end = max(start, first["start"] - 0.5), min(end, last["end"] + 0.5)
+            window = segments[group["first"]:group["last"] + 1]
+            score = sum(s.get("avg_logprob", 0.0) * (s["end"] - s["start"]) for s in window)
+            spans.append({**group, "start": start, "end": end, "score": score})
+
+        rtf = self.rtf(self.best)
+        limit = audio_seconds * self.settings["max_escalated_ratio"]
+        chosen, total = [], 0.0
+        for span in sorted(spans, key=lambda s: s["score"]):
+            length = span["end"] - span["start"]
+            if total + length > limit or (total + length) * rtf > budget:
+                continue
+            chosen.append(span)
+            total += length
+        return sorted(chosen, key=lambda s: s["first"])
+
+    def record_escalation(self, segments: int, seconds: float):
+        with self._lock:
+            self.escalated_segments += segments
+            self.escalated_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            observed = {key: round(rtf, 4) for key, rtf in self._rtf.items()}
+            routed = dict(self._routed)
+        return {
+            "tiers": [tier.key for tier in self.tiers],
+            "sla_seconds": self.settings["sla"],
+            "routed": routed,
+            "observed_rtf": observed,
+            "escalated_segments": self.escalated_segments,
+            "escalated_seconds": round(self.escalated_seconds, 1),
+        }
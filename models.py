@@ -1,5 +1,5 @@
 # models.py - Định nghĩa models
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -37,6 +37,9 @@ class Meeting(Base):
     # Quan hệ đơn giản với Transcription
     transcription = relationship("Transcription", foreign_keys=[transcription_id], uselist=False)
     
+    # Lịch theo khoảng thời gian (calendar, lịch của một người)
+    __table_args__ = (Index("ix_meetings_start_end", "start_time", "end_time"),)
+    
     def get_tags_list(self):
         """Chuyển đổi tags từ string sang list"""
         if self.tags:
@@ -46,6 +49,10 @@ class Meeting(Base):
                 return []
         return []
 
+    def set_tags_list(self, tags):
+        """Chuyển đổi tags từ list sang string"""
+        self.tags = json.dumps(tags or [], ensure_ascii=False)
+
 
 class Participant(Base):
     __tablename__ = "participants"
@@ -57,9 +64,29 @@ class Participant(Base):
     role = Column(String(100), nullable=True)
     department = Column(String(100), nullable=True)
     is_required = Column(Boolean, default=True)
+    # Người trong danh bạ (people.py); NULL với dữ liệu cũ chưa được liên kết
+    person_id = Column(String(50), ForeignKey("people.id"), nullable=True)
     created_at = Column(DateTime, default=func.now())
 
     meeting = relationship("Meeting", back_populates="participants")
+    person = relationship("Person", back_populates="participations")
+
+    # "Các cuộc họp của X": quét index, không cần đọc bảng participants
+    __table_args__ = (Index("ix_participants_person_meeting", "person_id", "meeting_id"),)
+
+
+class Person(Base):
+    """Một người trong danh bạ, nhận diện bằng email (hoặc tên nếu không có email)"""
+    __tablename__ = "people"
+
+    id = Column(String(50), primary_key=True)
+    name = Column(String(200), nullable=False)
+    email = Column(String(255), nullable=True, unique=True)  # Chữ thường
+    name_key = Column(String(200), nullable=False, index=True)  # Tên đã chuẩn hóa để tra cứu
+    department = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    participations = relationship("Participant", back_populates="person")
 
 
 class Transcription(Base):
@@ -71,8 +98,79 @@ class Transcription(Base):
     file_name = Column(String(255), nullable=True)
     language = Column(String(20), nullable=True)
     duration = Column(Float, nullable=True)
+    # Phiên bản thứ mấy của cuộc họp (xem transcript_versions.py)
+    version = Column(Integer, nullable=True)
+    status = Column(String(20), nullable=True)  # queued | processing | completed | failed | cancelled
+    model = Column(String(100), nullable=True)  # tier model_size:compute_type:beam_size
+    options = Column(Text, nullable=True)  # JSON của TranscriptionOptions khi phiên âm lại
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     # Quan hệ ngược
-    meeting = relationship("Meeting", foreign_keys=[meeting_id])
\ No newline at end of file
+    meeting = relationship("Meeting", foreign_keys=[meeting_id])
+
+    __table_args__ = (Index("ux_transcriptions_meeting_version", "meeting_id", "version", unique=True),)
+
+class TranscriptionJob(Base):
+    """Job phiên âm trong hàng đợi dùng chung giữa API và worker (python -m whisper_worker)"""
+    __tablename__ = "transcription_jobs"
+
+    id = Column(String(50), primary_key=True, index=True)
+    kind = Column(String(20), nullable=False, default="transcription")  # transcription | meeting | refine | retranscribe
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    priority = Column(String(20), nullable=False, default="adhoc")
+    client_id = Column(String(255), nullable=True, index=True)
+    meeting_id = Column(String(50), nullable=True, index=True)
+
+    audio_path = Column(String(500), nullable=False)
+    file_name = Column(String(255), nullable=True)
+    audio_duration = Column(Float, default=0.0)
+    temp_file = Column(Boolean, default=False)  # Xóa audio khi job kết thúc
+    options = Column(Text, nullable=True)  # JSON của TranscriptionOptions
+
+    # Lease: worker đang giữ job phải gia hạn trước lease_expires_at
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    cancel_requested = Column(Boolean, default=False)
+
+    result = Column(Text, nullable=True)  # JSON kết quả
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True, index=True)  # Cửa sổ virtual time của lập lịch công bằng
+    finished_at = Column(DateTime, nullable=True)
+
+class StoredFile(Base):
+    """Chỉ mục file trong kho lưu trữ (storage.StorageManager): đếm/tính dung lượng không cần quét thư mục"""
+    __tablename__ = "stored_files"
+
+    path = Column(String(500), primary_key=True)
+    kind = Column(String(20), nullable=False, index=True)  # meeting_audio | transcription | upload
+    owner_id = Column(String(100), nullable=True, index=True)  # meeting_id / transcription_id / task_id
+    size = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now(), index=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+
+
+class LanguageHint(Base):
+    """Ngôn ngữ đã nhận diện theo ngữ cảnh (cuộc họp, chuỗi họp định kỳ, người tổ chức), xem language_id.py"""
+    __tablename__ = "language_hints"
+
+    context = Column(String(400), primary_key=True)  # meeting:<id> | series:<...> | organizer:<tên>
+    language = Column(String(20), nullable=False)
+    probability = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=func.now())
+
+
+class SpeechTimestamps(Base):
+    """Đoạn có tiếng nói (VAD) của một nội dung audio với một bộ tham số VAD, xem speech_map.py"""
+    __tablename__ = "speech_maps"
+
+    audio_hash = Column(String(64), primary_key=True)  # sha256 nội dung file audio
+    params_key = Column(String(16), primary_key=True)  # hash của tham số VAD đầy đủ
+    params = Column(Text, nullable=False)  # JSON tham số VAD
+    duration = Column(Float, nullable=False)
+    speech_seconds = Column(Float, nullable=False)
+    spans = Column(LargeBinary, nullable=False)  # zlib(uint32 delta, đơn vị 10 ms)
+    created_at = Column(DateTime, default=func.now())
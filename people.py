@@ -0,0 +1,218 @@
+# people.py - Danh bạ người tham dự dùng chung giữa các cuộc họp
+"""
+``Participant`` là bản ghi theo từng cuộc họp (tên/email nhập tự do).
+Bảng ``people`` gom các bản ghi đó về một người, nhận diện bằng email (chữ
+thường) hoặc tên đã chuẩn hóa nếu không có email, để trả lời "X đã họp
+những cuộc nào" bằng index ``(person_id, meeting_id)`` thay vì quét bảng.
+
+``sync_participants`` đưa danh sách người tham dự của một hoặc nhiều cuộc
+họp về danh sách mới bằng diff: dòng không đổi được giữ nguyên, dòng đổi
+role/department... được UPDATE, chỉ người mới được INSERT và người bị bỏ
+được DELETE (thay vì xóa và chèn lại toàn bộ mỗi lần sửa).
+
+Participant tạo trước khi có danh bạ được liên kết khi khởi động, hoặc:
+
+    python -m people link
+"""
+import argparse
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import Participant, Person
+
+logger = logging.getLogger("whisper-api")
+
+PARTICIPANT_FIELDS = ("name", "email", "role", "department", "is_required")
+# Giữ số tham số của mỗi câu IN (...) dưới giới hạn của SQLite
+LOOKUP_BATCH = 500
+LINK_BATCH = 1000
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    email = (email or "").strip().lower()
+    return email or None
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join((name or "").split()).casefold()
+
+
+def person_key(name: Optional[str], email: Optional[str]) -> str:
+    email = normalize_email(email)
+    return f"email:{email}" if email else f"name:{normalize_name(name)}"
+
+
+def _batches(items: list, size: int = LOOKUP_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _lookup(db, keys: Iterable[str]) -> Dict[str, str]:
+    emails = [k[len("email:"):] for k in keys if k.startswith("email:")]
+    names = [k[len("name:"):] for k in keys if k.startswith("name:")]
+    ids = {}
+    for batch in _batches(emails):
+        for email, person_id in db.query(Person.email, Person.id).filter(Person.email.in_(batch)):
+            ids[f"email:{email}"] = person_id
+    for batch in _batches(names):
+        rows = db.query(Person.name_key, Person.id).filter(
+            Person.email.is_(None), Person.name_key.in_(batch)
+        ).order_by(Person.created_at)
+        for name, person_id in rows:
+            ids.setdefault(f"name:{name}", person_id)
+    return ids
+
+
+def resolve_people(db, people: Iterable[Tuple[str, Optional[str], Optional[str]]],
+                   now: Optional[datetime] = None) -> Dict[str, str]:
+    """person_id theo person_key cho các (name, email, department), tạo người chưa có trong danh bạ"""
+    wanted = {}
+    for name, email, department in people:
+        wanted.setdefault(person_key(name, email), (" ".join(name.split()), normalize_email(email), department))
+    if not wanted:
+        return {}
+    ids = _lookup(db, wanted)
+    for attempt in range(2):
+        rows = [{
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "email": email,
+            "name_key": normalize_name(name),
+            "department": department,
+            "created_at": now or datetime.now(),
+        } for key, (name, email, department) in wanted.items() if key not in ids]
+        if not rows:
+            break
+        try:
+            with db.begin_nested():
+                db.bulk_insert_mappings(Person, rows, render_nulls=True)
+        except IntegrityError:
+            if attempt:
+                raise
+            # Request khác vừa tạo người cùng email: đọc lại rồi chỉ tạo phần còn thiếu
+            ids = _lookup(db, wanted)
+            continue
+        ids.update((person_key(row["name"], row["email"]), row["id"]) for row in rows)
+        break
+    return ids
+
+
+def _keyed(rows, name_of, email_of) -> list:
+    """(key, row) với key = person_key + thứ tự xuất hiện (hai người cùng tên không email vẫn là hai dòng)"""
+    counts, keyed = defaultdict(int), []
+    for row in rows:
+        key = person_key(name_of(row), email_of(row))
+        counts[key] += 1
+        keyed.append((f"{key}#{counts[key]}", key, row))
+    return keyed
+
+
+def sync_participants(db, incoming: Dict[str, list], now: Optional[datetime] = None,
+                      existing: bool = True) -> Dict[str, int]:
+    """Đưa participants của từng meeting về `incoming` (meeting_id -> [ParticipantCreate]) chỉ bằng các thay đổi cần thiết.
+
+    `existing=False` khi các meeting vừa được tạo (bỏ qua truy vấn participants hiện có).
+    """
+    now = now or datetime.now()
+    person_ids = resolve_people(
+        db, [(p.name, p.email, p.department) for participants in incoming.values() for p in participants], now
+    )
+
+    current = defaultdict(dict)
+    if existing:
+        for batch in _batches(list(incoming)):
+            rows = db.query(
+                Participant.id, Participant.meeting_id, Participant.person_id,
+                *[getattr(Participant, f) for f in PARTICIPANT_FIELDS]
+            ).filter(Participant.meeting_id.in_(batch)).order_by(Participant.created_at, Participant.id)
+            by_meeting = defaultdict(list)
+            for row in rows:
+                by_meeting[row.meeting_id].append(row)
+            for meeting_id, meeting_rows in by_meeting.items():
+                current[meeting_id] = {slot: row for slot, _, row in
+                                       _keyed(meeting_rows, lambda r: r.name, lambda r: r.email)}
+
+    inserts, updates, deletes = [], [], []
+    for meeting_id, participants in incoming.items():
+        old = current.pop(meeting_id, {})
+        for slot, key, participant in _keyed(participants, lambda p: p.name, lambda p: p.email):
+            values = {f: getattr(participant, f) for f in PARTICIPANT_FIELDS}
+            values["person_id"] = person_ids[key]
+            row = old.pop(slot, None)
+            if row is None:
+                inserts.append({"id": str(uuid.uuid4()), "meeting_id": meeting_id, **values, "created_at": now})
+            else:
+                changed = {f: v for f, v in values.items() if getattr(row, f) != v}
+                if changed:
+                    updates.append({"id": row.id, **changed})
+        deletes.extend(row.id for row in old.values())
+
+    for batch in _batches(deletes):
+        db.query(Participant).filter(Participant.id.in_(batch)).delete(synchronize_session=False)
+    if updates:
+        db.bulk_update_mappings(Participant, updates)
+    # render_nulls: dòng có/không có email vẫn cùng một câu lệnh (executemany)
+    db.bulk_insert_mappings(Participant, inserts, render_nulls=True)
+    return {"added": len(inserts), "updated": len(updates), "removed": len(deletes)}
+
+
+def person_meeting_ids(person_id: str):
+    """Subquery meeting_id mà `person_id` tham dự (chỉ đọc index ix_participants_person_meeting)"""
+    return select(Participant.meeting_id).where(Participant.person_id == person_id)
+
+
+def search_people(db, query: str, limit: int = 20) -> List[Person]:
+    """Người có email hoặc tên bắt đầu bằng `query` (so khớp theo khoảng trên index)"""
+    people = {}
+    email, name = normalize_email(query), normalize_name(query)
+    if email:
+        for person in db.query(Person).filter(Person.email >= email, Person.email < email + "\uffff") \
+                .order_by(Person.email).limit(limit):
+            people[person.id] = person
+    if name:
+        for person in db.query(Person).filter(Person.name_key >= name, Person.name_key < name + "\uffff") \
+                .order_by(Person.name_key).limit(limit):
+            people.setdefault(person.id, person)
+    return sorted(people.values(), key=lambda p: (p.name_key, p.email or ""))[:limit]
+
+
+def link_participants(session_factory, batch_size: int = LINK_BATCH) -> int:
+    """Gắn person_id cho participants chưa được liên kết (dữ liệu trước khi có danh bạ)"""
+    linked = 0
+    while True:
+        with session_factory() as db:
+            rows = db.query(Participant.id, Participant.name, Participant.email, Participant.department) \
+                .filter(Participant.person_id.is_(None)).limit(batch_size).all()
+            if not rows:
+                break
+            ids = resolve_people(db, [(row.name, row.email, row.department) for row in rows])
+            db.bulk_update_mappings(Participant, [
+                {"id": row.id, "person_id": ids[person_key(row.name, row.email)]} for row in rows
+            ])
+            db.commit()
+        linked += len(rows)
+    if linked:
+        logger.info(f"👥 Linked {linked} participant(s) to the people directory")
+    return linked
+
+
+def main():
+    import app as whisper_app
+
+    parser = argparse.ArgumentParser(description="People directory maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("link", help="Liên kết participants cũ với danh bạ")
+    args = parser.parse_args()
+
+    if args.command == "link":
+        print(f"Linked {link_participants(whisper_app.SessionLocal)} participant(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,574 @@
+# profiling.py - Profile theo yêu cầu cho một request/job và snapshot bộ nhớ (tracemalloc)
+"""
+Chỉ hoạt động khi bật ``PROFILING=1``. Khi tắt, app không gắn middleware,
+không thay route class và không bọc hàm của job: request và job chạy đúng
+như trước (``stage()`` chỉ còn một lần đọc ContextVar).
+
+Khi bật:
+
+- Request có header ``X-Profile: cprofile`` (hoặc ``1``) hay ``X-Profile: sample``
+  được profile riêng: ``ProfilingMiddleware`` tạo một ``Capture`` cho request,
+  ``ProfiledRoute`` bật profiler trong đúng thread chạy endpoint (endpoint
+  đồng bộ chạy trong threadpool, cProfile chỉ thấy thread đã bật nó).
+  Response có header ``X-Profile-Id``. Job được enqueue trong request đó
+  cũng được profile (artifact riêng).
+- ``Profiler.arm(n)`` (``POST /api/debug/profiling``, hoặc ``PROFILE_JOBS``
+  lúc khởi động, vd. cho ``whisper_worker``) profile ``n`` job kế tiếp.
+
+Mỗi lần profile ghi vào ``PROFILE_DIR``:
+
+- ``<id>.pstats``: thống kê cProfile (chế độ ``cprofile``), mở bằng
+  ``python -m pstats`` hoặc snakeviz
+- ``<id>.speedscope.json``: stack lấy mẫu theo thread (mọi chế độ) và các
+  giai đoạn ``stage()`` của pipeline (evented), mở bằng speedscope.app
+- ``<id>.meta.json``: mô tả (request/job, thời gian, giai đoạn)
+
+Chế độ ``sample`` chỉ lấy mẫu stack mỗi ``sample_interval`` giây (gần như
+không làm chậm job); ``cprofile`` đếm mọi lời gọi hàm, chậm hơn đáng kể với
+code Python nhiều lời gọi nhỏ.
+
+``MemoryTracer`` chụp snapshot tracemalloc kèm kích thước các registry
+sống lâu trong process (vd. ``transcription_tasks``, ``model_cache``) và so
+sánh hai snapshot để tìm chỗ cấp phát tăng dần.
+"""
+import cProfile
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import anyio
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+PROFILING_SETTINGS = {
+    "enabled": os.environ.get("PROFILING", "0").lower() in ("1", "true", "yes"),
+    # Nếu đặt: header X-Profile-Token phải khớp (cho cả X-Profile và /api/debug)
+    "token": os.environ.get("PROFILING_TOKEN") or None,
+    "directory": os.environ.get("PROFILE_DIR", "data/profiles"),
+    "sample_interval": _env_float("PROFILE_SAMPLE_INTERVAL", 0.005),
+    "max_artifacts": int(_env_float("PROFILE_MAX_ARTIFACTS", 50)),  # Xóa profile cũ nhất khi vượt
+    "jobs": int(_env_float("PROFILE_JOBS", 0)),  # Số job kế tiếp được profile ngay khi khởi động
+    "max_snapshots": int(_env_float("TRACEMALLOC_MAX_SNAPSHOTS", 8)),
+    "trace_frames": int(_env_float("TRACEMALLOC_FRAMES", 10)),
+}
+
+PROFILE_HEADER = "x-profile"
+TOKEN_HEADER = "x-profile-token"
+MODES = ("cprofile", "sample")
+DEFAULT_MODE = "cprofile"
+
+# Capture đang chạy của request/job hiện tại (None: không profile)
+_current: contextvars.ContextVar = contextvars.ContextVar("profile_capture", default=None)
+
+
+def parse_mode(value: Optional[str]) -> Optional[str]:
+    """Giá trị header X-Profile -> chế độ (None = không profile)"""
+    value = (value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    return value if value in MODES else DEFAULT_MODE
+
+
+# Dùng lại một context rỗng: stage() khi không profile không tạo object nào
+_NOOP = nullcontext()
+
+
+def stage(name: str):
+    """Đánh dấu một giai đoạn của pipeline trong profile hiện tại (không làm gì khi không profile)"""
+    capture = _current.get()
+    if capture is None:
+        return _NOOP
+    return capture.stage(name)
+
+
+def current_mode() -> Optional[str]:
+    capture = _current.get()
+    return capture.mode if capture is not None else None
+
+
+# ==================== CAPTURE ====================
+
+class _Sampler(threading.Thread):
+    """Lấy mẫu stack của các thread đã đăng ký vào capture"""
+
+    def __init__(self, capture: "Capture", interval: float):
+        super().__init__(name=f"profile-sampler-{capture.id}", daemon=True)
+        self.capture = capture
+        self.interval = interval
+        self._done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            now = time.perf_counter()
+            self.capture.sample(sys._current_frames(), now - last)
+            last = now
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Capture:
+    """Dữ liệu profile của một request hoặc một job"""
+
+    def __init__(self, kind: str, target: str, mode: str = DEFAULT_MODE, sample_interval: float = 0.005, **info):
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.kind = kind  # "request" hoặc "job"
+        self.target = target
+        self.mode = mode
+        self.info = info
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self._lock = threading.Lock()
+        self._threads: Dict[int, str] = {}  # thread id -> tên, đang chạy code của capture
+        self._profiles: List[cProfile.Profile] = []
+        # Speedscope: bảng frame dùng chung, mẫu theo thread, sự kiện giai đoạn
+        self._frames: List[dict] = []
+        self._frame_index: Dict[tuple, int] = {}
+        self._samples: Dict[str, List[tuple]] = {}
+        self._events: List[tuple] = []
+        self._stage_frames: Dict[str, int] = {}
+        self._sampler = _Sampler(self, sample_interval)
+        self._sampler.start()
+
+    @contextmanager
+    def running(self):
+        """Profile code chạy trong thread hiện tại trong khối `with`"""
+        thread = threading.current_thread()
+        token = _current.set(self)
+        profile = cProfile.Profile() if self.mode == "cprofile" else None
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:  # Python 3.12+: chỉ một cProfile chạy được tại một thời điểm
+                profile = None
+        try:
+            yield self
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                self._threads.pop(thread.ident, None)
+                if profile is not None:
+                    self._profiles.append(profile)
+            _current.reset(token)
+
+    def _frame(self, code) -> int:
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self._frames)
+            self._frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def sample(self, frames: dict, weight: float):
+        with self._lock:
+            for ident, name in self._threads.items():
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    self._samples.setdefault(name, []).append((stack, weight))
+
+    @contextmanager
+    def stage(self, name: str):
+        with self._lock:
+            frame = self._stage_frames.get(name)
+            if frame is None:
+                frame = self._stage_frames[name] = len(self._frames)
+                self._frames.append({"name": f"stage:{name}"})
+        start = time.perf_counter() - self._start
+        self._events.append(("O", frame, start))
+        try:
+            yield
+        finally:
+            self._events.append(("C", frame, time.perf_counter() - self._start))
+
+    def finish(self):
+        self._sampler.stop()
+        self.duration = time.perf_counter() - self._start
+
+    # ---------- Xuất artifact ----------
+
+    def stages(self) -> List[dict]:
+        """Thời lượng từng giai đoạn (theo thứ tự bắt đầu)"""
+        names = {index: name for name, index in self._stage_frames.items()}
+        opened, stages = {}, []
+        for event, frame, at in self._events:
+            if event == "O":
+                opened[frame] = at
+            elif frame in opened:
+                start = opened.pop(frame)
+                stages.append({"name": names[frame], "start": round(start, 4), "seconds": round(at - start, 4)})
+        return sorted(stages, key=lambda s: s["start"])
+
+    def speedscope(self) -> dict:
+        profiles = []
+        for thread, samples in self._samples.items():
+            weights = [weight for _, weight in samples]
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.target} [{thread}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": [stack for stack, _ in samples],
+                "weights": weights,
+            })
+        if self._events:
+            profiles.append({
+                "type": "evented",
+                "name": f"{self.target} [stages]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": max(self.duration, self._events[-1][2]),
+                "events": [{"type": event, "frame": frame, "at": at} for event, frame, at in self._events],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.kind} {self.target}",
+            "exporter": "whisper-api profiling",
+            "shared": {"frames": self._frames},
+            "profiles": profiles,
+        }
+
+    def metadata(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "target": self.target,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(self.duration, 4),
+            "samples": sum(len(samples) for samples in self._samples.values()),
+            "stages": self.stages(),
+            **self.info,
+        }
+
+    def save(self, directory: Path) -> dict:
+        directory.mkdir(parents=True, exist_ok=True)
+        meta = self.metadata()
+        files = [f"{self.id}.speedscope.json"]
+        with open(directory / files[0], "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f)
+        if self._profiles:
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(directory / f"{self.id}.pstats")
+            files.insert(0, f"{self.id}.pstats")
+        meta["files"] = files
+        with open(directory / f"{self.id}.meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return meta
+
+
+# ==================== PROFILER ====================
+
+class Profiler:
+    def __init__(self, **settings):
+        self.settings = {**PROFILING_SETTINGS, **settings}
+        self.directory = Path(self.settings["directory"])
+        self._armed = self.settings["jobs"] if self.enabled else 0
+        self._armed_mode = DEFAULT_MODE
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings["enabled"]
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.settings["token"] is None or token == self.settings["token"]
+
+    def capture(self, kind: str, target: str, mode: str = DEFAULT_MODE, **info) -> Capture:
+        return Capture(kind, target, mode, self.settings["sample_interval"], **info)
+
+    def save(self, capture: Capture) -> Optional[dict]:
+        capture.finish()
+        try:
+            meta = capture.save(self.directory)
+        except Exception as e:
+            logger.error(f"❌ Could not save profile {capture.id}: {e}")
+            return None
+        logger.info(f"🔬 Profiled {capture.kind} {capture.target} in {capture.duration:.2f}s ({capture.id})")
+        self._prune()
+        return meta
+
+    # ---------- Job ----------
+
+    def arm(self, jobs: int, mode: str = DEFAULT_MODE):
+        """Profile `jobs` job kế tiếp bắt đầu trong process này"""
+        with self._lock:
+            self._armed = max(jobs, 0)
+            self._armed_mode = mode
+
+    def armed(self) -> dict:
+        with self._lock:
+            return {"jobs": self._armed, "mode": self._armed_mode}
+
+    def job_mode(self) -> Optional[str]:
+        """Chế độ profile cho job sắp enqueue/chạy: theo request hiện tại, hoặc theo lượt đã arm"""
+        if not self.enabled:
+            return None
+        mode = current_mode()
+        if mode is not None:
+            return mode
+        with self._lock:
+            if self._armed <= 0:
+                return None
+            self._armed -= 1
+            return self._armed_mode
+
+    def wrap_job(self, func: Callable[[], None], job_id: str, kind: str, mode: Optional[str]) -> Callable[[], None]:
+        """Bọc hàm của job để profile khi chạy (trả lại `func` nếu không profile)"""
+        if mode is None:
+            return func
+
+        @functools.wraps(func)
+        def profiled():
+            capture = self.capture("job", kind, mode, job_id=job_id)
+            try:
+                with capture.running():
+                    return func()
+            finally:
+                self.save(capture)
+
+        return profiled
+
+    # ---------- Artifact ----------
+
+    def profiles(self) -> List[dict]:
+        profiles = []
+        for path in self.directory.glob("*.meta.json"):
+            try:
+                profiles.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda p: p.get("started_at", ""), reverse=True)
+
+    def artifact(self, name: str) -> Optional[Path]:
+        """File artifact trong PROFILE_DIR (None nếu không có hoặc tên không hợp lệ)"""
+        if not name.endswith((".pstats", ".speedscope.json", ".meta.json")) or Path(name).name != name:
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def delete(self, profile_id: str) -> bool:
+        removed = False
+        for suffix in (".meta.json", ".pstats", ".speedscope.json"):
+            path = self.artifact(profile_id + suffix)
+            if path is not None:
+                path.unlink(missing_ok=True)
+                removed = True
+        return removed
+
+    def _prune(self):
+        for meta in self.profiles()[self.settings["max_artifacts"]:]:
+            self.delete(meta["id"])
+
+
+# ==================== REQUEST ====================
+
+class ProfilingMiddleware:
+    """Profile request có header X-Profile (chỉ gắn vào app khi bật PROFILING)"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = parse_mode(headers.get(PROFILE_HEADER))
+        if mode is None or not self.profiler.authorized(headers.get(TOKEN_HEADER)):
+            await self.app(scope, receive, send)
+            return
+
+        target = f"{scope['method']} {scope['path']}"
+        capture = self.profiler.capture("request", target, mode)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", capture.id)
+            await send(message)
+
+        token = _current.set(capture)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            await anyio.to_thread.run_sync(self.profiler.save, capture)
+
+
+def _profiled_call(call):
+    """Bật profiler của request trong thread (hoặc task) chạy endpoint"""
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            capture = _current.get()
+            if capture is None:
+                return await call(*args, **kwargs)
+            # Endpoint async chạy trên event loop: profile gồm cả task khác chạy xen kẽ
+            with capture.running():
+                return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            capture = _current.get()
+            if capture is None:
+                return call(*args, **kwargs)
+            with capture.running():
+                return call(*args, **kwargs)
+    return endpoint
+
+
+class ProfiledRoute(APIRoute):
+    """Route bọc endpoint bằng `_profiled_call` (ContextVar của request được chép vào threadpool)"""
+
+    def get_route_handler(self):
+        if self.dependant.call is not None and not hasattr(self.dependant.call, "__wrapped__"):
+            self.dependant.call = _profiled_call(self.dependant.call)
+        return super().get_route_handler()
+
+
+# ==================== BỘ NHỚ ====================
+
+# Bỏ cấp phát của chính tracemalloc và bộ import khỏi thống kê
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+GROUP_BY = ("lineno", "filename", "traceback")
+
+
+def _stat_dict(stat) -> dict:
+    frames = [{"file": frame.filename, "line": frame.lineno} for frame in stat.traceback]
+    item = {"size_kb": round(stat.size / 1024, 1), "count": stat.count, "traceback": frames}
+    if hasattr(stat, "size_diff"):
+        item.update(size_diff_kb=round(stat.size_diff / 1024, 1), count_diff=stat.count_diff)
+    return item
+
+
+class MemoryTracer:
+    """Snapshot tracemalloc trong bộ nhớ (giữ tối đa ``max_snapshots``) và kích thước các registry"""
+
+    def __init__(self, registries: Optional[Dict[str, Callable[[], dict]]] = None, **settings):
+        self.settings = {**PROFILING_SETTINGS, **settings}
+        self.registries = registries or {}
+        self._snapshots: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (snapshot, metadata)
+        self._lock = threading.Lock()
+
+    def start(self, frames: Optional[int] = None) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or self.settings["trace_frames"])
+            logger.info(f"🧠 tracemalloc started ({tracemalloc.get_traceback_limit()} frames)")
+        return self.status()
+
+    def stop(self) -> dict:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("🧠 tracemalloc stopped")
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots = [meta for _, meta in self._snapshots.values()]
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_mb": round(current / 2 ** 20, 2),
+            "peak_mb": round(peak / 2 ** 20, 2),
+            "snapshots": snapshots,
+        }
+
+    def registry_sizes(self) -> dict:
+        sizes = {}
+        for name, measure in self.registries.items():
+            try:
+                sizes[name] = measure()
+            except Exception as e:  # Registry đang thay đổi giữa chừng
+                sizes[name] = {"error": str(e)}
+        return sizes
+
+    def snapshot(self, limit: int = 20, group_by: str = "lineno") -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        meta = {
+            "id": f"{datetime.now():%H%M%S}-{uuid.uuid4().hex[:6]}",
+            "taken_at": datetime.now().isoformat(),
+            "traced_mb": round(sum(stat.size for stat in snapshot.statistics("filename")) / 2 ** 20, 2),
+            "registries": self.registry_sizes(),
+        }
+        with self._lock:
+            self._snapshots[meta["id"]] = (snapshot, meta)
+            while len(self._snapshots) > self.settings["max_snapshots"]:
+                self._snapshots.popitem(last=False)
+        top = snapshot.statistics(group_by)[:limit]
+        return {**meta, "top": [_stat_dict(stat) for stat in top]}
+
+    def get(self, snapshot_id: str) -> Optional[tuple]:
+        with self._lock:
+            return self._snapshots.get(snapshot_id)
+
+    def diff(self, base_id: Optional[str] = None, other_id: Optional[str] = None,
+             limit: int = 20, group_by: str = "lineno") -> Optional[dict]:
+        """So `other` (mặc định: snapshot mới nhất) với `base` (mặc định: snapshot ngay trước `other`)"""
+        with self._lock:
+            ids = list(self._snapshots)
+        other_id = other_id or (ids[-1] if ids else None)
+        if not base_id and other_id in ids and ids.index(other_id) > 0:
+            base_id = ids[ids.index(other_id) - 1]
+        base, other = self.get(base_id or ""), self.get(other_id or "")
+        if base is None or other is None:
+            return None
+        (base_snapshot, base_meta), (other_snapshot, other_meta) = base, other
+        stats = other_snapshot.compare_to(base_snapshot, group_by)
+        growth = sum(stat.size_diff for stat in stats)
+        return {
+            "base": base_meta["id"],
+            "other": other_meta["id"],
+            "size_diff_mb": round(growth / 2 ** 20, 3),
+            "registries": {"base": base_meta["registries"], "other": other_meta["registries"]},
+            "top": [_stat_dict(stat) for stat in stats[:limit]],
+        }
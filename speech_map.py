@@ -0,0 +1,275 @@
+# speech_map.py - Bản đồ tiếng nói (VAD) tính một lần cho mỗi nội dung audio và bộ tham số
+"""
+Với ``vad_filter=True`` faster-whisper chạy lại Silero VAD trên cả file mỗi
+lần phiên âm: chạy lại một cuộc họp, phiên âm lại, vẽ vùng tiếng nói đều
+lặp lại cùng một việc, trong khi cuộc họp thường quá nửa là khoảng lặng.
+
+``SpeechMapStore.get`` trả về các đoạn có tiếng nói của file audio, tính
+một lần cho mỗi cặp (sha256 nội dung audio, tham số VAD đầy đủ) rồi lưu
+trong bảng ``speech_maps`` dưới dạng gọn: mốc đầu/cuối theo đơn vị 10 ms,
+mã hóa delta uint32 rồi nén zlib (vài KB cho một cuộc họp nhiều giờ). Cùng
+một file tải lên lại hay được sao chép vẫn dùng chung bản đồ.
+
+Bản đồ được dùng để:
+
+- decode thay cho ``vad_filter`` (không chạy VAD nữa): chế độ tuần tự
+  decode các đoạn tiếng nói ghép liền như ``vad_filter`` rồi đổi timestamp
+  về audio gốc (``SpeechTimeline``); chế độ batched nhận thẳng
+  ``clip_timestamps``
+- chia clip: gộp các đoạn tiếng nói thành clip không dài quá
+  ``max_clip_seconds`` (một cửa sổ 30 giây của Whisper, như batched tự làm)
+- API vùng tiếng nói của cuộc họp và tỉ lệ tiếng nói (``speech_ratio``)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import SpeechTimestamps
+from waveform import CHUNK_SECONDS, pcm_chunks
+from whisper_backends import SAMPLE_RATE
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+SPEECH_MAP_SETTINGS = {
+    "enabled": os.environ.get("SPEECH_MAP", "1").lower() not in ("0", "false", "no"),
+    # Độ dài tối đa của một clip khi decode (bằng cửa sổ của Whisper)
+    "max_clip_seconds": _env_float("SPEECH_MAP_MAX_CLIP_SECONDS", 30),
+}
+
+# Tham số VAD của pipeline cuộc họp
+MEETING_VAD = {"threshold": 0.5, "min_speech_duration_ms": 250, "min_silence_duration_ms": 2000}
+# Mặc định của BatchedInferencePipeline khi không truyền vad_parameters
+BATCHED_VAD = {"min_silence_duration_ms": 160}
+UNIT = 0.01  # Độ phân giải lưu trữ (giây)
+HASH_BLOCK = 1024 * 1024
+
+
+def vad_options(params: Optional[dict] = None, batched: bool = False) -> dict:
+    """Tham số VAD đầy đủ (điền mặc định của faster-whisper) để hai cách viết cùng một cấu hình trùng khóa"""
+    from faster_whisper.vad import VadOptions
+
+    params = dict(params if params is not None else BATCHED_VAD if batched else {})
+    if batched:
+        # Chế độ batched luôn cắt đoạn tiếng nói theo cửa sổ 30 giây
+        params["max_speech_duration_s"] = SPEECH_MAP_SETTINGS["max_clip_seconds"]
+    return asdict(VadOptions(**params))
+
+
+def params_key(options: dict) -> str:
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=256)
+def _file_hash(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def audio_hash(path) -> str:
+    """sha256 nội dung file (nhớ theo đường dẫn + kích thước + mtime, không băm lại file không đổi)"""
+    stat = os.stat(path)
+    return _file_hash(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def encode_spans(spans: List[List[float]]) -> bytes:
+    """[[start, end], ...] (giây) -> zlib(delta uint32 theo đơn vị 10 ms); đầu làm tròn xuống, cuối làm tròn lên"""
+    flat = np.zeros(2 * len(spans), dtype=np.int64)
+    if spans:
+        bounds = np.asarray(spans, dtype=np.float64)
+        flat[0::2] = np.floor(bounds[:, 0] / UNIT + 1e-6)
+        flat[1::2] = np.ceil(bounds[:, 1] / UNIT - 1e-6)
+    deltas = np.diff(np.maximum.accumulate(flat), prepend=0).astype(np.uint32)
+    return zlib.compress(deltas.tobytes(), 9)
+
+
+def decode_spans(blob: bytes) -> List[List[float]]:
+    flat = np.cumsum(np.frombuffer(zlib.decompress(blob), dtype=np.uint32).astype(np.int64)) * UNIT
+    return [[round(float(s), 2), round(float(e), 2)] for s, e in zip(flat[0::2], flat[1::2])]
+
+
+def compute_spans(audio_path, options: dict) -> Tuple[List[List[float]], float]:
+    """Chạy VAD trên `audio_path` theo từng khối (không giữ cả file trong RAM); trả về (spans, duration)"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    vad = VadOptions(**options)
+    spans, total = [], 0
+    for chunk in pcm_chunks(audio_path, CHUNK_SECONDS * SAMPLE_RATE):
+        for span in get_speech_timestamps(chunk, vad):
+            start, end = total + span["start"], total + span["end"]
+            if spans and spans[-1][1] >= total and start <= total:
+                # Tiếng nói kéo qua ranh giới hai khối: nối lại thành một đoạn
+                spans[-1][1] = end
+            else:
+                spans.append([start, end])
+        total += len(chunk)
+    return [[start / SAMPLE_RATE, end / SAMPLE_RATE] for start, end in spans], total / SAMPLE_RATE
+
+
+class SpeechTimeline:
+    """Đổi mốc thời gian trên audio chỉ gồm các đoạn tiếng nói ghép liền về mốc trên audio gốc"""
+
+    def __init__(self, spans: List[List[float]]):
+        self.starts = np.array([start for start, _ in spans], dtype=np.float64)
+        lengths = np.array([end - start for start, end in spans], dtype=np.float64)
+        self.offsets = np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+
+    def original(self, t: float, end: bool = False) -> float:
+        # Mốc đúng ranh giới hai đoạn: là cuối đoạn trước nếu `end`, đầu đoạn sau nếu không
+        index = int(np.searchsorted(self.offsets, t, side="left" if end else "right")) - 1
+        index = min(max(index, 0), len(self.starts) - 1)
+        return round(float(self.starts[index] + t - self.offsets[index]), 3)
+
+
+@dataclass
+class SpeechMap:
+    audio_hash: str
+    params: dict
+    duration: float
+    spans: List[List[float]]
+
+    @property
+    def speech_seconds(self) -> float:
+        return sum(end - start for start, end in self.spans)
+
+    @property
+    def speech_ratio(self) -> float:
+        return self.speech_seconds / self.duration if self.duration > 0 else 0.0
+
+    def clips(self, max_seconds: Optional[float] = None, offset: float = 0.0) -> List[List[float]]:
+        """Gộp các đoạn tiếng nói (sau `offset`) thành clip dài không quá `max_seconds`"""
+        max_seconds = max_seconds or SPEECH_MAP_SETTINGS["max_clip_seconds"]
+        clips = []
+        for start, end in self.spans:
+            if end <= offset:
+                continue
+            start = max(start, offset)
+            if clips and end - clips[-1][0] <= max_seconds:
+                clips[-1][1] = end
+                continue
+            # Đoạn dài hơn một cửa sổ được cắt thành nhiều clip
+            while end - start > max_seconds:
+                clips.append([start, start + max_seconds])
+                start += max_seconds
+            clips.append([start, end])
+        return clips
+
+    def clip_timestamps(self, offset: float = 0.0) -> List[dict]:
+        """``clip_timestamps`` của BatchedInferencePipeline (mẫu) cho audio bắt đầu từ `offset` giây"""
+        return [{"start": int((start - offset) * SAMPLE_RATE), "end": int((end - offset) * SAMPLE_RATE)}
+                for start, end in self.clips(offset=offset)]
+
+    def speech_audio(self, audio: np.ndarray, offset: float = 0.0) -> Tuple[np.ndarray, SpeechTimeline]:
+        """Các đoạn tiếng nói của `audio` (PCM bắt đầu từ `offset` giây) ghép liền, kèm cách đổi mốc thời gian"""
+        pieces, spans = [], []
+        for start, end in self.spans:
+            first = max(int((start - offset) * SAMPLE_RATE), 0)
+            last = min(int((end - offset) * SAMPLE_RATE), len(audio))
+            if last > first:
+                pieces.append(audio[first:last])
+                spans.append([offset + first / SAMPLE_RATE, offset + last / SAMPLE_RATE])
+        joined = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+        return joined, SpeechTimeline(spans)
+
+    def window(self, start: float = 0.0, end: Optional[float] = None) -> List[List[float]]:
+        end = self.duration if end is None else end
+        return [span for span in self.spans if span[1] > start and span[0] < end]
+
+    def summary(self) -> dict:
+        return {
+            "duration": round(self.duration, 2),
+            "speech_seconds": round(self.speech_seconds, 2),
+            "speech_ratio": round(self.speech_ratio, 4),
+            "spans": len(self.spans),
+        }
+
+    def to_dict(self, start: float = 0.0, end: Optional[float] = None) -> dict:
+        return {
+            "audio_hash": self.audio_hash,
+            "params": self.params,
+            **self.summary(),
+            "clips": len(self.clips()),
+            "speech": self.window(start, end),
+        }
+
+
+class SpeechMapStore:
+    def __init__(self, session_factory, **settings):
+        self.session_factory = session_factory
+        self.settings = {**SPEECH_MAP_SETTINGS, **settings}
+        self.counts = {"hits": 0, "computed": 0, "vad_seconds_saved": 0.0}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings["enabled"]
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counts[name] += value
+
+    def cached(self, digest: str, options: dict) -> Optional[SpeechMap]:
+        with self.session_factory() as db:
+            row = db.get(SpeechTimestamps, (digest, params_key(options)))
+            if row is None:
+                return None
+            return SpeechMap(digest, json.loads(row.params), row.duration, decode_spans(row.spans))
+
+    def get(self, audio_path, params: Optional[dict] = None, batched: bool = False) -> SpeechMap:
+        """Bản đồ tiếng nói của `audio_path` với tham số VAD `params` (tính và lưu nếu chưa có)"""
+        options = vad_options(params, batched)
+        digest = audio_hash(audio_path)
+        key = (digest, params_key(options))
+        # Hai job cùng audio chỉ chạy VAD một lần
+        with self._key_lock(key):
+            speech = self.cached(digest, options)
+            if speech is not None:
+                self._count("hits")
+                self._count("vad_seconds_saved", speech.duration)
+                return speech
+            spans, duration = compute_spans(audio_path, options)
+            blob = encode_spans(spans)
+            with self.session_factory() as db:
+                db.merge(SpeechTimestamps(
+                    audio_hash=digest, params_key=key[1], params=json.dumps(options, sort_keys=True),
+                    duration=duration, speech_seconds=sum(e - s for s, e in spans), spans=blob,
+                    created_at=datetime.now(),
+                ))
+                db.commit()
+        self._count("computed")
+        # Đọc lại từ dạng đã lưu để lần này và các lần sau cho cùng kết quả
+        speech = SpeechMap(digest, options, duration, decode_spans(blob))
+        logger.info(f"🗣️ Speech map for {Path(audio_path).name}: {len(spans)} spans, "
+                    f"{speech.speech_ratio:.0%} speech of {duration:.0f}s ({len(blob)} bytes)")
+        return speech
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        counts["vad_seconds_saved"] = round(counts["vad_seconds_saved"], 1)
+        return {"enabled": self.enabled, **counts}
@@ -532,8 +532,8 @@ async function loadMeetingsList() {
 
             displayMeetingsList(meetings || []);
 
-            // Load stats
-            const statsResponse = await fetch(`${API_BASE_URL}/api/meetings?limit=100`);
+            // Load stats (chỉ cần start_time và status)
+            const statsResponse = await fetch(`${API_BASE_URL}/api/meetings?limit=100&fields=start_time,status`);
             if (statsResponse.ok) {
                 const allMeetings = await statsResponse.json();
                 statsTotal.textContent = allMeetings.length;
@@ -1188,6 +1188,14 @@ async function playMeetingAudio(meetingId) {
                     </audio>
                 </div>
                 
+                <div class="mb-6">
+                    <canvas id="meeting-waveform" class="w-full h-16 rounded-lg bg-gray-50 cursor-pointer"></canvas>
+                    <label class="hidden mt-2 items-center text-sm text-gray-600" id="skip-silence-label">
+                        <input type="checkbox" id="skip-silence" class="mr-2">
+                        Bỏ qua khoảng lặng
+                    </label>
+                </div>
+                
                 <div class="flex justify-end space-x-3">
                     <a href="${audioUrl}" download 
                        class="px-4 py-2 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300 transition-colors flex items-center">
@@ -1205,6 +1213,7 @@ async function playMeetingAudio(meetingId) {
         `;
         
         document.body.appendChild(modal);
+        renderMeetingWaveform(meetingId, modal);
         
         // Auto-play after a short delay
         setTimeout(() => {
@@ -1223,6 +1232,73 @@ async function playMeetingAudio(meetingId) {
     }
 }
 
+async function renderMeetingWaveform(meetingId, modal) {
+    // Peaks are precomputed on the server: no need to download and decode the recording
+    const canvas = modal.querySelector('#meeting-waveform');
+    const player = modal.querySelector('#meeting-audio-player');
+    const skipSilence = modal.querySelector('#skip-silence');
+    if (!canvas || !player) return;
+    
+    try {
+        const width = canvas.clientWidth || 400;
+        const response = await fetch(`${API_BASE_URL}/api/meetings/${meetingId}/waveform?max_points=${width}`);
+        if (!response.ok) {
+            canvas.parentElement.remove();
+            return;
+        }
+        const waveform = await response.json();
+        const speech = waveform.speech || [];
+        const count = waveform.data.length / 2;
+        const ratio = window.devicePixelRatio || 1;
+        canvas.width = width * ratio;
+        canvas.height = (canvas.clientHeight || 64) * ratio;
+        const ctx = canvas.getContext('2d');
+        
+        const draw = () => {
+            const progress = waveform.duration ? player.currentTime / waveform.duration : 0;
+            const mid = canvas.height / 2;
+            const barWidth = canvas.width / Math.max(count, 1);
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+            ctx.fillStyle = '#eef2ff';
+            speech.forEach(([start, end]) => {
+                ctx.fillRect(start / waveform.duration * canvas.width, 0,
+                             Math.max(1, (end - start) / waveform.duration * canvas.width), canvas.height);
+            });
+            for (let i = 0; i < count; i++) {
+                const x = i * barWidth;
+                const top = mid - waveform.data[2 * i + 1] / 127 * mid;
+                const bottom = mid - waveform.data[2 * i] / 127 * mid;
+                ctx.fillStyle = x / canvas.width < progress ? '#6366f1' : '#a5b4fc';
+                ctx.fillRect(x, top, Math.max(1, barWidth - ratio), Math.max(1, bottom - top));
+            }
+        };
+        draw();
+        
+        player.addEventListener('timeupdate', () => {
+            draw();
+            if (skipSilence.checked && speech.length) {
+                const t = player.currentTime;
+                if (!speech.some(([start, end]) => t >= start && t < end)) {
+                    const next = speech.find(([start]) => start > t);
+                    if (next) player.currentTime = next[0];
+                }
+            }
+        });
+        canvas.addEventListener('click', (event) => {
+            const rect = canvas.getBoundingClientRect();
+            player.currentTime = (event.clientX - rect.left) / rect.width * waveform.duration;
+            draw();
+        });
+        if (speech.length) {
+            const label = modal.querySelector('#skip-silence-label');
+            label.classList.remove('hidden');
+            label.classList.add('flex');
+        }
+    } catch (error) {
+        console.debug('Could not load waveform', error);
+    }
+}
+
 async function viewMeetingTranscription(meetingId) {
     try {
         showAlert('⏳ Đang tải nội dung phiên âm...', 'info');
@@ -2083,6 +2159,7 @@ function getStatusClass(status) {
         'in_progress': 'status-in-progress',
         'completed': 'status-completed',
         'cancelled': 'status-cancelled',
+        'failed': 'status-cancelled',
         'draft': 'status-draft'
     };
     return classes[status] || 'status-scheduled';
@@ -2094,6 +2171,7 @@ function getStatusText(status) {
         'in_progress': '🎤 Đang diễn ra',
         'completed': '✅ Đã hoàn thành',
         'cancelled': '❌ Đã hủy',
+        'failed': '⚠️ Xử lý lỗi',
         'draft': '📝 Nháp'
     };
     return texts[status] || status;
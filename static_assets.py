@@ -0,0 +1,214 @@
+# static_assets.py - Asset tĩnh có hash trong tên file, nén sẵn, và cache template
+"""
+``build_assets`` copy mọi file trong ``static/`` (trừ ``static/dist``) sang
+``static/dist`` với tên chứa hash nội dung (``js/app.3f2a9c1b0d.js``), kèm
+bản nén sẵn ``.gz``/``.br`` cho file văn bản, và ghi ``manifest.json``
+(đường dẫn gốc -> đường dẫn có hash). Vì tên file đổi khi nội dung đổi,
+``/static/dist`` được cache ``immutable`` một năm.
+
+``TemplateCache`` giữ HTML đã render (đổi ``/static/...`` sang bản có hash)
+cùng các bản nén trong RAM, làm mới khi template hoặc manifest thay đổi.
+
+    python -m static_assets build
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass, field
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+from compression import available_encodings, compress, is_compressible, negotiate_encoding
+
+logger = logging.getLogger("whisper-api")
+
+STATIC_DIR = Path("static")
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_NAME = "manifest.json"
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Asset nén sẵn lúc build nên dùng mức nén cao nhất
+BUILD_LEVELS = {"br": 11, "gzip": 9}
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _source_files(static_dir: Path, dist_dir: Path):
+    for path in sorted(static_dir.rglob("*")):
+        if path.is_file() and dist_dir not in path.parents:
+            yield path
+
+
+def load_manifest(dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    try:
+        with open(dist_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_assets(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    """Tạo bản có hash + nén sẵn cho mọi asset, xóa bản cũ; trả về manifest"""
+    static_dir, dist_dir = Path(static_dir), Path(dist_dir)
+    dist_dir.mkdir(parents=True, exist_ok=True)
+    manifest, outputs = {}, {dist_dir / MANIFEST_NAME}
+    for source in _source_files(static_dir, dist_dir):
+        data = source.read_bytes()
+        relative = source.relative_to(static_dir)
+        hashed = relative.with_name(f"{relative.stem}.{_content_hash(data)}{relative.suffix}")
+        target = dist_dir / hashed
+        manifest[relative.as_posix()] = hashed.as_posix()
+        outputs.add(target)
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+        if is_compressible(guess_type(source.name)[0]):
+            for encoding in available_encodings():
+                variant = target.with_name(target.name + ENCODING_SUFFIXES[encoding])
+                outputs.add(variant)
+                if not variant.exists():
+                    variant.write_bytes(compress(data, encoding, BUILD_LEVELS[encoding]))
+
+    # Xóa bản build của các phiên bản asset cũ
+    for path in list(dist_dir.rglob("*")):
+        if path.is_file() and path not in outputs:
+            path.unlink()
+
+    tmp = dist_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, dist_dir / MANIFEST_NAME)
+    return manifest
+
+
+def ensure_assets(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    """Build lại nếu có asset mới hơn manifest (static/ thường được mount từ host)"""
+    manifest_path = Path(dist_dir) / MANIFEST_NAME
+    if manifest_path.exists():
+        built = manifest_path.stat().st_mtime_ns
+        sources = list(_source_files(Path(static_dir), Path(dist_dir)))
+        if len(sources) == len(load_manifest(dist_dir)) and all(s.stat().st_mtime_ns <= built for s in sources):
+            return load_manifest(dist_dir)
+    manifest = build_assets(static_dir, dist_dir)
+    logger.info(f"📦 Built {len(manifest)} static asset(s) into {dist_dir}")
+    return manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles phục vụ bản ``.br``/``.gz`` nén sẵn nếu client chấp nhận"""
+
+    def __init__(self, *args, immutable: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = None
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding and is_compressible(guess_type(path)[0]):
+            try:
+                response = await super().get_response(path + ENCODING_SUFFIXES[encoding], scope)
+                response.headers["Content-Encoding"] = encoding
+            except HTTPException:
+                response = None
+        if response is None:
+            response = await super().get_response(path, scope)
+        if is_compressible(guess_type(path)[0]):
+            response.headers.add_vary_header("Accept-Encoding")
+        if self.immutable and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    etag: str
+    media_type: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    def response(self, request_headers: Headers) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if self.etag in request_headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), self.variants)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+class TemplateCache:
+    """HTML đã render + nén, làm mới khi template hoặc manifest asset thay đổi"""
+
+    def __init__(self, dist_dir: Path = DIST_DIR):
+        self.dist_dir = Path(dist_dir)
+        self._pages: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, path: Path) -> tuple:
+        # stat() mỗi request rẻ hơn nhiều so với đọc + render lại file
+        stat = path.stat()
+        try:
+            manifest_mtime = (self.dist_dir / MANIFEST_NAME).stat().st_mtime_ns
+        except OSError:
+            manifest_mtime = None
+        return stat.st_mtime_ns, stat.st_size, manifest_mtime
+
+    def _render(self, path: Path) -> CachedPage:
+        html = path.read_text(encoding="utf-8")
+        dist_url = "/" + self.dist_dir.as_posix().strip("/")
+        for source, hashed in load_manifest(self.dist_dir).items():
+            for quote in ('"', "'"):
+                html = html.replace(f"{quote}/static/{source}{quote}", f"{quote}{dist_url}/{hashed}{quote}")
+        body = html.encode("utf-8")
+        return CachedPage(
+            body=body,
+            etag=f'"{_content_hash(body)}"',
+            media_type="text/html",
+            variants={encoding: compress(body, encoding, BUILD_LEVELS[encoding]) for encoding in available_encodings()},
+        )
+
+    def get(self, path) -> CachedPage:
+        path = Path(path)
+        stamp = self._stamp(path)
+        cached = self._pages.get(str(path))
+        if cached and cached[0] == stamp:
+            return cached[1]
+        with self._lock:
+            cached = self._pages.get(str(path))
+            if cached and cached[0] == stamp:
+                return cached[1]
+            page = self._render(path)
+            self._pages[str(path)] = (stamp, page)
+            logger.info(f"📄 Rendered template {path} ({len(page.body)} bytes)")
+            return page
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static asset pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Tạo asset có hash và nén sẵn trong static/dist")
+    build.add_argument("--static-dir", default=str(STATIC_DIR))
+    build.add_argument("--dist-dir", default=None, help="Mặc định: <static-dir>/dist")
+    args = parser.parse_args()
+
+    static_dir = Path(args.static_dir)
+    dist_dir = Path(args.dist_dir) if args.dist_dir else static_dir / "dist"
+    manifest = build_assets(static_dir, dist_dir)
+    for source, hashed in sorted(manifest.items()):
+        print(f"{source} -> {hashed}")
+
+
+if __name__ == "__main__":
+    main()
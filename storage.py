@@ -0,0 +1,404 @@
+# storage.py - Kho file audio/transcript: chia shard theo hash, chỉ mục trong DB, dọn rác
+"""
+File được đặt trong thư mục con theo hash của owner (meeting/transcription/
+task id) để không thư mục nào chứa hàng chục nghìn file:
+
+    data/meeting_audio/3f/a2/<meeting_id>_<timestamp>.webm
+    data/transcriptions/9c/01/<transcription_id>.wtc
+
+Mỗi file được ghi vào bảng ``stored_files`` (kind, owner, size, hạn), nên
+số lượng và dung lượng lấy bằng một truy vấn thay vì quét thư mục.
+
+``collect_garbage`` (chạy nền định kỳ) xóa:
+
+- upload hết hạn hoặc mồ côi (không thuộc job nào đang chờ/chạy), kể cả
+  file trong UPLOAD_DIR chưa từng được ghi chỉ mục (crash giữa chừng)
+- audio/peak dạng sóng không còn meeting nào tham chiếu, transcript không
+  còn là bản hiện tại hay một phiên bản (bảng ``transcriptions``) của meeting nào
+- audio cuộc họp đã phiên âm xong quá AUDIO_RETENTION_DAYS ngày, và audio
+  cũ nhất khi vượt AUDIO_QUOTA_MB
+- dòng chỉ mục của file đã bị xóa ngoài kho
+
+Chuyển dữ liệu cũ (thư mục phẳng) sang cấu trúc shard (bản phiên âm JSON được
+chuyển luôn sang ``.wtc``):
+
+    python -m storage migrate
+    python -m storage gc
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+
+from models import Meeting, StoredFile, Transcription
+from transcript_store import EXTENSION as TRANSCRIPT_EXTENSION, migrate_file
+from waveform import EXTENSION as WAVEFORM_EXTENSION
+
+logger = logging.getLogger("whisper-api")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+STORAGE_SETTINGS = {
+    "gc_interval": _env_float("STORAGE_GC_INTERVAL", 3600),  # giây; 0 = tắt GC nền
+    # File chưa có chủ (upload đang ghi, transcript chưa gắn vào meeting) được giữ ít nhất ngần này
+    "orphan_grace": _env_float("STORAGE_ORPHAN_GRACE", 3600),
+    "upload_max_age_hours": _env_float("UPLOAD_MAX_AGE_HOURS", 24),
+    "audio_retention_days": _env_float("AUDIO_RETENTION_DAYS", 0),  # 0 = giữ mãi
+    "audio_quota_mb": _env_float("AUDIO_QUOTA_MB", 0),  # 0 = không giới hạn
+}
+
+# meeting_<id>_<YYYYmmdd_HHMMSS>_<tên file gốc> (layout cũ)
+LEGACY_AUDIO_STAMP = re.compile(r"^meeting_[^_]+_(\d{8}_\d{6})_")
+
+MEETING_AUDIO = "meeting_audio"
+TRANSCRIPTION = "transcription"
+UPLOAD = "upload"
+WAVEFORM = "waveform"  # <audio>.peaks, owner là meeting
+
+
+class StorageQuotaExceeded(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def shard_dir(base: Path, owner_id: str) -> Path:
+    """``base/ab/cd`` theo hash của owner_id"""
+    digest = hashlib.sha1(owner_id.encode("utf-8")).hexdigest()
+    return Path(base) / digest[:2] / digest[2:4]
+
+
+class StorageManager:
+    def __init__(self, session_factory, audio_dir: Path, transcription_dir: Path, upload_dir: Path,
+                 active_paths: Optional[Callable[[], Iterable[str]]] = None, **settings):
+        self.session_factory = session_factory
+        self.dirs = {
+            MEETING_AUDIO: Path(audio_dir),
+            TRANSCRIPTION: Path(transcription_dir),
+            UPLOAD: Path(upload_dir),
+        }
+        # Đường dẫn audio của job đang chờ/chạy; GC không bao giờ xóa các file này
+        self.active_paths = active_paths or (lambda: ())
+        self.settings = {**STORAGE_SETTINGS, **settings}
+
+    # ---------- Đường dẫn ----------
+
+    def audio_path(self, meeting_id: str, suffix: str) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return shard_dir(self.dirs[MEETING_AUDIO], meeting_id) / f"{meeting_id}_{timestamp}{suffix}"
+
+    def transcription_path(self, transcription_id: str, suffix: str) -> Path:
+        return shard_dir(self.dirs[TRANSCRIPTION], transcription_id) / f"{transcription_id}{suffix}"
+
+    def upload_path(self, task_id: str, file_name: str) -> Path:
+        return self.dirs[UPLOAD] / f"{task_id}{Path(file_name).suffix}"
+
+    # ---------- Chỉ mục ----------
+
+    def register(self, kind: str, owner_id: Optional[str], path, expires_at: Optional[datetime] = None):
+        """Ghi (hoặc cập nhật) file đã nằm trên đĩa vào chỉ mục"""
+        path = Path(path)
+        with self.session_factory() as db:
+            db.merge(StoredFile(
+                path=str(path), kind=kind, owner_id=owner_id, size=path.stat().st_size,
+                created_at=datetime.now(), expires_at=expires_at,
+            ))
+            db.commit()
+
+    def register_converted_transcript(self, source, target):
+        """Bản phiên âm `source` (JSON) đã được chuyển thành `target` (.wtc): cập nhật chỉ mục"""
+        source, target = Path(source), Path(target)
+        if not source.exists():
+            self.delete(source)  # Chỉ còn dòng chỉ mục
+        stem = target.stem
+        owner_id = stem[len("transcription_"):] if stem.startswith("transcription_") else stem
+        self.register(TRANSCRIPTION, owner_id, target)
+
+    def save(self, kind: str, owner_id: Optional[str], path, source, expires_at: Optional[datetime] = None) -> Path:
+        """Ghi `source` (file object) vào `path` rồi ghi chỉ mục"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f)
+        self.register(kind, owner_id, path, expires_at)
+        return path
+
+    def save_upload(self, task_id: str, file_name: str, source) -> Path:
+        expires_at = datetime.now() + timedelta(hours=self.settings["upload_max_age_hours"])
+        return self.save(UPLOAD, task_id, self.upload_path(task_id, file_name), source, expires_at)
+
+    def delete(self, path) -> bool:
+        """Xóa file và dòng chỉ mục; False nếu file không tồn tại"""
+        if not path:
+            return False
+        path = Path(path)
+        existed = path.exists()
+        path.unlink(missing_ok=True)
+        with self.session_factory() as db:
+            db.query(StoredFile).filter(StoredFile.path == str(path)).delete(synchronize_session=False)
+            db.commit()
+        return existed
+
+    def stats(self) -> Dict[str, dict]:
+        """Số file và dung lượng theo loại, từ chỉ mục"""
+        with self.session_factory() as db:
+            rows = db.query(StoredFile.kind, func.count(StoredFile.path), func.coalesce(func.sum(StoredFile.size), 0)) \
+                .group_by(StoredFile.kind).all()
+        stats = {kind: {"files": 0, "bytes": 0} for kind in (*self.dirs, WAVEFORM)}
+        for kind, count, size in rows:
+            stats[kind] = {"files": count, "bytes": int(size)}
+        return stats
+
+    def check_quota(self, kind: str, incoming_bytes: int):
+        """Từ chối file mới nếu vượt quota kể cả sau khi dọn audio cũ"""
+        quota = self.settings["audio_quota_mb"] * 1024 * 1024
+        if kind != MEETING_AUDIO or not quota:
+            return
+        used = self.stats()[MEETING_AUDIO]["bytes"]
+        if used + incoming_bytes <= quota:
+            return
+        # Không dọn audio cũ cho một file tự nó đã lớn hơn quota
+        if incoming_bytes <= quota:
+            self._enforce_quota(quota - incoming_bytes)
+            used = self.stats()[MEETING_AUDIO]["bytes"]
+        if used + incoming_bytes > quota:
+            raise StorageQuotaExceeded(
+                f"Audio storage quota exceeded ({(used + incoming_bytes) / 1024 / 1024:.1f}"
+                f"/{quota / 1024 / 1024:.1f} MB)"
+            )
+
+    # ---------- Dọn rác ----------
+
+    def _delete_meeting_audio(self, db, row: StoredFile, reason: str):
+        Path(row.path).unlink(missing_ok=True)
+        db.query(Meeting).filter(Meeting.id == row.owner_id, Meeting.audio_file_path == row.path).update({
+            "audio_file_path": None, "audio_file_name": None, "audio_file_size": None,
+        }, synchronize_session=False)
+        db.delete(row)
+        logger.info(f"🧹 Removed meeting audio {row.path} ({reason})")
+
+    def _enforce_quota(self, limit_bytes: float) -> int:
+        """Xóa audio cũ nhất của meeting đã phiên âm xong cho đến khi dưới `limit_bytes`"""
+        removed = 0
+        with self.session_factory() as db:
+            used = db.query(func.coalesce(func.sum(StoredFile.size), 0)).filter(StoredFile.kind == MEETING_AUDIO).scalar()
+            if used <= limit_bytes:
+                return 0
+            candidates = db.query(StoredFile).join(Meeting, Meeting.id == StoredFile.owner_id).filter(
+                StoredFile.kind == MEETING_AUDIO,
+                Meeting.transcription_id.isnot(None),
+                Meeting.status == "completed",
+            ).order_by(StoredFile.created_at).all()
+            active = set(self.active_paths())
+            for row in candidates:
+                if used <= limit_bytes:
+                    break
+                if row.path in active:
+                    continue
+                used -= row.size
+                self._delete_meeting_audio(db, row, "quota")
+                removed += 1
+            db.commit()
+        return removed
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Một lượt dọn rác; an toàn khi nhiều process cùng chạy"""
+        now = datetime.now()
+        grace = timedelta(seconds=self.settings["orphan_grace"])
+        active = set(self.active_paths())
+        removed = {"expired_uploads": 0, "orphan_uploads": 0, "orphan_audio": 0, "orphan_transcriptions": 0,
+                   "orphan_waveforms": 0, "retention": 0, "quota": 0, "stale_index": 0}
+
+        with self.session_factory() as db:
+            # Upload: hết hạn, hoặc quá thời gian ân hạn mà không thuộc job nào
+            for row in db.query(StoredFile).filter(StoredFile.kind == UPLOAD).all():
+                if row.path in active:
+                    continue
+                expired = row.expires_at is not None and row.expires_at < now
+                if expired or row.created_at < now - grace:
+                    Path(row.path).unlink(missing_ok=True)
+                    db.delete(row)
+                    removed["expired_uploads" if expired else "orphan_uploads"] += 1
+
+            # Audio không còn là audio hiện tại của meeting nào
+            orphans = db.query(StoredFile).outerjoin(
+                Meeting, (Meeting.id == StoredFile.owner_id) & (Meeting.audio_file_path == StoredFile.path)
+            ).filter(
+                StoredFile.kind == MEETING_AUDIO, Meeting.id.is_(None), StoredFile.created_at < now - grace
+            ).all()
+            for row in orphans:
+                if row.path not in active:
+                    Path(row.path).unlink(missing_ok=True)
+                    db.delete(row)
+                    removed["orphan_audio"] += 1
+
+            # Transcript không còn là bản hiện tại hay một phiên bản của meeting nào
+            current = select(Meeting.id).where(Meeting.transcription_id == StoredFile.owner_id).exists()
+            versioned = select(Transcription.id).join(Meeting, Meeting.id == Transcription.meeting_id) \
+                .where(Transcription.id == StoredFile.owner_id).exists()
+            orphans = db.query(StoredFile).filter(
+                StoredFile.kind == TRANSCRIPTION, ~current, ~versioned, StoredFile.created_at < now - grace
+            ).all()
+            for row in orphans:
+                Path(row.path).unlink(missing_ok=True)
+                db.delete(row)
+                removed["orphan_transcriptions"] += 1
+
+            # Peak của file audio không còn là audio hiện tại của meeting
+            orphans = db.query(StoredFile).outerjoin(
+                Meeting, (Meeting.id == StoredFile.owner_id)
+                & (Meeting.audio_file_path + WAVEFORM_EXTENSION == StoredFile.path)
+            ).filter(
+                StoredFile.kind == WAVEFORM, Meeting.id.is_(None), StoredFile.created_at < now - grace
+            ).all()
+            for row in orphans:
+                Path(row.path).unlink(missing_ok=True)
+                db.delete(row)
+                removed["orphan_waveforms"] += 1
+
+            retention_days = self.settings["audio_retention_days"]
+            if retention_days:
+                expired = db.query(StoredFile).join(Meeting, Meeting.id == StoredFile.owner_id).filter(
+                    StoredFile.kind == MEETING_AUDIO,
+                    StoredFile.created_at < now - timedelta(days=retention_days),
+                    Meeting.transcription_id.isnot(None),
+                    Meeting.status == "completed",
+                ).all()
+                for row in expired:
+                    if row.path not in active:
+                        self._delete_meeting_audio(db, row, f"older than {retention_days:g} days")
+                        removed["retention"] += 1
+            db.commit()
+
+        # File trong UPLOAD_DIR chưa được ghi chỉ mục (crash trước khi register)
+        with self.session_factory() as db:
+            indexed = {p for (p,) in db.query(StoredFile.path).filter(StoredFile.kind == UPLOAD)}
+        cutoff = time.time() - self.settings["orphan_grace"]
+        if self.dirs[UPLOAD].exists():
+            for entry in os.scandir(self.dirs[UPLOAD]):
+                if entry.is_file() and entry.path not in indexed and entry.path not in active \
+                        and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed["orphan_uploads"] += 1
+
+        quota = self.settings["audio_quota_mb"] * 1024 * 1024
+        if quota:
+            removed["quota"] = self._enforce_quota(quota)
+
+        # Dòng chỉ mục của file bị xóa ngoài kho (vd: hàng đợi dọn file tạm)
+        with self.session_factory() as db:
+            for row in db.query(StoredFile).filter(StoredFile.created_at < now - grace).all():
+                if not os.path.exists(row.path):
+                    db.delete(row)
+                    removed["stale_index"] += 1
+            db.commit()
+
+        total = sum(removed.values())
+        if total:
+            logger.info(f"🧹 Storage GC removed {total} item(s): "
+                        + ", ".join(f"{k}={v}" for k, v in removed.items() if v))
+        return removed
+
+    # ---------- Chuyển dữ liệu cũ ----------
+
+    def migrate_legacy(self) -> Dict[str, int]:
+        """Chuyển file trong thư mục phẳng cũ sang cấu trúc shard và ghi chỉ mục"""
+        moved = {"meeting_audio": 0, "transcriptions": 0}
+        audio_dir, transcription_dir = self.dirs[MEETING_AUDIO], self.dirs[TRANSCRIPTION]
+        # Job đang chờ giữ đường dẫn cũ; các file này được chuyển ở lần chạy sau
+        active = {os.path.normpath(p) for p in self.active_paths()}
+
+        with self.session_factory() as db:
+            by_path = {}
+            for meeting in db.query(Meeting).filter(Meeting.audio_file_path.isnot(None)):
+                by_path[os.path.normpath(meeting.audio_file_path)] = meeting
+            if audio_dir.exists():
+                for entry in list(os.scandir(audio_dir)):
+                    if not entry.is_file() or os.path.normpath(entry.path) in active:
+                        continue
+                    meeting = by_path.get(os.path.normpath(entry.path))
+                    if meeting is None:
+                        # Không thuộc meeting nào: ghi chỉ mục để GC dọn
+                        self.register(MEETING_AUDIO, None, entry.path)
+                        continue
+                    match = LEGACY_AUDIO_STAMP.match(entry.name)
+                    stamp = match.group(1) if match else \
+                        datetime.fromtimestamp(entry.stat().st_mtime).strftime("%Y%m%d_%H%M%S")
+                    target = shard_dir(audio_dir, meeting.id) / f"{meeting.id}_{stamp}{Path(entry.name).suffix}"
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(entry.path, target)
+                    meeting.audio_file_path = str(target)
+                    db.commit()
+                    self.register(MEETING_AUDIO, meeting.id, target)
+                    moved["meeting_audio"] += 1
+
+        if transcription_dir.exists():
+            for entry in list(os.scandir(transcription_dir)):
+                name = Path(entry.name)
+                if not entry.is_file() or not name.stem.startswith("transcription_"):
+                    continue
+                transcription_id = name.stem[len("transcription_"):]
+                target = self.transcription_path(transcription_id, name.suffix)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if name.suffix == ".json":
+                    # Chuyển luôn sang .wtc để không còn JSON nằm trong shard
+                    try:
+                        target = migrate_file(entry.path, target.with_suffix(TRANSCRIPT_EXTENSION))
+                    except Exception as e:
+                        logger.error(f"❌ Could not convert {entry.name} to {TRANSCRIPT_EXTENSION}, moving as JSON: {e}")
+                if Path(entry.path).exists():
+                    os.replace(entry.path, target)
+                self.register(TRANSCRIPTION, transcription_id, target)
+                moved["transcriptions"] += 1
+
+        if any(moved.values()):
+            logger.info(f"📦 Migrated legacy storage: {moved['meeting_audio']} audio file(s), "
+                        f"{moved['transcriptions']} transcription(s)")
+        return moved
+
+    def has_legacy_files(self) -> bool:
+        """Còn file nằm trực tiếp trong thư mục gốc (layout cũ)"""
+        for kind in (MEETING_AUDIO, TRANSCRIPTION):
+            directory = self.dirs[kind]
+            if directory.exists():
+                with os.scandir(directory) as entries:
+                    if any(entry.is_file() for entry in entries):
+                        return True
+        return False
+
+
+def main():
+    import app as whisper_app
+
+    parser = argparse.ArgumentParser(description="Storage maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Chuyển file từ thư mục phẳng sang cấu trúc shard")
+    sub.add_parser("gc", help="Chạy một lượt dọn rác")
+    sub.add_parser("stats", help="Số file và dung lượng theo loại")
+    args = parser.parse_args()
+
+    storage = whisper_app.storage
+    if args.command == "migrate":
+        print(storage.migrate_legacy())
+    elif args.command == "gc":
+        print(storage.collect_garbage())
+    else:
+        print(storage.stats())
+
+
+if __name__ == "__main__":
+    main()
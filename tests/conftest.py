@@ -0,0 +1,85 @@
+# conftest.py - Chạy app với engine giả (WHISPER_BACKEND=fake), database và thư mục dữ liệu tạm
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORK_DIR = Path(tempfile.mkdtemp(prefix="whisper-tests-"))
+
+# Phải đặt trước khi import app: cấu hình được đọc lúc import
+os.environ["WHISPER_BACKEND"] = "fake"
+os.environ["FAKE_WHISPER_RTF"] = "0"
+os.environ["JOB_QUEUE_BACKEND"] = "local"
+os.environ["MEETING_TWO_PASS"] = "0"
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR / 'app.db'}"
+os.environ["UPLOAD_DIR"] = str(WORK_DIR / "uploads")
+os.environ["CHECKPOINT_DIR"] = str(WORK_DIR / "checkpoints")
+# Audio và transcript được lưu theo đường dẫn tương đối data/...
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(REPO_ROOT))
+
+import app as whisper_app  # noqa: E402
+from benchmarks.common import synthesize_speech_like, write_wav  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from job_queue import JobQueue  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def work_dir():
+    # Peak waveform được tính trong executor của app: đợi xong rồi mới xóa dữ liệu tạm
+    yield WORK_DIR
+    whisper_app.executor.shutdown(wait=True)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def audio_file() -> Path:
+    path = WORK_DIR / "sample.wav"
+    write_wav(path, synthesize_speech_like(30))
+    return path
+
+
+@pytest.fixture
+def queue(monkeypatch, tmp_path) -> JobQueue:
+    """Hàng đợi và checkpoint riêng cho mỗi test; không start() nên job chờ đến khi test tự chạy"""
+    monkeypatch.setattr("checkpoints.CHECKPOINT_DIR", tmp_path / "checkpoints")
+    q = JobQueue(max_depth=4, workers=2, per_client_limit=2)
+    monkeypatch.setattr(whisper_app, "job_queue", q)
+    monkeypatch.setattr(whisper_app, "transcription_tasks", {})
+    return q
+
+
+@pytest.fixture
+def client(queue) -> TestClient:
+    # Không dùng "with": lifespan sẽ start() hàng đợi và khôi phục checkpoint
+    return TestClient(whisper_app.app)
+
+
+@pytest.fixture
+def meeting_id(client) -> str:
+    response = client.post("/api/meetings", json={
+        "title": "Họp kế hoạch",
+        "start_time": "2026-01-05T09:00:00",
+        "end_time": "2026-01-05T10:00:00",
+        "organizer": "an@example.com",
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+@pytest.fixture
+def run_next_job(queue):
+    """Chạy job kế tiếp trong thread của test, như một worker của hàng đợi"""
+    def run():
+        job = queue._next_job()
+        assert job is not None
+        try:
+            job.func()
+        finally:
+            queue._finish(job)
+        return job
+    return run
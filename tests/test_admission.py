@@ -0,0 +1,67 @@
+# test_admission.py - Admission control: giới hạn mỗi client, độ sâu hàng đợi và lớp ưu tiên
+import pytest
+
+import app as whisper_app
+from job_queue import Job
+
+
+def submit(client, audio_file, client_id="alice", priority="adhoc"):
+    with open(audio_file, "rb") as f:
+        return client.post(
+            "/api/transcribe",
+            files={"file": ("sample.wav", f, "audio/wav")},
+            data={"priority": priority},
+            headers={"X-Client-ID": client_id},
+        )
+
+
+def test_per_client_limit_spans_priority_classes(client, audio_file):
+    assert submit(client, audio_file, priority="urgent").status_code == 202
+    assert submit(client, audio_file, priority="background").status_code == 202
+
+    response = submit(client, audio_file, priority="meeting")
+    assert response.status_code == 429
+    assert "limit 2" in response.json()["detail"]
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Client khác không bị ảnh hưởng
+    assert submit(client, audio_file, client_id="bob").status_code == 202
+
+
+def test_full_queue_rejects_every_client(client, audio_file):
+    for client_id in ("alice", "alice", "bob", "bob"):
+        assert submit(client, audio_file, client_id=client_id).status_code == 202
+
+    response = submit(client, audio_file, client_id="carol", priority="urgent")
+    assert response.status_code == 429
+    assert "queue is full" in response.json()["detail"]
+
+
+def test_rejected_upload_leaves_nothing_behind(client, queue, audio_file):
+    submit(client, audio_file)
+    submit(client, audio_file)
+    uploads = set(whisper_app.UPLOAD_DIR.iterdir())
+
+    assert submit(client, audio_file).status_code == 429
+    assert set(whisper_app.UPLOAD_DIR.iterdir()) == uploads
+    assert len(queue.client_jobs("alice")) == 2
+
+
+def test_refinement_is_not_client_selectable(client, queue, audio_file):
+    assert submit(client, audio_file, priority="refinement").status_code == 422
+    assert queue.stats()["queued"] == 0
+
+
+def test_idle_jobs_do_not_count_against_admission(client, queue, audio_file):
+    for n in range(queue.max_depth + 1):
+        queue.submit(Job(id=f"refine-{n}", client_id="alice", func=lambda: None, priority="refinement"))
+
+    assert submit(client, audio_file).status_code == 202
+    assert submit(client, audio_file).status_code == 202
+    assert submit(client, audio_file).status_code == 429
+
+
+def test_unknown_priority_is_rejected_by_the_queue(queue):
+    with pytest.raises(ValueError):
+        queue.submit(Job(id="x", client_id="alice", func=lambda: None, priority="vip"))
+
@@ -0,0 +1,133 @@
+# test_cancel.py - Hủy job đang chờ và đang chạy qua DELETE /api/tasks/{id}
+import pytest
+
+import app as whisper_app
+from checkpoints import JobCheckpoint
+
+
+def upload(client, audio_file):
+    with open(audio_file, "rb") as f:
+        response = client.post("/api/transcribe", files={"file": ("sample.wav", f, "audio/wav")})
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+def record(client, meeting_id, audio_file):
+    with open(audio_file, "rb") as f:
+        response = client.post(
+            f"/api/meetings/{meeting_id}/record-audio", files={"file": ("sample.wav", f, "audio/wav")}
+        )
+    assert response.status_code == 200
+    return response.json()["task_id"]
+
+
+def start(queue, task_id):
+    """Lấy job ra khỏi hàng đợi như worker nhưng chưa chạy hàm xử lý"""
+    job = queue._next_job()
+    assert job.id == task_id
+    return job
+
+
+def finish(queue, job):
+    try:
+        job.func()
+    finally:
+        queue._finish(job)
+
+
+def cancel(client, task_id):
+    response = client.delete(f"/api/tasks/{task_id}")
+    assert response.json() == {"status": "cancelled", "task_id": task_id}
+
+
+def meeting_status(client, meeting_id):
+    return client.get(f"/api/meetings/{meeting_id}").json()["status"]
+
+
+def versions(client, meeting_id):
+    return {v["transcription_id"]: v for v in client.get(f"/api/meetings/{meeting_id}/transcriptions").json()["versions"]}
+
+
+@pytest.fixture
+def recorded_meeting(client, queue, meeting_id, audio_file, run_next_job):
+    """Cuộc họp đã có audio và bản phiên âm đầu tiên"""
+    record(client, meeting_id, audio_file)
+    run_next_job()
+    assert meeting_status(client, meeting_id) == "completed"
+    return meeting_id
+
+
+def test_cancel_queued_transcription(client, queue, audio_file):
+    task_id = upload(client, audio_file)
+    upload_path = whisper_app.storage.upload_path(task_id, "sample.wav")
+    assert upload_path.exists()
+
+    cancel(client, task_id)
+
+    assert client.get(f"/api/tasks/{task_id}").json()["status"] == "cancelled"
+    assert queue.stats()["queued"] == 0
+    assert not upload_path.exists()
+    assert not JobCheckpoint(task_id).exists()
+
+
+def test_cancel_running_transcription(client, queue, audio_file):
+    task_id = upload(client, audio_file)
+    job = start(queue, task_id)
+
+    cancel(client, task_id)
+    assert job.cancel_event.is_set()
+    finish(queue, job)
+
+    task = client.get(f"/api/tasks/{task_id}").json()
+    assert task["status"] == "cancelled"
+    assert task.get("result") is None
+    assert not JobCheckpoint(task_id).exists()
+    assert queue.stats()["cancelled"] == 1
+
+
+def test_cancel_queued_meeting_job_resets_meeting(client, queue, meeting_id, audio_file):
+    task_id = record(client, meeting_id, audio_file)
+    assert meeting_status(client, meeting_id) == "in_progress"
+
+    cancel(client, task_id)
+
+    assert meeting_status(client, meeting_id) == "scheduled"
+    assert not JobCheckpoint(task_id).exists()
+
+
+def test_cancel_running_meeting_job_resets_meeting(client, queue, meeting_id, audio_file):
+    task_id = record(client, meeting_id, audio_file)
+    job = start(queue, task_id)
+
+    cancel(client, task_id)
+    finish(queue, job)
+
+    assert client.get(f"/api/tasks/{task_id}").json()["status"] == "cancelled"
+    meeting = client.get(f"/api/meetings/{meeting_id}").json()
+    assert meeting["status"] == "scheduled"
+    assert meeting["transcription_id"] is None
+
+
+def test_cancel_queued_retranscription_cancels_version(client, queue, recorded_meeting):
+    response = client.post(f"/api/meetings/{recorded_meeting}/retranscribe")
+    task_id = response.json()["task_id"]
+    assert versions(client, recorded_meeting)[task_id]["status"] == "queued"
+
+    cancel(client, task_id)
+
+    assert versions(client, recorded_meeting)[task_id]["status"] == "cancelled"
+    assert meeting_status(client, recorded_meeting) == "completed"
+
+
+def test_cancel_running_retranscription_keeps_current_version(client, queue, recorded_meeting):
+    current = client.get(f"/api/meetings/{recorded_meeting}").json()["transcription_id"]
+    task_id = client.post(f"/api/meetings/{recorded_meeting}/retranscribe").json()["task_id"]
+    job = start(queue, task_id)
+
+    cancel(client, task_id)
+    finish(queue, job)
+
+    listed = versions(client, recorded_meeting)
+    assert listed[task_id]["status"] == "cancelled"
+    assert listed[current]["current"]
+    assert meeting_status(client, recorded_meeting) == "completed"
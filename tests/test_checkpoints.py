@@ -0,0 +1,110 @@
+# test_checkpoints.py - Checkpoint JSONL: đọc lại sau crash và tiếp tục job từ segment cuối
+import json
+
+import pytest
+
+import app as whisper_app
+from checkpoints import JobCheckpoint
+
+CHECKPOINTED = 2
+
+
+def upload(client, audio_file):
+    with open(audio_file, "rb") as f:
+        response = client.post("/api/transcribe", files={"file": ("sample.wav", f, "audio/wav")})
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+def crash(queue, task_id, segments, torn: str):
+    """Giả lập process bị kill giữa lúc ghi: job mất khỏi bộ nhớ, checkpoint còn dòng cuối ghi dở"""
+    assert queue.remove(task_id)
+    whisper_app.transcription_tasks.clear()
+    checkpoint = JobCheckpoint(task_id)
+    checkpoint.start_attempt()
+    checkpoint.record_info("vi", 0.95)
+    for segment in segments:
+        checkpoint.append_segment(segment)
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write(torn)
+    return checkpoint
+
+
+@pytest.fixture
+def reference(client, queue, audio_file, run_next_job):
+    """Segment của một lần chạy không bị gián đoạn"""
+    task_id = upload(client, audio_file)
+    run_next_job()
+    segments = client.get(f"/api/tasks/{task_id}").json()["result"]["segments"]
+    assert len(segments) > CHECKPOINTED
+    return segments
+
+
+def test_load_drops_torn_last_line(tmp_path, monkeypatch):
+    monkeypatch.setattr("checkpoints.CHECKPOINT_DIR", tmp_path)
+    checkpoint = JobCheckpoint.create("job-1", "transcription", audio_path="a.wav")
+    checkpoint.start_attempt()
+    checkpoint.append_segment({"id": 0, "start": 0.0, "end": 4.0, "text": "xin chào"})
+    checkpoint.close()
+    intact = checkpoint.path.stat().st_size
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"type": "segment", "id": 1, "start": 4.0, "te')
+
+    state = checkpoint.load()
+
+    assert state.attempts == 1
+    assert [s["id"] for s in state.segments] == [0]
+    assert state.resume_from == 4.0
+    # Dòng ghi dở bị cắt nên lần ghi tiếp vẫn là JSONL hợp lệ
+    assert checkpoint.path.stat().st_size == intact
+    checkpoint.append_segment({"id": 1, "start": 4.0, "end": 8.0, "text": "mọi người"})
+    checkpoint.close()
+    assert [s["id"] for s in checkpoint.load().segments] == [0, 1]
+
+
+def test_load_without_header_is_none(tmp_path, monkeypatch):
+    monkeypatch.setattr("checkpoints.CHECKPOINT_DIR", tmp_path)
+    checkpoint = JobCheckpoint("job-2")
+    checkpoint.path.write_text('{"type": "jo')
+
+    assert checkpoint.load() is None
+
+
+def test_resume_from_torn_checkpoint(client, queue, audio_file, reference, run_next_job):
+    task_id = upload(client, audio_file)
+    torn = json.dumps({"type": "segment", **reference[CHECKPOINTED]})[:40]
+    checkpoint = crash(queue, task_id, reference[:CHECKPOINTED], torn)
+
+    assert whisper_app.recover_interrupted_jobs() == 1
+    assert client.get(f"/api/tasks/{task_id}").json()["status"] == "queued"
+    run_next_job()
+
+    task = client.get(f"/api/tasks/{task_id}").json()
+    assert task["status"] == "completed"
+    segments = task["result"]["segments"]
+    assert [s["id"] for s in segments] == list(range(len(segments)))
+    assert [s["text"] for s in segments[:CHECKPOINTED]] == [s["text"] for s in reference[:CHECKPOINTED]]
+    # Chỉ phần audio sau segment cuối đã checkpoint được decode lại
+    resume_from = reference[CHECKPOINTED - 1]["end"]
+    assert all(s["start"] >= resume_from - 0.01 for s in segments[CHECKPOINTED:])
+    assert len(segments) > CHECKPOINTED
+    assert segments[-1]["end"] == pytest.approx(reference[-1]["end"], abs=1.0)
+    assert not checkpoint.exists()
+
+
+def test_resume_gives_up_after_max_attempts(client, queue, audio_file):
+    task_id = upload(client, audio_file)
+    checkpoint = crash(queue, task_id, [], "")
+    for _ in range(whisper_app.MAX_RESUME_ATTEMPTS - 1):
+        checkpoint.start_attempt()
+    checkpoint.close()
+
+    assert whisper_app.recover_interrupted_jobs() == 0
+
+    task = client.get(f"/api/tasks/{task_id}").json()
+    assert task["status"] == "failed"
+    assert "interrupted" in task["error"]
+    assert queue.stats()["queued"] == 0
+    assert not checkpoint.exists()
+    assert not whisper_app.storage.upload_path(task_id, "sample.wav").exists()
@@ -0,0 +1,144 @@
+# test_db_queue.py - Hàng đợi trong database: lease hết hạn khi worker chết
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as whisper_app
+from db_queue import DatabaseJobQueue
+from job_queue import Job
+from models import Meeting, Transcription, TranscriptionJob
+from transcript_versions import add_version
+
+LEASE = 60
+
+
+@pytest.fixture
+def db_queue(queue):
+    """Bảng transcription_jobs trống; `queue` cho checkpoint một thư mục riêng của test"""
+    with whisper_app.SessionLocal() as db:
+        db.query(TranscriptionJob).delete()
+        db.commit()
+    return DatabaseJobQueue(whisper_app.SessionLocal, max_attempts=2, max_depth=10, per_client_limit=10)
+
+
+def submit(db_queue, kind="transcription", meeting_id=None, job_id=None):
+    job_id = job_id or str(uuid.uuid4())
+    db_queue.submit(Job(id=job_id, client_id="alice", func=None, audio_duration=30.0, payload={
+        "kind": kind, "audio_path": "missing.wav", "meeting_id": meeting_id,
+    }))
+    return job_id
+
+
+def expire(job_id):
+    """Worker giữ job chết: không còn heartbeat nên lease trôi qua"""
+    with whisper_app.SessionLocal() as db:
+        db.get(TranscriptionJob, job_id).lease_expires_at = datetime.now() - timedelta(seconds=1)
+        db.commit()
+
+
+def row(job_id) -> TranscriptionJob:
+    with whisper_app.SessionLocal() as db:
+        return db.get(TranscriptionJob, job_id)
+
+
+def set_meeting_status(meeting_id, status):
+    with whisper_app.SessionLocal() as db:
+        db.get(Meeting, meeting_id).status = status
+        db.commit()
+
+
+def meeting_status(meeting_id):
+    with whisper_app.SessionLocal() as db:
+        return db.get(Meeting, meeting_id).status
+
+
+def test_expired_lease_requeues_job_for_another_worker(db_queue):
+    job_id = submit(db_queue)
+    assert db_queue.claim("w1", LEASE)["attempts"] == 1
+    assert db_queue.claim("w2", LEASE) is None
+
+    expire(job_id)
+    claimed = db_queue.claim("w2", LEASE)
+
+    assert claimed["id"] == job_id
+    assert claimed["attempts"] == 2
+    # Worker cũ mất quyền: không gia hạn, không ghi được kết quả
+    assert db_queue.heartbeat(job_id, "w1", LEASE) == (False, False)
+    assert not db_queue.finish(job_id, "w1", "completed", result={"text": "stale"})
+    assert db_queue.finish(job_id, "w2", "completed", result={"text": "ok"})
+    assert row(job_id).status == "completed"
+    assert row(job_id).worker_id == "w2"
+
+
+def test_heartbeat_keeps_lease(db_queue):
+    job_id = submit(db_queue)
+    db_queue.claim("w1", 0.5)
+
+    assert db_queue.heartbeat(job_id, "w1", LEASE) == (True, False)
+    assert row(job_id).lease_expires_at > datetime.now() + timedelta(seconds=LEASE - 5)
+    assert db_queue.claim("w2", LEASE) is None
+
+
+def test_released_job_does_not_use_an_attempt(db_queue):
+    job_id = submit(db_queue)
+    db_queue.claim("w1", LEASE)
+
+    assert db_queue.release(job_id, "w1")
+    assert db_queue.claim("w2", LEASE)["attempts"] == 1
+
+
+def test_job_fails_after_max_attempts(db_queue, meeting_id):
+    set_meeting_status(meeting_id, "in_progress")
+    job_id = submit(db_queue, kind="meeting", meeting_id=meeting_id)
+    for _ in range(db_queue.max_attempts):
+        assert db_queue.claim("w1", LEASE)["id"] == job_id
+        expire(job_id)
+
+    assert db_queue.claim("w2", LEASE) is None
+
+    failed = row(job_id)
+    assert failed.status == "failed"
+    assert failed.error == f"Worker lost {db_queue.max_attempts} times, giving up"
+    assert failed.worker_id is None
+    assert meeting_status(meeting_id) == "failed"
+
+
+def test_lost_retranscription_fails_its_version_only(db_queue, meeting_id):
+    set_meeting_status(meeting_id, "completed")
+    with whisper_app.SessionLocal() as db:
+        job_id = add_version(db, str(uuid.uuid4()), db.get(Meeting, meeting_id)).id
+    submit(db_queue, kind="retranscribe", meeting_id=meeting_id, job_id=job_id)
+    for _ in range(db_queue.max_attempts):
+        db_queue.claim("w1", LEASE)
+        expire(job_id)
+
+    db_queue.claim("w2", LEASE)
+
+    with whisper_app.SessionLocal() as db:
+        assert db.get(Transcription, job_id).status == "failed"
+    assert meeting_status(meeting_id) == "completed"
+
+
+def test_cancel_requested_before_worker_died(db_queue, meeting_id):
+    set_meeting_status(meeting_id, "in_progress")
+    job_id = submit(db_queue, kind="meeting", meeting_id=meeting_id)
+    db_queue.claim("w1", LEASE)
+    assert db_queue.cancel(job_id) == "cancelling"
+
+    expire(job_id)
+    assert db_queue.claim("w2", LEASE) is None
+
+    assert row(job_id).status == "cancelled"
+    assert meeting_status(meeting_id) == "scheduled"
+
+
+def test_cancel_queued_job(db_queue, meeting_id):
+    set_meeting_status(meeting_id, "in_progress")
+    job_id = submit(db_queue, kind="meeting", meeting_id=meeting_id)
+
+    assert db_queue.cancel(job_id) == "dequeued"
+
+    assert row(job_id).status == "cancelled"
+    assert meeting_status(meeting_id) == "scheduled"
+    assert db_queue.claim("w1", LEASE) is None
@@ -0,0 +1,435 @@
+# transcript_store.py - Định dạng lưu bản phiên âm dạng cột, nén, đọc từng cột
+"""
+Bản phiên âm JSON (``indent=2``, mỗi segment/word là một dict) tốn dung lượng
+và RAM gấp nhiều lần dữ liệu thật. File ``.wtc`` lưu mỗi trường của segment
+thành một cột nén riêng:
+
+- số: mảng packed (``array``) kiểu nhỏ nhất không mất dữ liệu: số nguyên
+  uint8/16/32, thời gian chính xác tới ms thành int32 mili giây, xác suất
+  từ model (vốn là float32) thành float32, còn lại float64
+- chuỗi: độ dài uint32 + UTF-8 nối liền
+- danh sách số (``tokens``): số phần tử mỗi segment + mảng packed
+- danh sách dict (``words``): số phần tử mỗi segment + các cột con
+- còn lại: JSON
+
+Bố cục file: ``WTC1`` | uint32 độ dài header | header JSON | các cột nén.
+Header chứa codec (zstd nếu có ``zstandard``, ngược lại zlib/deflate), số segment
+và vị trí từng cột, nên reader chỉ giải nén các cột được yêu cầu.
+
+File JSON cũ vẫn đọc được qua ``read_transcript``; chuyển đổi hàng loạt:
+
+    python -m transcript_store migrate data/transcriptions
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import struct
+import zlib
+import sys
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd là tùy chọn; zlib (deflate như gzip) luôn có sẵn
+    zstandard = None
+
+logger = logging.getLogger("whisper-api")
+
+MAGIC = b"WTC1"
+EXTENSION = ".wtc"
+TRANSCRIPT_CODEC = os.environ.get("TRANSCRIPT_CODEC", "zstd" if zstandard else "zlib")
+
+_MISSING = object()
+
+
+# ---------- Codec ----------
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd codec requires the zstandard package")
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise ValueError(f"Unknown transcript codec: {codec}")
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transcript is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown transcript codec: {codec}")
+
+
+# ---------- Encoding các cột ----------
+
+def _int_typecode(values) -> Optional[str]:
+    """Kiểu packed nhỏ nhất chứa được mọi giá trị (token id vừa uint16)"""
+    low, high = min(values, default=0), max(values, default=0)
+    for code in ("B", "H", "I", "Q") if low >= 0 else ("b", "h", "i", "q"):
+        bits = array(code).itemsize * 8
+        lo, hi = (0, 2 ** bits - 1) if code.isupper() else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+        if lo <= low and high <= hi:
+            return code
+    return None
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return value is None or _is_int(value) or isinstance(value, float)
+
+
+def _encode_strings(values: List[str]) -> bytes:
+    encoded = [v.encode("utf-8") for v in values]
+    return array("I", [len(v) for v in encoded]).tobytes() + b"".join(encoded)
+
+
+def _decode_strings(data: bytes, count: int) -> List[str]:
+    lengths = array("I")
+    lengths.frombytes(data[:count * lengths.itemsize])
+    position = count * lengths.itemsize
+    values = []
+    for length in lengths:
+        values.append(data[position:position + length].decode("utf-8"))
+        position += length
+    return values
+
+
+def _encode_scalars(name: str, values: list):
+    """(spec, payload) cho một cột giá trị đơn; None nếu phải lưu JSON"""
+    if any(v is _MISSING for v in values):
+        return None
+    if all(_is_int(v) for v in values):
+        code = _int_typecode(values)
+        if code:
+            return {"type": "int", "dtype": code}, array(code, values).tobytes()
+        return None
+    if all(_is_number(v) for v in values):
+        present = [v for v in values if v is not None]
+        millis = [round(v * 1000) for v in present]
+        if all(abs(m) < 2 ** 31 and m / 1000 == v for m, v in zip(millis, present)):
+            # Chính xác tới ms: int32 mili giây (null = INT32_MIN)
+            packed = [round(v * 1000) if v is not None else -2 ** 31 for v in values]
+            return {"type": "float", "dtype": "i", "scale": 1000}, array("i", packed).tobytes()
+        packed = [float(v) if v is not None else math.nan for v in values]
+        code = "f" if array("f", packed).tolist() == packed else "d"
+        return {"type": "float", "dtype": code}, array(code, packed).tobytes()
+    if all(isinstance(v, str) for v in values):
+        return {"type": "str"}, _encode_strings(values)
+    return None
+
+
+def _decode_scalars(spec: dict, data: bytes, count: int) -> list:
+    kind = spec["type"]
+    if kind == "str":
+        return _decode_strings(data, count)
+    values = array(spec["dtype"])
+    values.frombytes(data)
+    if kind == "int":
+        return values.tolist()
+    scale = spec.get("scale")
+    if scale:
+        return [v / scale if v != -2 ** 31 else None for v in values]
+    return [None if math.isnan(v) else v for v in values]
+
+
+class _Writer:
+    """Gom các cột đã nén để ghi vào một file"""
+
+    def __init__(self, codec: str):
+        self.codec = codec
+        self.columns = {}
+        self.blobs = []
+        self.offset = 0
+
+    def add(self, name: str, spec: dict, payload: bytes):
+        blob = _compress(payload, self.codec)
+        self.columns[name] = {**spec, "offset": self.offset, "size": len(blob)}
+        self.blobs.append(blob)
+        self.offset += len(blob)
+
+    def add_json(self, name: str, value):
+        self.add(name, {"type": "json"}, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def add_values(self, name: str, values: list):
+        encoded = _encode_scalars(name, values)
+        if encoded is None:
+            self.add_json(name, [None if v is _MISSING else v for v in values])
+        else:
+            self.add(name, *encoded)
+
+    def add_field(self, name: str, values: list):
+        """Một trường của segment; danh sách được tách thành counts + cột phẳng"""
+        lists = [v for v in values if v is not _MISSING]
+        if not lists or not all(isinstance(v, list) for v in lists):
+            self.add_values(name, values)
+            return
+        flat = [item for v in lists for item in v]
+        # -1: segment không có trường này (khác với danh sách rỗng)
+        counts = [len(v) if v is not _MISSING else -1 for v in values]
+        if all(_is_number(item) and item is not None for item in flat):
+            self.add(f"{name}#count", *_encode_scalars(f"{name}#count", counts))
+            self.add_values(name, flat)
+            return
+        if flat and all(isinstance(item, dict) for item in flat):
+            keys = list(dict.fromkeys(k for item in flat for k in item))
+            self.add(f"{name}#count", *_encode_scalars(f"{name}#count", counts))
+            for key in keys:
+                self.add_values(f"{name}.{key}", [item.get(key, _MISSING) for item in flat])
+            self.columns[f"{name}#count"]["keys"] = keys
+            return
+        self.add_json(name, [None if v is _MISSING else v for v in values])
+
+    def to_bytes(self, header: dict) -> bytes:
+        header = {**header, "codec": self.codec, "columns": self.columns}
+        encoded = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return MAGIC + struct.pack("<I", len(encoded)) + encoded + b"".join(self.blobs)
+
+
+def encode_transcript(data: dict, codec: Optional[str] = None) -> bytes:
+    """Mã hóa một bản phiên âm ``{"segments": [...], ...}`` thành bytes ``.wtc``"""
+    segments = data.get("segments") or []
+    writer = _Writer(codec or TRANSCRIPT_CODEC)
+    fields = list(dict.fromkeys(k for seg in segments for k in seg))
+    for name in fields:
+        writer.add_field(name, [seg.get(name, _MISSING) for seg in segments])
+
+    meta = {k: v for k, v in data.items() if k != "segments"}
+    texts = [seg.get("text") for seg in segments]
+    full_text_derived = "full_text" in meta and all(isinstance(t, str) for t in texts) \
+        and meta["full_text"] == " ".join(texts)
+    if full_text_derived:
+        # full_text = nối text các segment; không lưu hai lần
+        meta.pop("full_text")
+    writer.add_json("#meta", meta)
+    return writer.to_bytes({
+        "version": 1,
+        "count": len(segments),
+        "fields": fields,
+        "meta_keys": list(data),
+        "full_text": "derived" if full_text_derived else None,
+    })
+
+
+# ---------- Đọc ----------
+
+class CompactTranscript:
+    """Bản phiên âm đã mã hóa; chỉ giải nén các cột được đọc"""
+
+    def __init__(self, blob: bytes):
+        if blob[:4] != MAGIC:
+            raise ValueError("Not a compact transcript")
+        (header_len,) = struct.unpack_from("<I", blob, 4)
+        self.header = json.loads(blob[8:8 + header_len].decode("utf-8"))
+        self._data = memoryview(blob)[8 + header_len:]
+        self.count = self.header["count"]
+        self.fields = self.header["fields"]
+
+    @classmethod
+    def from_dict(cls, data: dict, codec: Optional[str] = None) -> "CompactTranscript":
+        return cls(encode_transcript(data, codec))
+
+    @classmethod
+    def from_file(cls, path) -> "CompactTranscript":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data)
+
+    def _raw(self, name: str) -> bytes:
+        spec = self.header["columns"][name]
+        return _decompress(self._data[spec["offset"]:spec["offset"] + spec["size"]], self.header["codec"])
+
+    def _values(self, name: str, count: int) -> list:
+        spec = self.header["columns"][name]
+        raw = self._raw(name)
+        if spec["type"] == "json":
+            return json.loads(raw.decode("utf-8"))
+        return _decode_scalars(spec, raw, count)
+
+    def column(self, name: str) -> list:
+        """Giá trị của trường `name` cho mọi segment (None nếu segment không có)"""
+        columns = self.header["columns"]
+        if name not in self.fields:
+            raise KeyError(name)
+        if f"{name}#count" not in columns:
+            return self._values(name, self.count)
+
+        counts = self._values(f"{name}#count", self.count)
+        total = sum(c for c in counts if c > 0)
+        keys = columns[f"{name}#count"].get("keys")
+        if keys:
+            sub = [self._values(f"{name}.{key}", total) for key in keys]
+            items = [dict(zip(keys, row)) for row in zip(*sub)]
+        else:
+            items = self._values(name, total)
+        values, position = [], 0
+        for c in counts:
+            if c < 0:
+                values.append(None)
+            else:
+                values.append(items[position:position + c])
+                position += c
+        return values
+
+    @property
+    def meta(self) -> dict:
+        meta = json.loads(self._raw("#meta").decode("utf-8"))
+        if self.header.get("full_text") == "derived":
+            meta["full_text"] = " ".join(self.column("text"))
+        return meta
+
+    def segments(self, fields: Optional[Iterable[str]] = None) -> List[dict]:
+        """Danh sách segment chỉ với các trường `fields` (mặc định tất cả)"""
+        names = [f for f in self.fields if fields is None or f in set(fields)]
+        columns = {}
+        present = {}
+        for name in names:
+            columns[name] = self.column(name)
+            if f"{name}#count" in self.header["columns"]:
+                # Trường danh sách có thể vắng ở một số segment
+                present[name] = [v is not None for v in columns[name]]
+        segments = []
+        for i in range(self.count):
+            segments.append({
+                name: columns[name][i] for name in names
+                if name not in present or present[name][i]
+            })
+        return segments
+
+    def to_dict(self, segment_fields: Optional[Iterable[str]] = None) -> dict:
+        """Dict cùng cấu trúc với bản JSON gốc"""
+        meta = self.meta
+        data = {}
+        for key in self.header.get("meta_keys", []):
+            data[key] = self.segments(segment_fields) if key == "segments" else meta.get(key)
+        return data
+
+
+# ---------- File ----------
+
+def write_transcript(path, data: dict, codec: Optional[str] = None) -> Path:
+    """Ghi `data` thành file ``.wtc`` (ghi file tạm rồi đổi tên)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(encode_transcript(data, codec))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_transcript(path, segment_fields: Optional[Iterable[str]] = None) -> dict:
+    """Đọc bản phiên âm ``.wtc`` hoặc JSON cũ"""
+    path = Path(path)
+    if path.suffix == EXTENSION:
+        return CompactTranscript.from_file(path).to_dict(segment_fields)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if segment_fields is not None:
+        wanted = set(segment_fields)
+        data["segments"] = [{k: v for k, v in seg.items() if k in wanted} for seg in data.get("segments", [])]
+    return data
+
+
+def find_transcript(directory, stem: str) -> Optional[Path]:
+    """File của bản phiên âm `stem` (ưu tiên ``.wtc``), None nếu không có"""
+    for suffix in (EXTENSION, ".json"):
+        path = Path(directory) / f"{stem}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def migrate_file(path, target=None, codec: Optional[str] = None, keep_json: bool = False) -> Path:
+    """Chuyển một file JSON sang ``.wtc`` (mặc định cạnh file gốc), trả về file mới.
+
+    Lỗi thì không để lại file đích và giữ nguyên file JSON.
+    """
+    path = Path(path)
+    target = Path(target) if target is not None else path.with_suffix(EXTENSION)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        write_transcript(target, data, codec)
+        # Kiểm tra đọc lại trước khi xóa bản gốc
+        if CompactTranscript.from_file(target).count != len(data.get("segments") or []):
+            raise ValueError("segment count mismatch after migration")
+    except Exception:
+        target.unlink(missing_ok=True)
+        raise
+    if not keep_json:
+        path.unlink()
+    return target
+
+
+def migrate_directory(directory, codec: Optional[str] = None, keep_json: bool = False,
+                      on_migrated: Optional[Callable[[Path, Path], None]] = None) -> dict:
+    """Chuyển mọi file JSON trong `directory` (kể cả thư mục shard con) sang ``.wtc``.
+
+    `on_migrated(json_path, wtc_path)` được gọi sau mỗi file chuyển xong (vd: cập nhật chỉ mục).
+    """
+    stats = {"migrated": 0, "skipped": 0, "failed": 0, "json_bytes": 0, "compact_bytes": 0}
+    for path in sorted(Path(directory).rglob("*.json")):
+        target = path.with_suffix(EXTENSION)
+        if target.exists():
+            stats["skipped"] += 1
+            continue
+        json_bytes = path.stat().st_size
+        try:
+            migrate_file(path, target, codec, keep_json)
+        except Exception as e:
+            logger.error(f"❌ Could not migrate {path}: {e}")
+            stats["failed"] += 1
+            continue
+        stats["migrated"] += 1
+        stats["json_bytes"] += json_bytes
+        stats["compact_bytes"] += target.stat().st_size
+        if on_migrated is not None:
+            on_migrated(path, target)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact transcript storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Chuyển file JSON cũ sang định dạng .wtc")
+    migrate.add_argument("directory", nargs="?", default="data/transcriptions")
+    migrate.add_argument("--codec", choices=["zstd", "zlib"], default=None)
+    migrate.add_argument("--keep-json", action="store_true", help="Giữ lại file JSON gốc")
+    dump = sub.add_parser("dump", help="In bản phiên âm ra JSON")
+    dump.add_argument("path")
+    dump.add_argument("--fields", help="Chỉ các trường segment này, vd: start,end,text")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        # Chỉ mục stored_files phải trỏ tới file .wtc mới (storage.py)
+        import app as whisper_app
+        stats = migrate_directory(args.directory, args.codec, args.keep_json,
+                                  on_migrated=whisper_app.storage.register_converted_transcript)
+        ratio = stats["json_bytes"] / stats["compact_bytes"] if stats["compact_bytes"] else 0
+        print(f"Migrated {stats['migrated']} file(s), skipped {stats['skipped']}, failed {stats['failed']}: "
+              f"{stats['json_bytes']} -> {stats['compact_bytes']} bytes ({ratio:.1f}x)")
+        sys.exit(1 if stats["failed"] else 0)
+    else:
+        fields = args.fields.split(",") if args.fields else None
+        json.dump(read_transcript(args.path, fields), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
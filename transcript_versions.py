@@ -0,0 +1,138 @@
+# transcript_versions.py - Các phiên bản bản phiên âm của cuộc họp và so sánh hai phiên bản
+"""
+Mỗi lần audio cuộc họp được phiên âm (khi upload, hoặc phiên âm lại với
+``TranscriptionOptions`` khác qua ``POST /api/meetings/{id}/retranscribe``)
+tạo một dòng ``transcriptions`` với ``version`` tăng dần theo cuộc họp.
+``meetings.transcription_id`` trỏ tới phiên bản hiện tại: phiên bản đang
+chạy (``processing``) chỉ thay phiên bản hiện tại khi đã xong, nên bản cũ
+vẫn đọc được trong lúc chờ và vẫn giữ lại sau đó (GC của storage không xóa
+file của phiên bản còn dòng trong bảng).
+
+``diff_transcripts`` so sánh hai phiên bản theo từ (difflib) để so model
+trên dữ liệu thật: tỉ lệ lỗi từ gần đúng của bản này so với bản kia và các
+chỗ khác nhau kèm mốc thời gian trong từng bản.
+"""
+import difflib
+import json
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import Meeting, Transcription
+
+VERSION_QUEUED = "queued"
+VERSION_PROCESSING = "processing"
+VERSION_COMPLETED = "completed"
+VERSION_FAILED = "failed"
+VERSION_CANCELLED = "cancelled"
+
+# Bỏ dấu câu khi so từ ("họp." và "họp" là một từ)
+_PUNCTUATION = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def adopt_legacy(db, meeting: Meeting) -> Optional[Transcription]:
+    """Dòng phiên bản 1 cho transcript hiện tại của meeting tạo trước khi có phiên bản"""
+    if not meeting.transcription_id:
+        return None
+    row = db.get(Transcription, meeting.transcription_id)
+    if row is not None:
+        return row
+    row = Transcription(id=meeting.transcription_id, meeting_id=meeting.id, version=1, status=VERSION_COMPLETED,
+                        file_name=meeting.audio_file_name, created_at=meeting.updated_at or datetime.now())
+    db.add(row)
+    db.flush()
+    return row
+
+
+def add_version(db, transcription_id: str, meeting: Meeting, status: str = VERSION_QUEUED,
+                options: Optional[dict] = None, **fields) -> Transcription:
+    """Thêm phiên bản mới (số phiên bản kế tiếp của meeting) và commit"""
+    adopt_legacy(db, meeting)
+    for attempt in range(2):
+        version = (db.query(func.max(Transcription.version))
+                   .filter(Transcription.meeting_id == meeting.id).scalar() or 0) + 1
+        row = Transcription(
+            id=transcription_id, meeting_id=meeting.id, version=version, status=status,
+            file_name=meeting.audio_file_name, options=json.dumps(options) if options else None,
+            created_at=datetime.now(), **fields
+        )
+        try:
+            with db.begin_nested():
+                db.add(row)
+            db.commit()
+            return row
+        except IntegrityError:
+            if attempt:
+                raise
+            # Request khác vừa lấy cùng số phiên bản: lấy lại số mới
+    return row
+
+
+def list_versions(db, meeting: Meeting) -> List[Transcription]:
+    adopt_legacy(db, meeting)
+    db.commit()
+    return db.query(Transcription).filter(Transcription.meeting_id == meeting.id) \
+        .order_by(Transcription.version).all()
+
+
+def version_dict(row: Transcription, current_id: Optional[str]) -> dict:
+    return {
+        "transcription_id": row.id,
+        "version": row.version,
+        "status": row.status or VERSION_COMPLETED,
+        "current": row.id == current_id,
+        "model": row.model,
+        "options": json.loads(row.options) if row.options else None,
+        "language": row.language,
+        "duration": row.duration,
+        "error": row.error,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+
+def _words(transcript: dict) -> List[tuple]:
+    """(từ đã chuẩn hóa, từ gốc, giây bắt đầu của segment chứa từ)"""
+    words = []
+    for segment in transcript.get("segments", []):
+        for word in segment.get("text", "").split():
+            key = _PUNCTUATION.sub("", word).casefold()
+            if key:
+                words.append((key, word, segment.get("start")))
+    return words
+
+
+def diff_transcripts(base: dict, other: dict, limit: int = 200) -> dict:
+    """Khác biệt theo từ giữa hai bản phiên âm (`base` làm bản tham chiếu cho tỉ lệ lỗi từ)"""
+    a, b = _words(base), _words(other)
+    matcher = difflib.SequenceMatcher(None, [w[0] for w in a], [w[0] for w in b], autojunk=False)
+    counts = {"equal": 0, "substituted": 0, "deleted": 0, "inserted": 0}
+    changes, changed = [], 0
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            counts["equal"] += i2 - i1
+            continue
+        changed += 1
+        counts["substituted"] += min(i2 - i1, j2 - j1)
+        counts["deleted"] += max((i2 - i1) - (j2 - j1), 0)
+        counts["inserted"] += max((j2 - j1) - (i2 - i1), 0)
+        if len(changes) < limit:
+            changes.append({
+                "op": op,
+                "base": " ".join(w[1] for w in a[i1:i2]),
+                "other": " ".join(w[1] for w in b[j1:j2]),
+                "base_start": a[i1][2] if i1 < i2 else (a[i1 - 1][2] if i1 else 0.0),
+                "other_start": b[j1][2] if j1 < j2 else (b[j1 - 1][2] if j1 else 0.0),
+            })
+    errors = counts["substituted"] + counts["deleted"] + counts["inserted"]
+    return {
+        "words": {"base": len(a), "other": len(b), **counts},
+        # Gần đúng: difflib không cho số phép sửa tối thiểu như WER chuẩn
+        "word_error_rate": round(errors / len(a), 4) if a else None,
+        "similarity": round(matcher.ratio(), 4),
+        "changes": changes,
+        "truncated": changed > len(changes),
+    }
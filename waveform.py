@@ -0,0 +1,239 @@
+# waveform.py - Dải peak min/max nhiều mức zoom và đoạn có tiếng nói cho trình phát audio
+"""
+Trình phát cần dạng sóng và thanh tua mà không phải tải/giải mã cả bản ghi
+âm trong trình duyệt. ``compute_waveform`` giải mã audio theo từng khối
+(PCM 16 kHz mono, không giữ cả file trong RAM) và tính bằng NumPy:
+
+- peak min/max int8 mỗi 20 ms (mức 0), rồi các mức thô hơn gấp 4 lần mỗi
+  mức cho đến khi còn dưới ``MIN_LEVEL_PEAKS`` điểm
+- các đoạn có tiếng nói (Silero VAD của faster-whisper) để bỏ qua khoảng lặng
+
+File ``<audio>.peaks`` nằm cạnh file audio: ``WPK1`` | uint32 độ dài header |
+header JSON | mỗi mức một khối zlib ``[min0, max0, min1, max1, ...]``.
+Reader chỉ giải nén mức được yêu cầu.
+"""
+import itertools
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from whisper_backends import SAMPLE_RATE
+
+logger = logging.getLogger("whisper-api")
+
+MAGIC = b"WPK1"
+EXTENSION = ".peaks"
+BASE_SAMPLES_PER_PEAK = 320  # 20 ms ở 16 kHz
+LEVEL_FACTOR = 4
+MIN_LEVEL_PEAKS = 1000
+CHUNK_SECONDS = 600  # Giải mã và chạy VAD theo khối 10 phút
+# Hai đoạn tiếng nói cách nhau ít hơn ngần này (giây) được gộp làm một
+SPEECH_MERGE_GAP = 0.5
+WAVEFORM_VAD = os.environ.get("WAVEFORM_VAD", "1").lower() not in ("0", "false", "no")
+
+_locks_guard = threading.Lock()
+_locks = {}
+
+
+def waveform_path(audio_path) -> Path:
+    return Path(str(audio_path) + EXTENSION)
+
+
+def pcm_chunks(path, chunk_samples: int):
+    """PCM float32 16 kHz mono của `path`, từng khối `chunk_samples` mẫu"""
+    import av
+
+    pending, size = [], 0
+    with av.open(str(path)) as container:
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        # None cuối cùng xả phần còn lại trong resampler
+        for frame in itertools.chain(container.decode(audio=0), [None]):
+            if frame is not None:
+                frame.pts = None
+            for resampled in resampler.resample(frame):
+                samples = resampled.to_ndarray().reshape(-1)
+                pending.append(samples)
+                size += len(samples)
+                if size >= chunk_samples:
+                    joined = np.concatenate(pending)
+                    yield joined[:chunk_samples]
+                    pending, size = [joined[chunk_samples:]], size - chunk_samples
+    if size:
+        yield np.concatenate(pending)
+
+
+def pcm_prefix(path, seconds: float) -> np.ndarray:
+    """PCM float32 16 kHz mono của `seconds` giây đầu (chỉ giải mã phần đó)"""
+    chunks = pcm_chunks(path, int(seconds * SAMPLE_RATE))
+    try:
+        return next(chunks, np.zeros(0, dtype=np.float32))
+    finally:
+        chunks.close()
+
+
+def _frame_peaks(samples: np.ndarray, samples_per_peak: int):
+    """Min/max của từng khung `samples_per_peak` mẫu (khung cuối được đệm bằng mẫu cuối)"""
+    count = -(-len(samples) // samples_per_peak)
+    padded = np.pad(samples, (0, count * samples_per_peak - len(samples)), mode="edge")
+    frames = padded.reshape(count, samples_per_peak)
+    return frames.min(axis=1), frames.max(axis=1)
+
+
+def speech_spans(samples: np.ndarray, offset: float = 0.0) -> List[List[float]]:
+    """Đoạn có tiếng nói (giây) trong PCM 16 kHz `samples`, dời theo `offset`"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    spans = get_speech_timestamps(samples, VadOptions(min_silence_duration_ms=500))
+    return [[offset + s["start"] / SAMPLE_RATE, offset + s["end"] / SAMPLE_RATE] for s in spans]
+
+
+def _merge_spans(spans: List[List[float]]) -> List[List[float]]:
+    merged = []
+    for start, end in spans:
+        if merged and start - merged[-1][1] < SPEECH_MERGE_GAP:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [[round(s, 2), round(e, 2)] for s, e in merged]
+
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values * 127), -127, 127).astype(np.int8)
+
+
+def compute_waveform(audio_path, vad: bool = WAVEFORM_VAD) -> bytes:
+    """Giải mã `audio_path` một lần và mã hóa peak các mức zoom (+ đoạn tiếng nói) thành bytes ``.peaks``"""
+    chunk_samples = CHUNK_SECONDS * SAMPLE_RATE  # bội số của BASE_SAMPLES_PER_PEAK
+    mins, maxs, spans, total = [], [], [], 0
+    for chunk in pcm_chunks(audio_path, chunk_samples):
+        chunk_min, chunk_max = _frame_peaks(chunk, BASE_SAMPLES_PER_PEAK)
+        mins.append(chunk_min)
+        maxs.append(chunk_max)
+        if vad:
+            spans.extend(speech_spans(chunk, total / SAMPLE_RATE))
+        total += len(chunk)
+    level_min = np.concatenate(mins) if mins else np.zeros(0, dtype=np.float32)
+    level_max = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.float32)
+
+    levels, blobs, offset = [], [], 0
+    samples_per_peak = BASE_SAMPLES_PER_PEAK
+    while True:
+        interleaved = np.empty(2 * len(level_min), dtype=np.int8)
+        interleaved[0::2], interleaved[1::2] = _quantize(level_min), _quantize(level_max)
+        blob = zlib.compress(interleaved.tobytes(), 6)
+        levels.append({"samples_per_peak": samples_per_peak, "count": len(level_min),
+                       "offset": offset, "size": len(blob)})
+        blobs.append(blob)
+        offset += len(blob)
+        if len(level_min) <= MIN_LEVEL_PEAKS:
+            break
+        level_min = _frame_peaks(level_min, LEVEL_FACTOR)[0]
+        level_max = _frame_peaks(level_max, LEVEL_FACTOR)[1]
+        samples_per_peak *= LEVEL_FACTOR
+
+    header = {
+        "version": 1,
+        "sample_rate": SAMPLE_RATE,
+        "duration": round(total / SAMPLE_RATE, 3),
+        "levels": levels,
+        "speech": _merge_spans(spans) if vad else None,
+    }
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(encoded)) + encoded + b"".join(blobs)
+
+
+class Waveform:
+    """File ``.peaks`` đã đọc; chỉ giải nén mức được truy vấn"""
+
+    def __init__(self, blob: bytes):
+        if blob[:4] != MAGIC:
+            raise ValueError("Not a waveform peaks file")
+        (header_len,) = struct.unpack_from("<I", blob, 4)
+        self.header = json.loads(blob[8:8 + header_len].decode("utf-8"))
+        self._data = memoryview(blob)[8 + header_len:]
+        self.duration = self.header["duration"]
+        self.levels = self.header["levels"]
+        self.speech = self.header.get("speech")
+        self._decoded = {}
+
+    @classmethod
+    def from_file(cls, path) -> "Waveform":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def level(self, index: int) -> np.ndarray:
+        """Mảng int8 ``[min0, max0, min1, max1, ...]`` của mức `index`"""
+        if index not in self._decoded:
+            spec = self.levels[index]
+            raw = zlib.decompress(self._data[spec["offset"]:spec["offset"] + spec["size"]])
+            self._decoded[index] = np.frombuffer(raw, dtype=np.int8)
+        return self._decoded[index]
+
+    def peaks_per_second(self, index: int) -> float:
+        return self.header["sample_rate"] / self.levels[index]["samples_per_peak"]
+
+    def choose_level(self, span_seconds: float, max_points: int) -> int:
+        """Mức chi tiết nhất có không quá `max_points` peak trong `span_seconds` giây"""
+        for index in range(len(self.levels)):
+            if span_seconds * self.peaks_per_second(index) <= max_points:
+                return index
+        return len(self.levels) - 1
+
+    def window(self, start: float = 0.0, end: Optional[float] = None, max_points: int = 2000,
+               level: Optional[int] = None) -> dict:
+        end = self.duration if end is None else min(end, self.duration)
+        start = min(max(start, 0.0), end)
+        if level is None:
+            level = self.choose_level(end - start, max_points)
+        level = min(max(level, 0), len(self.levels) - 1)
+        rate = self.peaks_per_second(level)
+        first = int(math.floor(start * rate))
+        last = min(int(math.ceil(end * rate)), self.levels[level]["count"])
+        return {
+            "duration": self.duration,
+            "level": level,
+            "levels": len(self.levels),
+            "samples_per_peak": self.levels[level]["samples_per_peak"],
+            "peaks_per_second": rate,
+            "start": round(first / rate, 3),
+            "end": round(min(last / rate, self.duration), 3),
+            "bits": 8,
+            "data": self.level(level)[2 * first:2 * last].tolist(),
+            "speech": None if self.speech is None else
+                [span for span in self.speech if span[1] > start and span[0] < end],
+        }
+
+
+@lru_cache(maxsize=32)
+def _load(path: str, mtime_ns: int) -> Waveform:
+    return Waveform.from_file(path)
+
+
+def _path_lock(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def ensure_waveform(audio_path, on_created=None) -> Waveform:
+    """Peak của `audio_path`, tính và ghi ``.peaks`` nếu chưa có (mỗi file audio chỉ tính một lần)"""
+    path = waveform_path(audio_path)
+    lock = _path_lock(str(path))
+    with lock:
+        if not path.exists():
+            blob = compute_waveform(audio_path)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(blob)
+            os.replace(tmp, path)
+            logger.info(f"🌊 Computed waveform for {audio_path} ({len(blob)} bytes)")
+            if on_created is not None:
+                on_created(path)
+    return _load(str(path), path.stat().st_mtime_ns)
@@ -0,0 +1,204 @@
+# whisper_backends.py - Backend phiên âm: faster-whisper thật hoặc engine giả cho load test
+"""
+Backend được chọn qua biến môi trường WHISPER_BACKEND:
+
+- ``faster-whisper`` (mặc định): ``faster_whisper.WhisperModel``
+- ``fake``: engine giả, sinh segment tất định với real-time factor và
+  dung lượng bộ nhớ cấu hình được, không cần tải model
+
+Cấu hình engine giả:
+
+- FAKE_WHISPER_RTF: thời gian xử lý / thời lượng audio (mặc định 0.05)
+- FAKE_WHISPER_SEGMENT_SECONDS: độ dài mỗi segment (mặc định 4.0)
+- FAKE_WHISPER_MEMORY_MB: bộ nhớ chiếm giữ khi nạp model (mặc định 0)
+- FAKE_WHISPER_LOAD_SECONDS: thời gian giả lập nạp model (mặc định 0)
+- FAKE_WHISPER_LANGUAGE: ngôn ngữ trả về khi không chỉ định (mặc định "vi")
+- FAKE_WHISPER_SCALE_BY_SIZE: 1 = FAKE_WHISPER_RTF là RTF của large-v3, model
+  nhỏ hơn nhanh hơn theo ``model_routing.RELATIVE_COST`` (mặc định 0)
+- FAKE_WHISPER_LOW_CONFIDENCE: tỉ lệ segment có avg_logprob thấp khi model
+  không phải large-* (mặc định 0), để thử định tuyến/phiên âm lại
+"""
+import logging
+import os
+import time
+import wave
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+logger = logging.getLogger("whisper-api")
+
+SAMPLE_RATE = 16000
+DEFAULT_BACKEND = "faster-whisper"
+
+FAKE_WORDS = [
+    "xin", "chào", "mọi", "người", "hôm", "nay", "chúng", "ta", "họp", "về",
+    "kế", "hoạch", "quý", "tới", "ngân", "sách", "dự", "án", "cần", "hoàn", "thành",
+]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def probe_duration(audio) -> float:
+    """Ước lượng thời lượng audio (giây) từ mảng PCM 16 kHz hoặc đường dẫn file"""
+    if hasattr(audio, "shape"):
+        return audio.shape[0] / SAMPLE_RATE
+    path = str(audio)
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wf:
+                return wf.getnframes() / float(wf.getframerate())
+        except (wave.Error, EOFError):
+            pass
+    try:
+        import av
+        with av.open(path) as container:
+            if container.duration:
+                return container.duration / 1_000_000
+    except Exception:
+        pass
+    # Không đọc được header: giả định ~128 kbps
+    return os.path.getsize(path) / 16000
+
+
+class FakeWhisperModel:
+    """Engine giả có cùng giao diện transcribe() với WhisperModel"""
+
+    def __init__(self, model_size: str, device: str = "cpu", compute_type: str = "int8",
+                 rtf: float = 0.05, segment_seconds: float = 4.0, memory_mb: float = 0,
+                 load_seconds: float = 0, language: str = "vi", low_confidence: float = 0.0):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.rtf = rtf
+        self.segment_seconds = max(segment_seconds, 0.1)
+        self.language = language
+        self.low_confidence = 0.0 if model_size.startswith("large") else low_confidence
+        if load_seconds > 0:
+            time.sleep(load_seconds)
+        # Giữ một vùng nhớ đã được ghi để RSS tăng thật, giống trọng số model
+        self._ballast = b"\x01" * int(memory_mb * 1024 * 1024)
+
+    def transcribe(self, audio, language=None, word_timestamps=False, clip_timestamps=None, **kwargs):
+        duration = probe_duration(audio)
+        clips = _clips(clip_timestamps, duration)
+        info = SimpleNamespace(
+            language=language or self.language,
+            language_probability=1.0 if language else 0.95,
+            duration=duration,
+            duration_after_vad=sum(end - start for start, end in clips),
+        )
+        return self._generate_segments(clips, word_timestamps), info
+
+    def _generate_segments(self, clips, word_timestamps: bool):
+        index = 0
+        for start, clip_end in clips:
+            while start < clip_end:
+                end = min(start + self.segment_seconds, clip_end)
+                # Giả lập thời gian decode của đoạn này
+                if self.rtf > 0:
+                    time.sleep((end - start) * self.rtf)
+
+                n_words = 3 + index % 6
+                words = [FAKE_WORDS[(index * 7 + k) % len(FAKE_WORDS)] for k in range(n_words)]
+                step = (end - start) / n_words
+                yield SimpleNamespace(
+                    id=index + 1,
+                    seek=int(start * 100),
+                    start=round(start, 3),
+                    end=round(end, 3),
+                    text=" " + " ".join(words),
+                    tokens=[50364 + (index * 31 + k) % 1000 for k in range(n_words + 2)],
+                    temperature=0.0,
+                    avg_logprob=-1.3 if (index * 37) % 100 < self.low_confidence * 100 else -0.25,
+                    compression_ratio=1.4,
+                    no_speech_prob=0.02,
+                    words=[
+                        SimpleNamespace(word=" " + w, start=round(start + k * step, 3),
+                                        end=round(start + (k + 1) * step, 3), probability=0.9)
+                        for k, w in enumerate(words)
+                    ] if word_timestamps else None,
+                )
+                start = end
+                index += 1
+
+
+def _clips(clip_timestamps, duration: float):
+    """Các (start, end) giây cần decode theo ``clip_timestamps`` (cả hai dạng của faster-whisper)"""
+    if not clip_timestamps or clip_timestamps == "0":
+        return [(0.0, duration)]
+    if isinstance(clip_timestamps[0], dict):
+        return [(c["start"] / SAMPLE_RATE, min(c["end"] / SAMPLE_RATE, duration)) for c in clip_timestamps]
+    if isinstance(clip_timestamps, str):
+        clip_timestamps = [float(t) for t in clip_timestamps.split(",")]
+    bounds = list(clip_timestamps) + ([duration] if len(clip_timestamps) % 2 else [])
+    return [(start, min(end, duration)) for start, end in zip(bounds[0::2], bounds[1::2])]
+
+
+def _load_faster_whisper(model_size: str, device: str, compute_type: str, **kwargs):
+    from faster_whisper import WhisperModel
+
+    return WhisperModel(
+        model_size,
+        device=device,
+        compute_type=compute_type,
+        download_root=os.environ.get("MODEL_DIR", None),
+        **kwargs
+    )
+
+
+def _load_fake(model_size: str, device: str, compute_type: str, **kwargs):
+    rtf = _env_float("FAKE_WHISPER_RTF", 0.05)
+    if os.environ.get("FAKE_WHISPER_SCALE_BY_SIZE", "0").lower() in ("1", "true", "yes"):
+        from model_routing import RELATIVE_COST
+        rtf *= RELATIVE_COST.get(model_size, 1.0)
+    return FakeWhisperModel(
+        model_size,
+        device=device,
+        compute_type=compute_type,
+        rtf=rtf,
+        segment_seconds=_env_float("FAKE_WHISPER_SEGMENT_SECONDS", 4.0),
+        memory_mb=_env_float("FAKE_WHISPER_MEMORY_MB", 0),
+        load_seconds=_env_float("FAKE_WHISPER_LOAD_SECONDS", 0),
+        language=os.environ.get("FAKE_WHISPER_LANGUAGE", "vi"),
+        low_confidence=_env_float("FAKE_WHISPER_LOW_CONFIDENCE", 0.0),
+    )
+
+
+BACKENDS: Dict[str, Callable] = {
+    "faster-whisper": _load_faster_whisper,
+    "fake": _load_fake,
+}
+
+
+def get_backend_name() -> str:
+    return os.environ.get("WHISPER_BACKEND", DEFAULT_BACKEND).lower()
+
+
+def load_whisper_model(model_size: str, device: str = "cpu", compute_type: str = "int8", **kwargs):
+    """Nạp model theo backend đang cấu hình"""
+    name = get_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown WHISPER_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_size, device, compute_type, **kwargs)
+
+
+def batched_pipeline(model):
+    """Bọc model bằng BatchedInferencePipeline (engine giả tự xử lý batch_size)"""
+    if isinstance(model, FakeWhisperModel):
+        return model
+    from faster_whisper import BatchedInferencePipeline
+
+    return BatchedInferencePipeline(model=model)
+
+
+def load_audio(path: str, offset: float = 0.0):
+    """Giải mã audio thành PCM 16 kHz mono, bỏ qua `offset` giây đầu"""
+    from faster_whisper import decode_audio
+
+    audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+    return audio[int(offset * SAMPLE_RATE):]
@@ -0,0 +1,200 @@
+# whisper_worker.py - Worker phiên âm chạy riêng, nhận job từ hàng đợi trong database
+"""
+Chạy song song với API (JOB_QUEUE_BACKEND=database) để tách phần suy luận
+ra process/máy khác và thêm node khi hàng đợi dài:
+
+    python -m whisper_worker --concurrency 2
+
+Worker dùng lại pipeline của API (process_transcription,
+process_meeting_audio_background, refine_meeting_transcript và retranscribe_meeting), nên cần cùng DATABASE_URL, UPLOAD_DIR,
+thư mục data/ và CHECKPOINT_DIR với API (ổ đĩa dùng chung). Kết quả phiên
+âm ad-hoc được ghi vào bảng transcription_jobs, kết quả cuộc họp vào
+bảng meetings như khi chạy trong API.
+
+SIGTERM/SIGINT: job đang chạy dừng ở segment kế tiếp, giữ checkpoint và
+được trả về hàng đợi cho worker khác tiếp tục.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+
+# Worker luôn dùng hàng đợi trong database, kể cả khi biến môi trường chưa đặt
+os.environ["JOB_QUEUE_BACKEND"] = "database"
+
+import app as whisper_app
+from checkpoints import JobCheckpoint
+from job_queue import IDLE_PRIORITIES
+from transcript_store import CompactTranscript
+
+logger = logging.getLogger("whisper-api")
+
+
+class Worker:
+    def __init__(self, worker_id: str, concurrency: int = 1, lease_seconds: float = 60.0,
+                 poll_interval: float = 2.0):
+        self.worker_id = worker_id
+        self.concurrency = max(concurrency, 1)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.queue = whisper_app.job_queue
+        self._stop = threading.Event()
+        self._running = {}  # job_id -> cancel_event
+        self._idle = set()  # job_id đang chạy thuộc lớp idle (tinh chỉnh bản nháp)
+        self._lock = threading.Lock()
+
+    def stop(self, *_):
+        if self._stop.is_set():
+            return
+        logger.info(f"🛑 Worker {self.worker_id} stopping, interrupting {len(self._running)} job(s)")
+        self._stop.set()
+        # Pipeline giữ checkpoint khi thấy cờ này
+        self.queue.shutting_down = True
+        with self._lock:
+            for cancel_event in self._running.values():
+                cancel_event.set()
+
+    def run(self):
+        logger.info(f"👷 Worker {self.worker_id} started: {self.concurrency} slot(s), "
+                    f"lease {self.lease_seconds:g}s ({whisper_app.get_backend_name()} backend)")
+        threads = [
+            threading.Thread(target=self._loop, name=f"worker-{n}", daemon=True)
+            for n in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+        logger.info(f"👋 Worker {self.worker_id} stopped")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                # Luôn chừa một slot cho job thường (khi có từ hai slot)
+                allow_idle = len(self._idle) < max(self.concurrency - 1, 1)
+            try:
+                job = self.queue.claim(self.worker_id, self.lease_seconds, allow_idle=allow_idle)
+            except Exception as e:
+                logger.error(f"❌ Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run_job(job)
+
+    def _heartbeat(self, job_id: str, cancel_event: threading.Event, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                owned, cancel_requested = self.queue.heartbeat(job_id, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"❌ Heartbeat failed for job {job_id}: {e}")
+                continue
+            if not owned:
+                # Lease đã hết hạn và job về hàng đợi; kết quả của lần chạy này sẽ bị bỏ
+                logger.warning(f"⚠️ Lost lease on job {job_id}")
+                return
+            if cancel_requested:
+                cancel_event.set()
+
+    def _dispatch(self, job: dict, cancel_event: threading.Event):
+        if job["kind"] == "meeting":
+            whisper_app.process_meeting_audio_background(
+                job["meeting_id"], job["audio_path"], job["id"], cancel_event
+            )
+        elif job["kind"] == "refine":
+            whisper_app.refine_meeting_transcript(
+                job["meeting_id"], job["audio_path"], job["id"], cancel_event
+            )
+        elif job["kind"] == "retranscribe":
+            whisper_app.retranscribe_meeting(
+                job["meeting_id"],
+                job["audio_path"],
+                whisper_app.TranscriptionOptions(**(job["options"] or {})),
+                job["id"],
+                cancel_event
+            )
+        else:
+            whisper_app.process_transcription(
+                job["id"],
+                job["audio_path"],
+                whisper_app.TranscriptionOptions(**(job["options"] or {})),
+                cancel_event
+            )
+
+    def _run_job(self, job: dict):
+        job_id = job["id"]
+        logger.info(f"▶️ Worker {self.worker_id} running {job['kind']} job {job_id} "
+                    f"(attempt {job['attempts']}, {job['audio_duration'] or 0:.1f}s audio)")
+        cancel_event = threading.Event()
+        done = threading.Event()
+        with self._lock:
+            self._running[job_id] = cancel_event
+            if job["priority"] in IDLE_PRIORITIES:
+                self._idle.add(job_id)
+        # Pipeline cập nhật trạng thái vào registry của process này; ta đọc lại để ghi vào DB
+        whisper_app.transcription_tasks[job_id] = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": job["created_at"],
+            "file_name": job["file_name"],
+            "audio_duration": job["audio_duration"],
+            "priority": job["priority"],
+            "meeting_id": job["meeting_id"],
+        }
+        checkpoint = JobCheckpoint(job_id)
+        if not checkpoint.exists():
+            JobCheckpoint.create(job_id, job["kind"], audio_path=job["audio_path"], worker_id=self.worker_id)
+
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, cancel_event, done), daemon=True)
+        heartbeat.start()
+        run = whisper_app.profiler.wrap_job(lambda: self._dispatch(job, cancel_event), job_id, job["kind"],
+                                            whisper_app.profiler.job_mode())
+        try:
+            run()
+        except Exception as e:
+            logger.exception(f"❌ Job {job_id} crashed: {e}")
+            whisper_app._set_task_status(job_id, "failed", error=str(e))
+        finally:
+            done.set()
+            heartbeat.join()
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._idle.discard(job_id)
+
+        task = whisper_app.transcription_tasks.pop(job_id, {})
+        status = task.get("status", "failed")
+        result = task.get("result")
+        if isinstance(result, CompactTranscript):
+            result = result.to_dict()
+        if status == "processing" and self._stop.is_set():
+            self.queue.release(job_id, self.worker_id)
+            logger.info(f"💾 Released job {job_id} back to the queue")
+        elif not self.queue.finish(job_id, self.worker_id, status,
+                                   result=result, error=task.get("error")):
+            logger.warning(f"⚠️ Job {job_id} was taken over by another worker, result discarded")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper transcription worker (database job queue)")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.environ.get("WORKER_CONCURRENCY", 0)) or whisper_app.TUNING_PROFILE.concurrency,
+                        help="Số job chạy song song (mặc định theo profile phần cứng, xem hw_tuning.py)")
+    parser.add_argument("--lease-seconds", type=float, default=float(os.environ.get("WORKER_LEASE_SECONDS", 60)),
+                        help="Thời hạn lease; job của worker chết được trả lại hàng đợi sau khoảng này")
+    parser.add_argument("--poll-interval", type=float, default=float(os.environ.get("WORKER_POLL_INTERVAL", 2)))
+    args = parser.parse_args()
+
+    # Chia ngân sách CPU của máy cho số job của worker này
+    whisper_app.MODEL_THREADS = whisper_app.model_threads(args.concurrency)
+    worker = Worker(args.worker_id, args.concurrency, args.lease_seconds, args.poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()